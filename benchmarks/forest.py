@@ -0,0 +1,75 @@
+"""Compares sklearn's forests with their compiled versions on a synthetic capture
+
+A synthetic capture (see netflow.py) is prepared and encoded once for every
+bundled random forest, which then predicts it both with the fitted sklearn
+forest and with its CompiledForest, with the same number of jobs. The best
+time of several repeats is reported, along with the largest difference
+between the probabilities of the two.
+
+Usage: python benchmarks/forest.py [--rows N] [--jobs N] [--repeat N]
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+from netflow import write_capture
+
+from botrecon.data import Data
+from botrecon.forest import CompiledForest
+from botrecon.predictions import load_model
+
+MODELS = ['rforest', 'rforest-experimental']
+
+
+def best_time(function, X, repeat):
+    """Returns the result of function(X) and its fastest duration"""
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(X)
+        seconds.append(time.perf_counter() - start)
+    return result, min(seconds)
+
+
+def forest_input(model, data):
+    """Returns the data as passed to the forest ending the model's pipeline"""
+    X = model.encode(data)
+    for _, step in model.pipeline.steps[1:-1]:
+        X = step.transform(X)
+    return X
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000,
+                        help='size of the generated capture')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='number of jobs of both versions of the forests')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of times every prediction is timed')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='botrecon-bench-') as tmp:
+        path = Path(tmp) / 'flows.csv'
+        write_capture(path, args.rows, 10_000, .05)
+        data = Data(path, 'csv', None, True)
+        data.prepare()
+
+    for name in MODELS:
+        model = load_model(name, compile=False)
+        forest = model.pipeline.steps[-1][1]
+        forest.n_jobs = args.jobs
+        compiled = CompiledForest(forest)
+        X = forest_input(model, data.data)
+
+        expected, sklearn_seconds = best_time(forest.predict_proba, X, args.repeat)
+        proba, compiled_seconds = best_time(compiled.predict_proba, X, args.repeat)
+        print(f'{name:22} sklearn {sklearn_seconds:7.3f}s '
+              f'compiled {compiled_seconds:7.3f}s '
+              f'speedup {sklearn_seconds / compiled_seconds:5.2f}x '
+              f'max difference {np.abs(proba - expected).max():.1e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Generates synthetic Argus-like netflow captures for the benchmarks
+
+Source hosts get a long-tailed number of flows, most of them are local
+(10.0.0.0/8) and a configurable share of the local ones is infected, sending
+short, small flows to a few command and control ports. The columns and
+formats follow the CTU-13 captures the bundled models were trained on.
+
+Usage: python benchmarks/netflow.py ROWS OUTPUT [--hosts N] [--infected R]
+"""
+import argparse
+import numpy as np
+import pandas as pd
+
+COLUMNS = ['StartTime', 'Dur', 'Proto', 'SrcAddr', 'Sport', 'Dir', 'DstAddr',
+           'Dport', 'State', 'sTos', 'dTos', 'TotPkts', 'TotBytes', 'SrcBytes',
+           'Label']
+PROTOCOLS = {'tcp': .6, 'udp': .35, 'icmp': .05}
+STATES = {
+    'tcp': ['FSPA_FSPA', 'S_RA', 'SRPA_SPA', 'FSA_FSA', 'S_'],
+    'udp': ['CON', 'INT'],
+    'icmp': ['ECO', 'URP', 'ECR']
+}
+PORTS = [80, 443, 53, 22, 25, 123, 13363, 8080]
+BOTNET_PORTS = [6667, 25, 80, 53]
+# Flows are written in chunks, so that large captures do not need much memory
+CHUNK_ROWS = 1_000_000
+
+
+def make_hosts(n_hosts, infected_ratio, rng):
+    """Returns addresses of n_hosts hosts, their flow weights and infected mask"""
+    local = rng.random(n_hosts) < .7
+    octets = rng.integers(1, 255, size=(n_hosts, 4))
+    octets[local, 0] = 10
+
+    addresses = np.array(['.'.join(map(str, row)) for row in octets.tolist()],
+                         dtype=object)
+    addresses, first = np.unique(addresses, return_index=True)
+    local = local[first]
+
+    # Long-tailed, a few hosts send most of the flows
+    weights = 1 / (rng.permutation(len(addresses)) + 1) ** .8
+    weights /= weights.sum()
+
+    infected = np.zeros(len(addresses), dtype=bool)
+    candidates = np.flatnonzero(local)
+    n_infected = int(round(len(candidates) * infected_ratio))
+    infected[rng.choice(candidates, n_infected, replace=False)] = True
+    return addresses, weights, infected
+
+
+def generate_flows(rows, addresses, weights, infected, rng, start=1313000000.):
+    """Returns a DataFrame with rows flows of the passed hosts"""
+    hosts = rng.choice(len(addresses), size=rows, p=weights)
+    bot = infected[hosts]
+
+    protocols = np.array(list(PROTOCOLS))
+    proto = protocols[rng.choice(len(protocols), size=rows, p=list(PROTOCOLS.values()))]
+    proto[bot] = np.where(rng.random(bot.sum()) < .8, 'tcp', 'udp')
+
+    state = np.empty(rows, dtype=object)
+    for name, states in STATES.items():
+        mask = proto == name
+        state[mask] = np.array(states, dtype=object)[rng.integers(len(states), size=mask.sum())]
+
+    dport = np.array(PORTS, dtype='float64')[rng.integers(len(PORTS), size=rows)]
+    ephemeral = rng.random(rows) < .2
+    dport[ephemeral] = rng.integers(1024, 65536, size=ephemeral.sum())
+    dport[bot] = np.array(BOTNET_PORTS, dtype='float64')[rng.integers(len(BOTNET_PORTS), size=bot.sum())]
+    sport = rng.integers(1024, 65536, size=rows).astype('float64')
+    # Argus has no ports for icmp flows
+    sport[proto == 'icmp'] = np.nan
+    dport[proto == 'icmp'] = np.nan
+
+    dur = rng.exponential(3., size=rows)
+    dur[bot] = rng.exponential(.05, size=bot.sum())
+    packets = rng.geometric(.1, size=rows)
+    packets[bot] = rng.geometric(.5, size=bot.sum())
+    total = packets * rng.integers(60, 1500, size=rows)
+    source = (total * rng.uniform(.1, .9, size=rows)).astype('int64')
+
+    destinations = rng.integers(1, 255, size=(rows, 4)).astype(str)
+    return pd.DataFrame({
+        'StartTime': start + np.sort(rng.uniform(0, 86400, size=rows)),
+        'Dur': dur.round(6),
+        'Proto': proto,
+        'SrcAddr': addresses[hosts],
+        'Sport': sport,
+        'Dir': '->',
+        'DstAddr': pd.Series(destinations[:, 0]).str.cat(list(destinations[:, 1:].T), sep='.'),
+        'Dport': dport,
+        'State': state,
+        'sTos': 0.,
+        'dTos': 0.,
+        'TotPkts': packets,
+        'TotBytes': total,
+        'SrcBytes': source,
+        'Label': np.where(bot, 'flow=From-Botnet-V1', 'flow=Background')
+    }, columns=COLUMNS)
+
+
+def write_capture(path, rows, n_hosts=10_000, infected_ratio=.05, seed=0):
+    """Writes a csv capture with rows flows to path, returns the infected hosts"""
+    rng = np.random.default_rng(seed)
+    addresses, weights, infected = make_hosts(n_hosts, infected_ratio, rng)
+
+    with open(path, 'w', newline='') as f:
+        for i, start in enumerate(range(0, rows, CHUNK_ROWS)):
+            flows = generate_flows(min(CHUNK_ROWS, rows - start), addresses,
+                                   weights, infected, rng, 1313000000. + 86400 * i)
+            flows.to_csv(f, index=False, header=i == 0)
+    return addresses[infected]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('rows', type=int, help='number of flows')
+    parser.add_argument('output', help='path of the csv file to write')
+    parser.add_argument('--hosts', type=int, default=10_000,
+                        help='number of distinct source hosts')
+    parser.add_argument('--infected', type=float, default=.05,
+                        help='share of the local hosts that are infected')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    infected = write_capture(args.output, args.rows, args.hosts, args.infected,
+                             args.seed)
+    print(f'Wrote {args.rows} flows of {len(infected)} infected hosts to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
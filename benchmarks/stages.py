@@ -0,0 +1,186 @@
+"""Measures the throughput and memory of every stage of scoring a capture
+
+Synthetic captures (see netflow.py) of every requested size are generated
+once and scored in this process, timing Data.load, Data.prepare, filter_ips,
+filter_hosts, make_predictions, evaluate_per_host and handle_output on their
+own. Throughput is reported in flows of the capture per second for all
+stages, and the peak memory as the highest sampled resident memory above the
+one before the stage.
+
+The results are compared against a stored baseline, any stage slower or using
+more memory than the baseline allows for fails the run. Baselines depend on
+the machine, save a new one with --save-baseline before comparing changes.
+
+Usage: python benchmarks/stages.py [--rows N ...] [--baseline PATH]
+                                   [--save-baseline] [--tolerance T]
+"""
+import argparse
+import gc
+import json
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from netflow import write_capture
+
+from botrecon import botrecon
+from botrecon.data import Data
+from botrecon.output import handle_output
+from botrecon.predictions import current_rss, get_model, get_threshold
+from botrecon.predictions import evaluate_per_host, filter_hosts, filter_ips
+from botrecon.predictions import make_predictions
+
+BASELINE = Path(__file__).parent / 'baseline.json'
+# Peaks of stages allocating little memory and the speed of very short ones
+# are mostly noise
+MEMORY_SLACK_MIB = 32
+MIN_SECONDS = .05
+
+
+class PeakMemory(threading.Thread):
+    """Samples the resident memory of the process until stopped"""
+    def __init__(self, interval=.002):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.start_rss = current_rss()
+        self.peak = self.start_rss
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def stop(self):
+        """Stops sampling, returns the peak above the starting memory in MiB"""
+        self.peak = max(self.peak, current_rss())
+        self.stopped.set()
+        self.join()
+        return (self.peak - self.start_rss) / 2**20
+
+
+def measure(function, *args):
+    """Returns the result of function, its duration and peak memory in MiB"""
+    gc.collect()
+    sampler = PeakMemory()
+    sampler.start()
+    start = time.perf_counter()
+    result = function(*args)
+    seconds = time.perf_counter() - start
+    return result, seconds, sampler.stop()
+
+
+def run_stages(path, output, model_name, rows):
+    """Scores the capture at path stage by stage, returns the measurements"""
+    args = ['-s', '-y', '-c', '1', '-r', '10.0.0.0/8', '-m', model_name, str(path)]
+    results = {}
+
+    def record(stage, function, *args):
+        result, seconds, peak = measure(function, *args)
+        results[stage] = {
+            'seconds': round(seconds, 4),
+            'rows_per_sec': round(rows / max(seconds, 1e-9)),
+            'peak_mib': round(peak, 1)
+        }
+        return result
+
+    with botrecon.make_context('botrecon', args) as ctx:
+        model = get_model(ctx.params['model'])
+
+        data = record('load', Data, path, 'csv', None, True)
+        record('prepare', data.prepare)
+        record('filter_ips', filter_ips, data.host_uniques, ctx.params['range'])
+        data = record('filter_hosts', filter_hosts, data, ctx.params['min_count'])
+        preds, threshold = record('make_predictions', make_predictions, data.data, model)
+        table = record('evaluate_per_host', evaluate_per_host, preds, data, threshold)
+        record('handle_output', handle_output, table, output)
+
+    assert threshold == get_threshold(model)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Returns descriptions of all stages that regressed against the baseline"""
+    regressions = []
+    for rows, stages in results.items():
+        for stage, result in stages.items():
+            base = baseline.get(rows, {}).get(stage)
+            if base is None:
+                continue
+            if base['seconds'] >= MIN_SECONDS and \
+                    result['rows_per_sec'] < base['rows_per_sec'] * (1 - tolerance):
+                regressions.append(
+                    f'{stage} at {rows} rows: {result["rows_per_sec"]:,.0f} rows/s, '
+                    f'baseline {base["rows_per_sec"]:,.0f} rows/s'
+                )
+            allowed = base['peak_mib'] * (1 + tolerance) + MEMORY_SLACK_MIB
+            if result['peak_mib'] > allowed:
+                regressions.append(
+                    f'{stage} at {rows} rows: peak {result["peak_mib"]:.1f} MiB, '
+                    f'baseline {base["peak_mib"]:.1f} MiB'
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+',
+                        default=[100_000, 1_000_000, 10_000_000],
+                        help='sizes of the generated captures')
+    parser.add_argument('--hosts', type=int, default=10_000,
+                        help='number of distinct source hosts in the captures')
+    parser.add_argument('--infected', type=float, default=.05,
+                        help='share of the local hosts that are infected')
+    parser.add_argument('--model', default='rforest',
+                        help='name of the bundled model to score with')
+    parser.add_argument('--data-dir', default=None,
+                        help='directory to keep the generated captures in, so '
+                             'they are reused by later runs')
+    parser.add_argument('--baseline', default=str(BASELINE),
+                        help='baseline to compare against or to save')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='save the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=.3,
+                        help='allowed relative loss of throughput and increase '
+                             'of memory against the baseline')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='botrecon-bench-') as tmp:
+        data_dir = Path(args.data_dir or tmp)
+        data_dir.mkdir(parents=True, exist_ok=True)
+
+        results = {}
+        for rows in args.rows:
+            path = data_dir / f'flows-{rows}-{args.hosts}-{args.infected}.csv'
+            if not path.exists():
+                write_capture(path, rows, args.hosts, args.infected)
+
+            results[str(rows)] = stages = run_stages(
+                path, Path(tmp) / 'output.csv', args.model, rows
+            )
+            for stage, result in stages.items():
+                print(f'{rows:>10} {stage:18} {result["seconds"]:8.3f}s '
+                      f'{result["rows_per_sec"]:>14,.0f} rows/s '
+                      f'{result["peak_mib"]:8.1f} MiB')
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps(results, indent=2) + '\n')
+        print(f'Saved the baseline to {baseline_path}')
+        return
+
+    if not baseline_path.exists():
+        print(f'No baseline at {baseline_path}, save one with --save-baseline')
+        return
+
+    regressions = compare(results, json.loads(baseline_path.read_text()),
+                          args.tolerance)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    if regressions:
+        sys.exit(1)
+    print('No regressions against the baseline')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Measures the startup cost of botrecon commands
+
+Every scenario is run in a fresh interpreter with `-X importtime`, reporting
+the wall time of the whole command, the total time spent importing modules
+and the most expensive top-level imports.
+
+Usage: python benchmarks/startup.py [--repeat N] [--input PATH]
+"""
+import argparse
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+
+def run(args):
+    """Runs botrecon with args, returns wall time and importtime records"""
+    cmd = [sys.executable, '-X', 'importtime', '-m', 'botrecon'] + args
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, stdout=subprocess.DEVNULL,
+                          stderr=subprocess.PIPE, text=True)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f'{" ".join(args)} failed:\n{proc.stderr}')
+    return wall, parse_importtime(proc.stderr)
+
+
+def parse_importtime(stderr):
+    """Returns (module, cumulative microseconds) of all top-level imports"""
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented, their time is included in the parent
+        if not name[1:].startswith(' '):
+            records.append((name.strip(), int(cumulative)))
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of runs per scenario, the best is reported')
+    parser.add_argument('--input', default=str(Path('tests', 'data', 'test.csv')),
+                        help='capture used for the real run')
+    args = parser.parse_args()
+
+    scenarios = {
+        '--help': ['--help'],
+        '--version': ['--version'],
+        'run': ['-s', args.input]
+    }
+
+    for name, cmd in scenarios.items():
+        runs = [run(cmd) for _ in range(args.repeat)]
+        wall, records = min(runs, key=lambda r: r[0])
+        imports = sum(t for _, t in records) / 1e6
+        heaviest = sorted(records, key=lambda r: r[1], reverse=True)[:5]
+
+        print(f'{name:10} wall {wall:7.3f}s  imports {imports:7.3f}s')
+        for module, t in heaviest:
+            print(f'{"":12}{module:30} {t / 1e6:7.3f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,32 @@
-from .data import get_data, Data
-from .predictions import get_predictions
-from .ip import IPEntity
-from .output import handle_output
-from .cli import botrecon
+# The submodules are only imported when one of their names is first accessed,
+# so that commands like `botrecon --help` do not have to import pandas
+_EXPORTS = {
+    'get_data': 'data',
+    'get_data_chunked': 'data',
+    'Data': 'data',
+    'get_predictions': 'predictions',
+    'get_predictions_streamed': 'predictions',
+    'HostAggregate': 'aggregate',
+    'IPEntity': 'ip',
+    'IPRangeIndex': 'ip',
+    'handle_output': 'output',
+    'add_hook': 'metrics',
+    'remove_hook': 'metrics',
+    'botrecon': 'cli'
+}
 
 __version__ = '1.0.1'
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+    from importlib import import_module
+    value = getattr(import_module('.' + _EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_EXPORTS))
@@ -0,0 +1,135 @@
+import pandas as pd
+import numpy as np
+
+
+class HostAggregate(object):
+    """Running per-host sums of prediction scores and flow counts.
+
+    Keeping only these two numbers per host is enough to compute the mean
+    score of every host, so predictions can be discarded as soon as they are
+    added. Hosts are kept in the order in which they were first seen.
+
+    Updates only touch the hosts present in them, so their cost does not grow
+    with the number of hosts already aggregated.
+
+    Attributes:
+    hosts  list           all hosts seen so far, in order
+    index  dict           mapping of hosts to their position in hosts
+    sums   numpy.ndarray  sum of scores for each host (may be over-allocated)
+    counts numpy.ndarray  number of flows for each host (may be over-allocated)
+    """
+    def __init__(self):
+        self.hosts = []
+        self.index = {}
+        self.sums = np.zeros(0, dtype='float64')
+        self.counts = np.zeros(0, dtype='int64')
+
+    def update(self, preds, hosts):
+        """Adds predictions for the flows of the passed hosts"""
+        codes, uniques = pd.factorize(np.asarray(hosts['srcaddr']))
+        return self.update_codes(preds, codes, uniques)
+
+    def update_codes(self, preds, codes, uniques, weights=None):
+        """Adds predictions for flows of hosts factorized into codes and uniques
+
+        If weights are passed, every flow stands for that many flows of its
+        host (see sample_flows), both in the sums and in the counts.
+        """
+        # Missing addresses get a code of -1 and are not aggregated
+        valid = codes >= 0
+        codes = codes[valid]
+        preds = np.asarray(preds, dtype='float64')[valid]
+
+        if weights is None:
+            sums = np.bincount(codes, weights=preds, minlength=len(uniques))
+            counts = np.bincount(codes, minlength=len(uniques))
+        else:
+            weights = weights[valid]
+            sums = np.bincount(codes, weights=preds * weights, minlength=len(uniques))
+            counts = np.bincount(codes, weights=weights, minlength=len(uniques))
+            counts = np.rint(counts).astype('int64')
+
+        # Hosts of removed flows may still be among the uniques
+        present = counts > 0
+        return self.add(uniques[present], sums[present], counts[present])
+
+    def merge(self, other):
+        """Adds the sums and counts of another HostAggregate to this one"""
+        n = len(other)
+        return self.add(other.hosts, other.sums[:n], other.counts[:n])
+
+    def add(self, hosts, sums, counts):
+        """Adds sums and counts of unique hosts to the aggregate"""
+        positions = self.positions(hosts, create=True)
+        self.sums[positions] += sums
+        self.counts[positions] += counts
+        return self
+
+    def positions(self, hosts, create=False):
+        """Returns positions of hosts, -1 for unknown ones unless create is set"""
+        if create and not self.hosts:
+            # Hosts are unique, so all of them can be added at once
+            self.hosts = list(hosts)
+            self.index = dict(zip(self.hosts, range(len(self.hosts))))
+            self._reserve(len(self.hosts))
+            return np.arange(len(self.hosts))
+
+        positions = np.empty(len(hosts), dtype='int64')
+        for i, host in enumerate(hosts):
+            position = self.index.get(host)
+            if position is None:
+                if not create:
+                    positions[i] = -1
+                    continue
+                position = self.index[host] = len(self.hosts)
+                self.hosts.append(host)
+            positions[i] = position
+
+        self._reserve(len(self.hosts))
+        return positions
+
+    def _reserve(self, n):
+        # Grows the arrays geometrically so adding hosts is amortized O(1)
+        capacity = self.sums.shape[0]
+        if n <= capacity:
+            return
+        capacity = max(n, 2 * capacity, 1024)
+        self.sums = np.concatenate([self.sums, np.zeros(capacity - self.sums.shape[0])])
+        self.counts = np.concatenate([
+            self.counts, np.zeros(capacity - self.counts.shape[0], dtype='int64')
+        ])
+
+    def get(self, hosts):
+        """Returns a dataframe with the mean score and count of known hosts"""
+        positions = self.positions(hosts)
+        positions = positions[positions >= 0]
+        return self._frame(positions)
+
+    @property
+    def table(self):
+        """Dataframe of all hosts with their mean score and flow count"""
+        return self._frame(np.arange(len(self)))
+
+    def _frame(self, positions):
+        counts = self.counts[positions]
+        return pd.DataFrame({
+            'host': [self.hosts[i] for i in positions],
+            'mean': self.sums[positions] / np.maximum(counts, 1),
+            'count': counts
+        })
+
+    def evaluate(self, threshold=.5, min_count=0):
+        """Returns a dataframe with hosts whose mean score is above threshold"""
+        preds = self.table
+        if min_count > 0:
+            preds = preds[preds['count'] > min_count]
+
+        preds = preds[preds['mean'] >= threshold]  # Only return infected hosts
+        preds = preds.sort_values('mean', ascending=False, kind='mergesort')
+        return preds.reset_index(drop=True)
+
+    def __len__(self):
+        return len(self.hosts)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} of {len(self)} hosts'
@@ -0,0 +1,290 @@
+import click
+import json
+import struct
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from botrecon.cli import FILETYPES
+from botrecon.data import Data, get_data, get_data_chunked
+from botrecon.inputs import SCHEMA
+
+# Columns of a capture and how they are stored, ports are stored as the
+# strings the bundled models see (see PreparedModel) so they do not depend on
+# the dtype they were read as
+COLUMNS = {
+    'proto': 'category',
+    'dport': 'category',
+    'sport': 'category',
+    'state': 'category',
+    'dur': 'float64',
+    'totbytes': 'float64',
+    'srcbytes': 'float64',
+    'bps': 'float64'
+}
+CATEGORY_CODES = 'int32'
+HOST_CODES = 'srcaddr'
+VERSION = 2
+# Fixed size of the .npy headers, so the row count can be written at the end
+HEADER_SIZE = 128
+# Rows passed to the model at once, unless --stream-chunk-rows is passed
+CHUNK_ROWS = 1_000_000
+
+
+class BinaryCapture(object):
+    """A capture of prepared flows stored as a directory of .npy files
+
+    Every column of Data prepared for the bundled models is a separate .npy
+    file, categorical columns (protocols, ports and states) hold codes into
+    their categories from schema.json, and the hosts are stored as codes into
+    the unique addresses, also from schema.json. The files are memory-mapped,
+    so only the rows of the chunks being scored are read from disk, without
+    parsing or preparing them again.
+
+    Attributes:
+    path          pathlib.Path   the directory of the capture
+    rows          int            number of flows
+    columns       dict           memory-mapped arrays of every column
+    categories    dict           categories of the categorical columns
+    host_codes    numpy.memmap   codes of the source address of every flow
+    host_uniques  numpy.ndarray  unique source addresses
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        schema = json.loads((self.path / SCHEMA).read_text())
+        if schema.get('version') != VERSION:
+            raise ValueError(f'Unsupported binary capture version {schema.get("version")} '
+                             f'in {path}, convert it again with `botrecon convert`')
+        if list(schema['columns']) != list(COLUMNS):
+            raise ValueError(f'Invalid binary capture {path}, expected the columns '
+                             f'{list(COLUMNS)}')
+
+        self.rows = schema['rows']
+        self.columns = {
+            name: np.load(self.path / f'{name}.npy', mmap_mode='r') for name in COLUMNS
+        }
+        self.categories = {
+            name: column['categories'] for name, column in schema['columns'].items()
+            if 'categories' in column
+        }
+        self.host_codes = np.load(self.path / f'{HOST_CODES}.npy', mmap_mode='r')
+        self.host_uniques = np.array(schema['hosts'], dtype=object)
+
+    def frame(self, start=0, stop=None):
+        """Returns a DataFrame of the rows from start to stop"""
+        stop = self.rows if stop is None else min(stop, self.rows)
+        columns = {}
+        for name, values in self.columns.items():
+            values = values[start:stop]
+            if name in self.categories:
+                values = pd.Categorical.from_codes(values, self.categories[name])
+            columns[name] = values
+        return pd.DataFrame(columns, index=pd.RangeIndex(start, stop))
+
+    def data(self, start=0, stop=None):
+        """Returns prepared Data of the rows from start to stop"""
+        stop = self.rows if stop is None else min(stop, self.rows)
+        codes = np.asarray(self.host_codes[start:stop], dtype='int64')
+        return Data.from_prepared(self.path, 'npy', self.frame(start, stop),
+                                  codes, self.host_uniques)
+
+    def chunks(self, chunk_rows=CHUNK_ROWS):
+        """Yields prepared Data of consecutive chunks of at most chunk_rows rows"""
+        for start in range(0, self.rows, chunk_rows):
+            yield self.data(start, start + chunk_rows)
+
+
+class CaptureWriter(object):
+    """Writes prepared Data to a binary capture, chunk by chunk
+
+    Codes of categories and hosts are assigned in order of appearance over
+    all chunks. The capture is only complete once the writer is closed. Used
+    as a context manager, a writer left with an error removes its partial
+    capture instead.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.created = not self.path.exists()
+        self.path.mkdir(parents=True, exist_ok=True)
+        # An unfinished capture must not be read
+        try:
+            (self.path / SCHEMA).unlink()
+        except FileNotFoundError:
+            pass
+
+        self.rows = 0
+        self.categories = {name: {} for name, kind in COLUMNS.items() if kind == 'category'}
+        self.hosts = {}
+        self.dtypes = {
+            name: CATEGORY_CODES if kind == 'category' else kind
+            for name, kind in COLUMNS.items()
+        }
+        self.dtypes[HOST_CODES] = 'int64'
+        self.files = {}
+        for name in self.dtypes:
+            self.files[name] = open(self.path / f'{name}.npy', 'wb')
+            self.files[name].write(b'\0' * HEADER_SIZE)
+
+    def write(self, data):
+        """Appends the rows of prepared Data to the capture"""
+        for name, kind in COLUMNS.items():
+            values = data.data[name]
+            if name in Data.STRING_COLUMNS:
+                values = values.astype(str)
+            if kind == 'category':
+                values = self._codes(self.categories[name], values)
+            self._append(name, values)
+
+        lookup = self._lookup(self.hosts, data.host_uniques)
+        codes = np.asarray(data.host_codes)
+        self._append(HOST_CODES, np.where(codes >= 0, lookup[codes], -1))
+        self.rows += data.data.shape[0]
+
+    @staticmethod
+    def _lookup(codes, uniques):
+        # Padded, so that the code -1 of missing values can be looked up
+        lookup = [codes.setdefault(value, len(codes)) for value in uniques]
+        return np.array(lookup + [-1], dtype='int64')
+
+    def _codes(self, categories, values):
+        codes, uniques = pd.factorize(values)
+        return self._lookup(categories, uniques)[codes]
+
+    def _append(self, name, values):
+        values = np.ascontiguousarray(values, dtype=self.dtypes[name])
+        self.files[name].write(values.astype(values.dtype.newbyteorder('<')).tobytes())
+
+    def close(self):
+        for name, file in self.files.items():
+            file.seek(0)
+            file.write(npy_header(self.dtypes[name], self.rows))
+            file.close()
+
+        schema = {
+            'version': VERSION,
+            'rows': self.rows,
+            'columns': {
+                name: {'categories': list(self.categories[name])}
+                if kind == 'category' else {'dtype': kind}
+                for name, kind in COLUMNS.items()
+            },
+            'hosts': list(self.hosts)
+        }
+        (self.path / SCHEMA).write_text(json.dumps(schema))
+
+    def discard(self):
+        """Removes the partially written capture"""
+        for name, file in self.files.items():
+            file.close()
+            try:
+                (self.path / f'{name}.npy').unlink()
+            except FileNotFoundError:
+                pass
+        if self.created:
+            self.path.rmdir()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+def npy_header(dtype, rows):
+    """Returns a .npy (version 1.0) header of HEADER_SIZE bytes for a 1-d array"""
+    descr = np.lib.format.dtype_to_descr(np.dtype(dtype).newbyteorder('<'))
+    header = repr({'descr': descr, 'fortran_order': False, 'shape': (rows,)})
+    header = header.ljust(HEADER_SIZE - 11) + '\n'
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1')
+
+
+@click.command(
+    epilog="For a more detailed documentation see README.md\n"
+           "https://github.com/mhubl/botrecon"
+)
+@click.option(
+    "-t",
+    "--type",
+    "ftype",
+    default="csv",
+    show_default=True,
+    type=click.Choice([t for t in FILETYPES if t != 'npy']),
+    help='Type of the input file.'
+)
+@click.option(
+    '--chunk-rows',
+    type=click.IntRange(min=1),
+    default=None,
+    help='Read and convert the input in chunks of this many rows. Ports are '
+         'then prepared per chunk, like with --stream-chunk-rows. Only '
+         'supported for csv and parquet files.'
+)
+@click.option(
+    "-v",
+    "--verbose",
+    "verbosity",
+    flag_value=1,
+    help="Print the number of converted rows."
+)
+@click.option(
+    "--normal-verbostity",
+    "verbosity",
+    flag_value=0,
+    default=True,
+    hidden=True
+)
+@click.option(
+    "-d",
+    "--debug",
+    is_flag=True,
+    default=False,
+    help="Enable debug mode."
+)
+@click.help_option('-h', '--help')
+@click.argument(
+    "input_file",
+    required=True,
+    type=click.Path(exists=True, dir_okay=False, readable=True)
+)
+@click.argument(
+    "output_dir",
+    required=True,
+    type=click.Path(file_okay=False, writable=True)
+)
+def convert(input_file, output_dir, ftype, chunk_rows, **kwargs):
+    """Convert a capture to the binary npy format read with `--type npy`
+
+    INPUT_FILE is loaded and prepared for the bundled models like botrecon
+    would, and written to the OUTPUT_DIR directory as memory-mappable .npy
+    files. Scoring it with `botrecon --type npy OUTPUT_DIR` skips parsing and
+    preparing the data. Captures in this format cannot be scored with custom
+    models.
+    """
+    ctx = click.get_current_context()
+    if chunk_rows and ftype not in Data.CHUNK_READERS:
+        param = next(p for p in ctx.command.params if p.name == 'chunk_rows')
+        raise click.BadParameter(
+            f'Chunks are not supported for filetype "{ftype}", must be one '
+            f'of {list(Data.CHUNK_READERS.keys())}',
+            ctx, param
+        )
+
+    try:
+        if chunk_rows:
+            chunks = get_data_chunked(input_file, ftype, chunk_rows)
+        else:
+            chunks = [get_data(input_file, ftype)]
+        with CaptureWriter(output_dir) as writer:
+            for data in chunks:
+                writer.write(data)
+    except Exception as e:
+        if ctx.params['debug']:
+            raise
+        else:
+            ctx.fail(e)
+
+    if ctx.params['verbosity'] > 0 or ctx.params['debug']:
+        click.echo(f'Converted {writer.rows} rows of {len(writer.hosts)} hosts '
+                   f'to {output_dir}')
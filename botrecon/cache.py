@@ -0,0 +1,356 @@
+import hashlib
+import pickle
+import sqlite3
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+
+class ScoreCache(object):
+    """On-disk cache of the scores of prepared rows, kept in a sqlite database
+
+    Rows are identified by two independent 64 bit hashes of their values and
+    a fingerprint of the model that scored them, so the same cache can be
+    shared by several models. Once the cache holds more than max_rows scores,
+    the least recently used ones are evicted when it is closed.
+
+    Attributes:
+    path         pathlib.Path  path of the database file
+    fingerprint  string        fingerprint of the model whose scores are used
+    max_rows     int           number of scores kept after eviction
+    lookups      int           number of rows looked up so far
+    hits         int           number of rows found in the cache so far
+    lookup_time  float         seconds spent hashing and looking up rows
+    """
+    FILENAME = 'scores.sqlite'
+    VERSION = 1
+    # The first key is the default one of hash_pandas_object
+    HASH_KEYS = ('0123456789123456', 'botrecon-scores!')
+
+    def __init__(self, directory, model, max_rows=5_000_000):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        self.path = directory / ScoreCache.FILENAME
+        self.max_rows = max_rows
+        self.lookups = 0
+        self.hits = 0
+        self.lookup_time = 0.
+
+        # Worker processes scoring several files may share the database, and
+        # models of an ensemble use it from threads, one at a time
+        self.db = sqlite3.connect(str(self.path), timeout=60, check_same_thread=False)
+        self._create_tables()
+        self.fingerprint = self.model_fingerprint(model)
+
+    def _create_tables(self):
+        # Transactions take the write lock right away, so that processes
+        # sharing the database wait for each other instead of deadlocking
+        self.db.execute('BEGIN IMMEDIATE')
+        version = self.db.execute('PRAGMA user_version').fetchone()[0]
+        if version != ScoreCache.VERSION:
+            # Hashes of an older version may not match the same rows anymore
+            self.db.execute('DROP TABLE IF EXISTS scores')
+            self.db.execute('DROP TABLE IF EXISTS models')
+            self.db.execute(f'PRAGMA user_version = {ScoreCache.VERSION}')
+
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS scores (
+                model TEXT, h1 INTEGER, h2 INTEGER, score REAL, used INTEGER,
+                PRIMARY KEY (model, h1, h2)
+            ) WITHOUT ROWID
+        ''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS scores_used ON scores (used)')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS models (
+                path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, digest TEXT
+            )
+        ''')
+        self.db.execute(
+            'CREATE TEMP TABLE lookup (pos INTEGER PRIMARY KEY, h1 INTEGER, h2 INTEGER)'
+        )
+        self.db.commit()
+
+    def model_fingerprint(self, model):
+        """Returns a digest of a model file or of an already loaded model
+
+        Digests of files are remembered together with their size and
+        modification time, so unchanged models are not read again.
+        """
+        if not isinstance(model, Path):
+            return hashlib.sha256(pickle.dumps(model, protocol=4)).hexdigest()
+
+        path = str(model.resolve())
+        stat = model.stat()
+        row = self.db.execute(
+            'SELECT digest FROM models WHERE path = ? AND size = ? AND mtime = ?',
+            (path, stat.st_size, stat.st_mtime_ns)
+        ).fetchone()
+        if row is not None:
+            return row[0]
+
+        digest = hashlib.sha256()
+        with open(model, 'rb') as f:
+            for block in iter(lambda: f.read(2**20), b''):
+                digest.update(block)
+        digest = digest.hexdigest()
+
+        self.db.execute('INSERT OR REPLACE INTO models VALUES (?, ?, ?, ?)',
+                        (path, stat.st_size, stat.st_mtime_ns, digest))
+        self.db.commit()
+        return digest
+
+    @staticmethod
+    def hash_rows(data):
+        """Returns an array with two independent signed 64 bit hashes per row"""
+        hashes = [
+            pd.util.hash_pandas_object(data, index=False, hash_key=key).to_numpy()
+            for key in ScoreCache.HASH_KEYS
+        ]
+        # sqlite only stores signed integers
+        return np.column_stack(hashes).view('int64')
+
+    def lookup(self, data):
+        """Looks up the scores of all rows of data at once
+
+        Returns the row hashes, an array of scores (nan for rows not found)
+        and a boolean mask of the rows that were not found.
+        """
+        start = time.perf_counter()
+        keys = ScoreCache.hash_rows(data)
+        scores = np.full(keys.shape[0], np.nan)
+
+        self.db.execute('BEGIN IMMEDIATE')
+        self.db.executemany('INSERT INTO lookup VALUES (?, ?, ?)',
+                            ((i, h1, h2) for i, (h1, h2) in enumerate(keys.tolist())))
+        found = self.db.execute('''
+            SELECT lookup.pos, scores.score FROM lookup JOIN scores
+            ON scores.model = ? AND scores.h1 = lookup.h1 AND scores.h2 = lookup.h2
+        ''', (self.fingerprint,)).fetchall()
+        self.db.execute('''
+            UPDATE scores SET used = ? WHERE model = ?
+            AND (h1, h2) IN (SELECT h1, h2 FROM lookup)
+        ''', (time.time_ns(), self.fingerprint))
+        self.db.execute('DELETE FROM lookup')
+        self.db.commit()
+
+        missing = np.ones(keys.shape[0], dtype=bool)
+        if found:
+            positions, values = zip(*found)
+            positions = np.array(positions)
+            scores[positions] = values
+            missing[positions] = False
+
+        self.lookups += keys.shape[0]
+        self.hits += keys.shape[0] - missing.sum()
+        self.lookup_time += time.perf_counter() - start
+        return keys, scores, missing
+
+    def store(self, keys, scores):
+        """Saves the scores of rows with the passed hashes"""
+        used = time.time_ns()
+        rows = zip(keys[:, 0].tolist(), keys[:, 1].tolist(),
+                   np.asarray(scores, dtype='float64').tolist())
+        self.db.executemany(
+            'INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?)',
+            ((self.fingerprint, h1, h2, score, used) for h1, h2, score in rows)
+        )
+        self.db.commit()
+
+    def evict(self):
+        """Removes the least recently used scores above max_rows"""
+        self.db.execute('BEGIN IMMEDIATE')
+        n_rows = self.db.execute('SELECT count(*) FROM scores').fetchone()[0]
+        if n_rows <= self.max_rows:
+            self.db.commit()
+            return 0
+
+        self.db.execute('''
+            DELETE FROM scores WHERE (model, h1, h2) IN (
+                SELECT model, h1, h2 FROM scores ORDER BY used LIMIT ?
+            )
+        ''', (n_rows - self.max_rows,))
+        self.db.commit()
+        return n_rows - self.max_rows
+
+    def close(self):
+        self.evict()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.db.execute('SELECT count(*) FROM scores').fetchone()[0]
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} at {self.path}'
+
+
+class DataCache(object):
+    """On-disk cache of prepared data, kept as uncompressed feather files
+
+    Entries are keyed by a digest of the contents of the input file, how it
+    was read and prepared and Data.TRANSFORM_VERSION, so they are also found
+    for copies of a file and never used for outdated transformations. Digests
+    of inputs are remembered together with their path, size and modification
+    time, so unchanged files are not read again. Entries are memory-mapped
+    when loaded, so columns are only read from disk when they are used. Once
+    the entries take more than max_bytes, the least recently used ones are
+    removed.
+
+    Attributes:
+    directory  pathlib.Path  directory of the index and the entries
+    max_bytes  int           size of the entries kept after eviction
+    """
+    FILENAME = 'data.sqlite'
+    VERSION = 1
+    # Column of the feather files holding the codes of the hosts
+    HOST_CODES = '__host_code'
+
+    def __init__(self, directory, max_bytes=4 * 2**30):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+        self.db = sqlite3.connect(str(self.directory / DataCache.FILENAME), timeout=60)
+        self.db.execute('BEGIN IMMEDIATE')
+        version = self.db.execute('PRAGMA user_version').fetchone()[0]
+        if version != DataCache.VERSION:
+            self.db.execute('DROP TABLE IF EXISTS inputs')
+            self.db.execute('DROP TABLE IF EXISTS entries')
+            self.db.execute(f'PRAGMA user_version = {DataCache.VERSION}')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS inputs (
+                path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, digest TEXT
+            )
+        ''')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY, bytes INTEGER, used INTEGER
+            )
+        ''')
+        self.db.commit()
+
+    def input_digest(self, path):
+        """Returns a digest of the contents of the file at path"""
+        path = Path(path)
+        resolved = str(path.resolve())
+        stat = path.stat()
+        row = self.db.execute(
+            'SELECT digest FROM inputs WHERE path = ? AND size = ? AND mtime = ?',
+            (resolved, stat.st_size, stat.st_mtime_ns)
+        ).fetchone()
+        if row is not None:
+            return row[0]
+
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(2**20), b''):
+                digest.update(block)
+        digest = digest.hexdigest()
+
+        self.db.execute('INSERT OR REPLACE INTO inputs VALUES (?, ?, ?, ?)',
+                        (resolved, stat.st_size, stat.st_mtime_ns, digest))
+        self.db.commit()
+        return digest
+
+    def key(self, path, filetype, no_transforms=False):
+        """Returns the key of the prepared data of the file at path"""
+        from botrecon.data import Data
+        parts = [self.input_digest(path), filetype, str(bool(no_transforms)),
+                 str(Data.TRANSFORM_VERSION)]
+        return hashlib.sha256(':'.join(parts).encode()).hexdigest()[:32]
+
+    def paths(self, key):
+        """Returns the paths of the data and the unique hosts of an entry"""
+        return (self.directory / f'{key}.feather',
+                self.directory / f'{key}.hosts.feather')
+
+    def load(self, key, path, filetype):
+        """Returns the cached prepared Data of key or None if it is not cached"""
+        import pyarrow.feather as feather
+        from botrecon.data import Data
+
+        self.db.execute('BEGIN IMMEDIATE')
+        found = self.db.execute('UPDATE entries SET used = ? WHERE key = ?',
+                                (time.time_ns(), key)).rowcount
+        self.db.commit()
+        data_path, hosts_path = self.paths(key)
+        if not found or not data_path.exists() or not hosts_path.exists():
+            return None
+
+        table = feather.read_table(str(data_path), memory_map=True)
+        codes = table.column(DataCache.HOST_CODES).to_numpy()
+        frame = table.drop([DataCache.HOST_CODES]).to_pandas(split_blocks=True)
+        uniques = feather.read_table(str(hosts_path)).column(0)
+        uniques = uniques.to_numpy(zero_copy_only=False).astype(object)
+        return Data.from_prepared(path, filetype, frame, codes, uniques)
+
+    def store(self, key, data):
+        """Saves prepared Data under key, then evicts old entries if needed"""
+        import os
+        import pyarrow as pa
+        import pyarrow.feather as feather
+
+        table = pa.Table.from_pandas(data.data, preserve_index=False)
+        codes = np.asarray(data.host_codes, dtype='int64')
+        table = table.append_column(DataCache.HOST_CODES, pa.array(codes))
+        hosts = pa.Table.from_pandas(
+            pd.DataFrame({'srcaddr': data.host_uniques}), preserve_index=False
+        )
+
+        # Written under temporary names first, so readers never see partial files
+        data_path, hosts_path = self.paths(key)
+        size = 0
+        for written, path in [(hosts, hosts_path), (table, data_path)]:
+            temporary = path.with_name(f'.{path.name}.{os.getpid()}')
+            feather.write_feather(written, str(temporary), compression='uncompressed')
+            size += temporary.stat().st_size
+            os.replace(temporary, path)
+
+        self.db.execute('BEGIN IMMEDIATE')
+        self.db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?)',
+                        (key, size, time.time_ns()))
+        self.db.commit()
+        self.evict()
+
+    def evict(self):
+        """Removes the least recently used entries above max_bytes"""
+        self.db.execute('BEGIN IMMEDIATE')
+        entries = self.db.execute(
+            'SELECT key, bytes FROM entries ORDER BY used DESC'
+        ).fetchall()
+
+        total, evicted = 0, []
+        for key, size in entries:
+            total += size
+            if total > self.max_bytes:
+                evicted.append(key)
+        for key in evicted:
+            self.db.execute('DELETE FROM entries WHERE key = ?', (key,))
+            for path in self.paths(key):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+        self.db.commit()
+        return len(evicted)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.db.execute('SELECT count(*) FROM entries').fetchone()[0]
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} at {self.directory}'
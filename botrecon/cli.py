@@ -1,14 +1,47 @@
 import click
-from botrecon import get_data, Data
-from botrecon import get_predictions
-from botrecon import handle_output
-from botrecon import IPEntity
+import sys
+from botrecon import __version__
 from datetime import datetime
 from pathlib import Path
 
+# The rest of botrecon is imported where it is needed, so that --help,
+# --version and parameter validation do not import the scientific stack.
+
+# Same as the keys of Data.READERS, which would require importing pandas, and
+# npy for binary captures written by `botrecon convert` (see botrecon.binary)
+FILETYPES = ['csv', 'feather', 'fwf', 'stata', 'json', 'pickle', 'parquet', 'excel',
+             'npy']
+
+# Formats OUTPUT_FILE and --flow-scores can be written in, see botrecon.output
+OUTPUT_FORMATS = ['csv', 'parquet', 'jsonl']
+
+# Commands run as `botrecon NAME ...`, mapped to the modules defining them
+SUBCOMMANDS = {
+    'serve': 'botrecon.server',
+    'convert': 'botrecon.binary'
+}
+
+
+class BotreconCommand(click.Command):
+    """The main botrecon command, which also dispatches to SUBCOMMANDS
+
+    botrecon takes the input file as its first argument, so it cannot be a
+    click group. Subcommands are instead recognized by the first argument.
+    """
+    def main(self, args=None, prog_name=None, **extra):
+        args = list(sys.argv[1:] if args is None else args)
+        if args and args[0] in SUBCOMMANDS:
+            from importlib import import_module
+            name = args[0]
+            command = getattr(import_module(SUBCOMMANDS[name]), name)
+            prog_name = f'{prog_name or self.name} {name}'
+            return command.main(args[1:], prog_name, **extra)
+        return super().main(args, prog_name, **extra)
+
 
 def get_ips_from_file(path):
     """Returns a list of IPEntities for each IP/range in the passed file"""
+    from botrecon.ip import IPEntity
     ips = path.read_text()
     ips = ips.split('\n')
     return [IPEntity(ip) for ip in ips]
@@ -25,9 +58,13 @@ def parse_jobs(ctx, param, value):
 
 
 def parse_ip(ctx, param, value):
-    """Converts IPs or files with IPs to a list of IPEntity objects"""
-    from os import access, R_OK
+    """Converts IPs or files with IPs to an IPRangeIndex of IPEntity objects
+
+    The index is built once here and reused by every filtered chunk or file.
+    """
     if value:
+        from os import access, R_OK
+        from botrecon.ip import IPEntity, IPRangeIndex
         res = []
         for item in value:
             try:
@@ -42,49 +79,197 @@ def parse_ip(ctx, param, value):
                         raise click.BadParameter(str(err))
                 else:
                     raise click.BadParameter(str(err) + ' (and is not a readable file)')
-        return res
+        return IPRangeIndex(res) if res else res
     else:
         return value
 
 
 def parse_model(ctx, param, value):
-    """Returns the path or model name depending on if a custom one was passed"""
+    """Returns the path or model name depending on if a custom one was passed
+
+    Several model names are returned as a tuple, without duplicates.
+    """
     params = ctx.params
     if "custom_model" in params and params["custom_model"] is not None:
         return Path(params["custom_model"])
     elif value is None:
         return ctx.default_map['model']
+    elif isinstance(value, tuple):
+        value = tuple(dict.fromkeys(value))
+        return value[0] if len(value) == 1 else value
     else:
         return value
 
 
 def parse_batchify(ctx, param, value):
     """Validates the logic behind passed batchify option values"""
-    if value == (0, ''):
-        return value
-
-    typ = value[1]
-    val = value[0]
+    val, typ = value
+    if not typ:
+        return (0, '')
 
     if typ == 'percent':
         typ = "%"
-        value = (val, typ)
+
+    try:
+        if typ == 'memory':
+            val = parse_size(val)
+        else:
+            val = float(val)
+    except ValueError:
+        raise click.BadParameter(f'Invalid value {val} for type "{typ}"')
 
     if typ == '%':
         if not (0 < val < 100):
             err = f'Invalid value for type "%". Must be between 0 and 100, got {val}'
         else:
-            return value
+            return (val, typ)
     elif typ == 'batches':
         return (int(val), typ)
+    elif typ in ('rows', 'memory'):
+        if val < 1:
+            err = f'Invalid value for type "{typ}". Must be at least 1, got {value[0]}'
+        else:
+            return (int(val), typ)
     else:
-        err = f'Invalid type {typ}, must be either "%" or "batches"'
+        err = f'Invalid type {typ}, must be one of "%", "batches", "rows" or "memory"'
 
     raise click.BadParameter(err)
 
 
+def parse_memory_limit(ctx, param, value):
+    """Converts the memory limit to a number of bytes"""
+    if value is None:
+        return None
+    try:
+        size = parse_size(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    if size < 1:
+        raise click.BadParameter(f'The memory limit must be positive, got {value}')
+    return size
+
+
+def parse_cache_size(ctx, param, value):
+    """Converts the size of a cache to a number of bytes"""
+    try:
+        size = parse_size(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    if size < 1:
+        raise click.BadParameter(f'The size must be positive, got {value}')
+    return size
+
+
+def parse_size(value):
+    """Converts a size such as 512MB or 1.5GiB to a number of bytes
+
+    Units are powers of 1024, a number without a unit is a number of bytes.
+    """
+    import re
+
+    match = re.fullmatch(r'\s*([0-9]*\.?[0-9]+)\s*([kmgt]?)(i?b)?\s*', str(value).lower())
+    if match is None:
+        raise ValueError(f'Invalid size: {value}')
+    number, unit = float(match.group(1)), match.group(2)
+    return int(number * 1024 ** ' kmgt'.index(unit or ' '))
+
+
+def parse_inputs(ctx, param, value):
+    """Validates that input paths exist or match some files"""
+    from botrecon.inputs import find_inputs
+    paths = value if param.multiple else [value]
+    try:
+        find_inputs(paths)
+    except FileNotFoundError as e:
+        raise click.BadParameter(str(e))
+    return value
+
+
+def check_following(ctx, ftype):
+    """Validates that following is used with options that support it"""
+    param = next(p for p in ctx.command.params if p.name == 'follow')
+    if ftype != 'csv':
+        raise click.BadParameter(
+            f'Following is only supported for csv files, got "{ftype}"',
+            ctx, param
+        )
+    if ctx.params['batchify'][0] or ctx.params['stream_chunk_rows']:
+        raise click.BadParameter(
+            'Cannot be combined with --batchify or --stream-chunk-rows, new '
+            'rows are already read and predicted in small chunks',
+            ctx, param
+        )
+    if ctx.params['add_input'] or not Path(ctx.params['input_file']).is_file():
+        raise click.BadParameter('Only a single file can be followed', ctx, param)
+
+
+def check_streaming(ctx, ftype):
+    """Validates that streaming is used with options that support it"""
+    from botrecon.data import Data
+    param = next(p for p in ctx.command.params if p.name == 'stream_chunk_rows')
+    if ftype not in Data.CHUNK_READERS and ftype != 'npy':
+        raise click.BadParameter(
+            f'Streaming is not supported for filetype "{ftype}", must be one '
+            f'of {list(Data.CHUNK_READERS.keys()) + ["npy"]}',
+            ctx, param
+        )
+    if ctx.params['batchify'][0]:
+        raise click.BadParameter(
+            'Cannot be combined with --batchify, use a smaller number of rows '
+            'per chunk instead',
+            ctx, param
+        )
+
+
+def check_binary(ctx, custom_model):
+    """Validates that binary captures are scored with a bundled model"""
+    if custom_model:
+        param = next(p for p in ctx.command.params if p.name == 'ftype')
+        raise click.BadParameter(
+            'Binary captures hold data prepared for the bundled models, custom '
+            'models need the original file',
+            ctx, param
+        )
+
+
+def check_ensemble(ctx):
+    """Validates that several models are used with options that support it"""
+    param = next(p for p in ctx.command.params if p.name == 'model')
+    for name in ['follow', 'shards', 'batchify', 'parallel_batches',
+                 'memory_limit', 'flow_scores']:
+        if ctx.params[name] and (name != 'batchify' or ctx.params[name][0]):
+            option = next(p for p in ctx.command.params if p.name == name)
+            raise click.BadParameter(
+                f'Several models cannot be combined with {option.opts[-1]}',
+                ctx, param
+            )
+
+
+def check_sharding(ctx, ftype):
+    """Validates that sharding is used with options that support it"""
+    from botrecon.data import Data
+    param = next(p for p in ctx.command.params if p.name == 'shards')
+    if ftype not in Data.CHUNK_READERS:
+        raise click.BadParameter(
+            f'Sharding is not supported for filetype "{ftype}", must be one '
+            f'of {list(Data.CHUNK_READERS.keys())}',
+            ctx, param
+        )
+    if ctx.params['follow']:
+        raise click.BadParameter('Cannot be combined with --follow', ctx, param)
+    if ctx.params['shards'] is None:
+        raise click.BadParameter('Required by --partition-only', ctx, param)
+    if ctx.params['partition_only'] and ctx.params['shard_dir'] is None:
+        param = next(p for p in ctx.command.params if p.name == 'shard_dir')
+        raise click.BadParameter('Required by --partition-only', ctx, param)
+
+
 @click.command(
-    epilog="For a more detailed documentation see README.md\n"
+    cls=BotreconCommand,
+    epilog="To keep a model loaded and score files sent over a local socket see "
+           "`botrecon serve --help`. To convert files to binary captures see "
+           "`botrecon convert --help`.\n\n"
+           "For a more detailed documentation see README.md\n"
            "https://github.com/mhubl/botrecon"
 )
 @click.option(
@@ -101,14 +286,25 @@ def parse_batchify(ctx, param, value):
 @click.option(
     "-m",
     "--model",
-    default="rforest",
+    default=["rforest"],
     show_default=True,
+    multiple=True,
     callback=parse_model,
     type=click.Choice(["rforest", "svm", "rforest-experimental"], case_sensitive=False),
     help="One of the available, predefined models for classifying the "
          "traffic. This parameter is ignored if --custom-model/-M is "
          "passed. A description of all available models can be found "
-         "in README.md")
+         "in README.md. Can be passed several times to score the data with "
+         "every model at once, see --ensemble.")
+@click.option(
+    '--ensemble',
+    type=click.Choice(['any', 'majority', 'all']),
+    default='any',
+    show_default=True,
+    help='Which hosts are listed when several --model are passed: hosts '
+         'flagged as infected by any, a majority or all of the models. The '
+         'output has the mean score of every model and their number of votes.'
+)
 @click.option(
     '-j',
     '--jobs',
@@ -132,17 +328,177 @@ def parse_batchify(ctx, param, value):
 @click.option(
     '-b',
     '--batchify',
-    type=(click.FLOAT, click.STRING),
+    type=(click.STRING, click.STRING),
     default=(0, ''),
     callback=parse_batchify,
     help='Divide data into batches before predicting. Helpful for classifiers '
          'that have high memory usage or for large amounts of data. To use specify '
-         'a value and then type. Type can be either "%" or "batches". If "%" the '
-         'value has to be a float between 0 and 100. If "batches" it has to be '
-         'a positive integer lower than the number of rows in data (after filtering). '
+         'a value and then type. Type can be "%", "batches", "rows" or "memory". '
+         'If "%" the value has to be a float between 0 and 100. If "batches" it '
+         'has to be a positive integer lower than the number of rows in data '
+         '(after filtering). If "rows" it is the number of rows in every batch, '
+         'and if "memory" the size of the data in every batch, such as 512MB. '
+         'Batches are made one at a time, so only one of them is in memory. '
          'If no verbosity options are passed, this enables a progress bar for '
          'predicting. Example: `--batchify 5 %`'
 )
+@click.option(
+    '--memory-limit',
+    default=None,
+    callback=parse_memory_limit,
+    help='Memory (such as 4GB) botrecon should stay under while predicting. '
+         'The memory used per row is estimated from the model and the data is '
+         'split into batches that fit in what is left after loading it. '
+         'Streamed chunks and followed rows are split on their own. Only used '
+         'if --batchify is not passed.'
+)
+@click.option(
+    '-p',
+    '--parallel-batches',
+    is_flag=True,
+    default=False,
+    help='Predict batches in a pool of worker processes, each loading the '
+         'model once. The number of processes is set with --jobs. Only applies '
+         'if --batchify is used and the classifier does not support '
+         'multiprocessing on its own (such as svm). Note that every process '
+         'needs memory for the model and a batch.'
+)
+@click.option(
+    '-u',
+    '--dedup',
+    is_flag=True,
+    default=False,
+    help='Only pass unique rows to the model and copy their scores to the '
+         'identical ones. Does not change the results, but makes predicting '
+         'much faster for captures with a lot of repeated flows (such as '
+         'scans or beaconing).'
+)
+@click.option(
+    '--max-flows-per-host',
+    type=click.IntRange(min=1),
+    default=None,
+    help='Only predict a random sample of at most this many flows of every '
+         'host (of every chunk with --stream-chunk-rows or --follow, and of '
+         'every file). Mean scores are estimated from the sample, while flow '
+         'counts and --min-count still use all flows. Bounds the time spent '
+         'predicting hosts with a lot of flows, such as resolvers or gateways.'
+)
+@click.option(
+    '--sample-seed',
+    type=int,
+    default=0,
+    show_default=True,
+    help='Seed of the random sample of --max-flows-per-host. The same seed '
+         'samples the same flows of a file.'
+)
+@click.option(
+    '--score-cache',
+    default=None,
+    type=click.Path(file_okay=False, writable=True),
+    help='Directory of a cache of scores. Rows that were already scored by the '
+         'same model are not predicted again, which is useful when scoring '
+         'overlapping captures. The directory is created if it does not exist.'
+)
+@click.option(
+    '--score-cache-size',
+    type=click.IntRange(min=1),
+    default=5_000_000,
+    show_default=True,
+    help='Maximum number of scores kept in the --score-cache. The least '
+         'recently used ones are removed first.'
+)
+@click.option(
+    '--data-cache',
+    default=None,
+    type=click.Path(file_okay=False, writable=True),
+    help='Directory of a cache of prepared data. Files that were already '
+         'loaded and prepared are memory-mapped from the cache instead, which '
+         'is useful when scoring the same capture with different models or '
+         'options. The directory is created if it does not exist. Not used '
+         'with --stream-chunk-rows.'
+)
+@click.option(
+    '--data-cache-size',
+    default='4GB',
+    show_default=True,
+    callback=parse_cache_size,
+    help='Maximum size of the --data-cache, such as 500MB. The least recently '
+         'used files are removed first.'
+)
+@click.option(
+    '--stream-chunk-rows',
+    type=click.IntRange(min=1),
+    default=None,
+    help='Read and predict the data in chunks of this many rows, keeping only '
+         'per-host sums and counts in memory. Useful for captures that do not '
+         'fit in memory. Only supported for csv and parquet files and cannot '
+         'be combined with --batchify.'
+)
+@click.option(
+    '--shards',
+    type=click.IntRange(min=1),
+    default=None,
+    help='Partition the flows by source address into this many shard files '
+         'first, then score the shards one at a time or in parallel with '
+         '--jobs. Every host is in a single shard, so the results are exact '
+         'while only a shard has to fit in memory. Only supported for csv and '
+         'parquet files.'
+)
+@click.option(
+    '--shard-dir',
+    type=click.Path(file_okay=False, writable=True),
+    default=None,
+    help='Directory the --shards are written to and kept in. A temporary '
+         'directory removed afterwards is used by default.'
+)
+@click.option(
+    '--partition-only',
+    is_flag=True,
+    default=False,
+    help='Only write the --shards to --shard-dir and exit. The shards can then '
+         'be scored separately, e.g. on different machines, and their outputs '
+         'concatenated.'
+)
+@click.option(
+    '-f',
+    '--follow',
+    is_flag=True,
+    default=False,
+    help='Keep reading rows appended to INPUT_FILE and print changes in the '
+         'status of hosts as they happen, like `tail -f`. Stops after '
+         '--follow-timeout seconds without new data or when interrupted, then '
+         'outputs the final results. Only supported for csv files.'
+)
+@click.option(
+    '--follow-interval',
+    type=click.FloatRange(min=0),
+    default=1.,
+    show_default=True,
+    help='Seconds to wait before checking for new data when following.'
+)
+@click.option(
+    '--follow-timeout',
+    type=click.FloatRange(min=0),
+    default=None,
+    help='Stop following after this many seconds without new data. By default '
+         'botrecon follows until interrupted.'
+)
+@click.option(
+    '-o',
+    '--output-format',
+    type=click.Choice(OUTPUT_FORMATS),
+    default='csv',
+    show_default=True,
+    help='Format of OUTPUT_FILE and --flow-scores. parquet requires pyarrow.'
+)
+@click.option(
+    '--flow-scores',
+    type=click.Path(dir_okay=False, writable=True),
+    default=None,
+    help='Also write the score of every predicted flow to this file, with its '
+         'input file, row number and source address. Scores are appended as '
+         'every batch or chunk is predicted.'
+)
 @click.option(
     "-v",
     "--verbose",
@@ -171,6 +527,29 @@ def parse_batchify(ctx, param, value):
     default=False,
     help="Enable debug mode."
 )
+@click.option(
+    '--metrics-json',
+    type=click.Path(dir_okay=False, writable=True, allow_dash=True),
+    default=None,
+    help='Write the wall and cpu time, rows in and out and peak memory of '
+         'every stage (loading, preparing, filtering, predicting, ...) to this '
+         'JSON file, - for the standard error.'
+)
+@click.option(
+    '--profile',
+    'profile_dir',
+    type=click.Path(file_okay=False, writable=True),
+    default=None,
+    help='Save a cProfile dump of every stage to this directory, e.g. to be '
+         'viewed with pstats or snakeviz.'
+)
+@click.option(
+    '--profile-memory',
+    is_flag=True,
+    default=False,
+    help='Save tracemalloc snapshots of the memory allocated by every stage to '
+         'the --profile directory instead of cProfile dumps.'
+)
 @click.option(
     "-i",
     "--ignore-invalid",
@@ -205,22 +584,33 @@ def parse_batchify(ctx, param, value):
          "Currently the only prompt appears when more than 50 infected "
          "hosts were identified and no output file was specified."
 )
+@click.option(
+    "-a",
+    "--add-input",
+    multiple=True,
+    callback=parse_inputs,
+    type=click.Path(readable=True),
+    help='Additional file, directory or glob pattern to score together with '
+         'INPUT_FILE. Can be passed multiple times.'
+)
 @click.option(
     "-t",
     "--type",
     "ftype",
     default="csv",
     show_default=True,
-    type=click.Choice(list(Data.READERS.keys())),
+    type=click.Choice(FILETYPES),
     help='Type of the input file. Some types may require additional python '
-         'modules to work.'
+         'modules to work. npy reads binary captures written by `botrecon '
+         'convert`.'
 )
-@click.version_option(None, '-V', '--version')
+@click.version_option(__version__, '-V', '--version')
 @click.help_option('-h', '--help')
 @click.argument(
     "input_file",
     required=True,
-    type=click.Path(readable=True, exists=True)
+    callback=parse_inputs,
+    type=click.Path(readable=True)
 )
 @click.argument(
     "output_file",
@@ -236,8 +626,9 @@ def botrecon(model, input_file, ftype, output_file, **kwargs):
     model if it supports the scikit-learn API.
 
     INPUT_FILE is a path to the file with captured NetFlow traffic. Data should
-    be in a csv format unless a different --type is specified. BotRecon expects
-    the following data:
+    be in a csv format unless a different --type is specified. It can also be
+    a directory or a glob pattern, in which case all matching files are scored
+    together, in parallel with --jobs. BotRecon expects the following data:
 
       source address\n
       protocol\n
@@ -249,24 +640,121 @@ def botrecon(model, input_file, ftype, output_file, **kwargs):
       sourcebytes\n
 
     OUTPUT_FILE is a path to the desired output file location. It will be saved
-    as a .csv
+    as a .csv unless a different --output-format is specified.
     """
+    from botrecon.output import handle_output, start_flow_scores
+    from botrecon.metrics import stage, start_recording
+
     ctx = click.get_current_context()
 
+    if ctx.params['follow']:
+        check_following(ctx, ftype)
+    elif ctx.params['stream_chunk_rows']:
+        check_streaming(ctx, ftype)
+    if ctx.params['shards'] or ctx.params['partition_only']:
+        check_sharding(ctx, ftype)
+    if ftype == 'npy':
+        check_binary(ctx, isinstance(model, Path))
+    if isinstance(model, tuple):
+        check_ensemble(ctx)
+    if ctx.params['flow_scores'] and ctx.params['partition_only']:
+        param = next(p for p in ctx.command.params if p.name == 'flow_scores')
+        raise click.BadParameter('Cannot be combined with --partition-only', ctx, param)
+    if ctx.params['profile_memory'] and not ctx.params['profile_dir']:
+        param = next(p for p in ctx.command.params if p.name == 'profile_dir')
+        raise click.BadParameter('Required by --profile-memory', ctx, param)
+
     if ctx.params['verbosity'] >= 0:
         click.echo(f'[{str(datetime.now())}] BotRecon starting\n')
 
+    recorder = None
+    if ctx.params['metrics_json'] or ctx.params['profile_dir']:
+        recorder = start_recording(ctx, ctx.params['profile_dir'],
+                                   ctx.params['profile_memory'])
+
     if ctx.params['verbosity'] > 0 or ctx.params['debug']:
         click.echo('Loading data')
+    flow_scores = None
     try:
-        predictions = get_predictions(
-            get_data(input_file, ftype, isinstance(model, Path)),
-            model
-        )
+        if ctx.params['flow_scores']:
+            flow_scores = start_flow_scores(ctx, ctx.params['flow_scores'],
+                                            ctx.params['output_format'])
+        if ctx.params['partition_only']:
+            partition_file(input_file, ftype)
+        else:
+            predictions = score_file(model, input_file, ftype, isinstance(model, Path))
     except Exception as e:
         if ctx.params['debug']:
             raise
         else:
             ctx.fail(e)
+    finally:
+        if flow_scores is not None:
+            flow_scores.close()
 
-    handle_output(predictions, output_file)
+    if not ctx.params['partition_only']:
+        with stage('output', predictions.shape[0]):
+            handle_output(predictions, output_file)
+
+    if recorder is not None:
+        recorder.close()
+        if ctx.params['metrics_json']:
+            recorder.write_json(ctx.params['metrics_json'])
+
+
+def partition_file(input_file, ftype):
+    """Only writes the shards of input_file (and --add-input) to --shard-dir"""
+    from botrecon.inputs import find_inputs
+    from botrecon.shards import partition
+
+    ctx = click.get_current_context()
+    paths = find_inputs([input_file, *ctx.params['add_input']])
+    shards = partition(paths, ftype, ctx.params['shards'], ctx.params['shard_dir'])
+    if ctx.params['verbosity'] >= 0:
+        for shard in shards:
+            click.echo(shard)
+
+
+def score_file(model, input_file, ftype, no_transforms=False):
+    """Loads and scores input_file, returning the table of infected hosts
+
+    The model can be either a name, a tuple of names, a path or an already
+    loaded model. All other options are taken from the current click context.
+    """
+    from botrecon.data import get_data, get_data_chunked, get_chunk_rows
+    from botrecon.inputs import find_inputs
+    from botrecon.predictions import get_predictions, get_predictions_streamed
+    from botrecon.predictions import get_predictions_files
+
+    ctx = click.get_current_context()
+    chunk_rows = get_chunk_rows(ftype)
+    paths = find_inputs([input_file, *ctx.params['add_input']])
+    if isinstance(model, tuple):
+        from botrecon.ensemble import get_predictions_ensemble
+        if len(paths) > 1:
+            raise ValueError('Several models can only score a single file at once')
+        if chunk_rows:
+            chunks = get_data_chunked(paths[0], ftype, chunk_rows, no_transforms)
+        else:
+            chunks = [get_data(paths[0], ftype, no_transforms)]
+        return get_predictions_ensemble(chunks, model)
+    elif ctx.params['shards']:
+        from botrecon.shards import get_predictions_sharded
+        return get_predictions_sharded(paths, ftype, model, no_transforms)
+    elif len(paths) > 1:
+        return get_predictions_files(paths, ftype, model, no_transforms)
+
+    input_file = paths[0]
+    if ctx.params.get('follow'):
+        from botrecon.follow import follow_predictions
+        return follow_predictions(
+            input_file, model, no_transforms,
+            ctx.params['follow_interval'], ctx.params['follow_timeout']
+        )
+    elif chunk_rows:
+        return get_predictions_streamed(
+            get_data_chunked(input_file, ftype, chunk_rows, no_transforms),
+            model
+        )
+    else:
+        return get_predictions(get_data(input_file, ftype, no_transforms), model)
@@ -1,13 +1,158 @@
+import click
 import pandas as pd
 import numpy as np
+from botrecon.metrics import stage
 
 
 def get_data(path, type, no_transforms=False):
     """
     Converts data loaded from path into a new Data object. Also applies some base
     transformations unless no_transforms is set to True.
+
+    Unless no_transforms is set, only the columns required for the
+    transformations are read from the file. With --data-cache the prepared
+    data is loaded from the cache if it holds it, and saved there otherwise.
+    """
+    if type == 'npy':
+        from botrecon.binary import BinaryCapture
+        with stage('load') as load:
+            data = BinaryCapture(path).data()
+            load.rows_out = data.data.shape[0]
+        report_memory('loading', data.data, data.hosts)
+        return data
+
+    cache, key = open_data_cache(path, type, no_transforms)
+    if cache is not None:
+        with stage('load') as load:
+            data = cache.load(key, path, type)
+            load.rows_out = None if data is None else data.data.shape[0]
+        if data is not None:
+            cache.close()
+            report_memory('loading from the data cache', data.data, data.hosts)
+            return data
+
+    with stage('load') as load:
+        data = Data(path, type, required_only=not no_transforms)
+        load.rows_out = data.data.shape[0]
+    report_memory('loading', data.data)
+
+    with stage('prepare', data.data.shape[0]) as prepare:
+        data.prepare(no_transforms)
+        prepare.rows_out = data.data.shape[0]
+    report_memory('preparing', data.data, data.hosts)
+
+    if cache is not None:
+        with cache:
+            cache.store(key, data)
+    return data
+
+
+def open_data_cache(path, type, no_transforms=False):
+    """Opens the cache passed with --data-cache, returns it and the key of path
+
+    Returns None for both if the option was not used.
+    """
+    ctx = click.get_current_context(silent=True)
+    if ctx is None or not ctx.params.get('data_cache'):
+        return None, None
+
+    from botrecon.cache import DataCache
+    cache = DataCache(ctx.params['data_cache'], ctx.params['data_cache_size'])
+    return cache, cache.key(path, type, no_transforms)
+
+
+def get_data_chunked(path, type, chunk_rows, no_transforms=False):
+    """
+    Lazily reads the file at path in chunks of at most chunk_rows rows and
+    yields each of them as a prepared Data object.
     """
-    return Data(path, type).prepare(no_transforms)
+    if type == 'npy':
+        from botrecon.binary import BinaryCapture
+        chunks = BinaryCapture(path).chunks(chunk_rows)
+        while True:
+            with stage('load') as load:
+                data = next(chunks, None)
+                load.rows_out = 0 if data is None else data.data.shape[0]
+            if data is None:
+                return
+            yield data
+
+    kwargs = {}
+    if not no_transforms:
+        kwargs = Data.reader_kwargs(path, type)
+    chunks = iter(Data.read_chunks(path, type, chunk_rows, **kwargs))
+    while True:
+        with stage('load') as load:
+            chunk = next(chunks, None)
+            load.rows_out = 0 if chunk is None else chunk.shape[0]
+        if chunk is None:
+            return
+
+        with stage('prepare', chunk.shape[0]) as prepare:
+            data = Data(path, type, chunk).prepare(no_transforms)
+            prepare.rows_out = data.data.shape[0]
+        yield data
+
+
+def get_chunk_rows(type):
+    """Returns the rows per chunk to stream files of type in, or None
+
+    Binary captures are streamed in chunks of botrecon.binary.CHUNK_ROWS by
+    default, unless --batchify is passed, as they do not need to be parsed
+    as a whole.
+    """
+    ctx = click.get_current_context()
+    chunk_rows = ctx.params['stream_chunk_rows']
+    if type == 'npy' and not chunk_rows and not ctx.params['batchify'][0]:
+        from botrecon.binary import CHUNK_ROWS
+        chunk_rows = CHUNK_ROWS
+    return chunk_rows
+
+
+def report_memory(stage, *frames):
+    """Prints the memory used by the frames after a stage in verbose mode"""
+    ctx = click.get_current_context(silent=True)
+    if ctx is None or not (ctx.params.get('verbosity', 0) > 0 or ctx.params.get('debug')):
+        return
+    size = sum(frame.memory_usage(deep=True).sum() for frame in frames)
+    click.echo(f'Memory used by data after {stage}: {size / 2**20:.1f} MiB')
+
+
+def read_csv_chunks(path, chunk_rows, **kwargs):
+    """Yields DataFrames with at most chunk_rows rows read from a csv file"""
+    yield from pd.read_csv(path, chunksize=chunk_rows, **kwargs)
+
+
+def read_parquet_chunks(path, chunk_rows, columns=None):
+    """Yields DataFrames with at most chunk_rows rows read from a parquet file"""
+    import pyarrow.parquet as pq
+
+    batches = pq.ParquetFile(path).iter_batches(
+        batch_size=chunk_rows, columns=columns
+    )
+    # Rows are numbered from the start of the file, like with read_csv
+    start = 0
+    for batch in batches:
+        chunk = batch.to_pandas()
+        chunk.index = pd.RangeIndex(start, start + chunk.shape[0])
+        start += chunk.shape[0]
+        yield chunk
+
+
+def read_stata_columns(path):
+    """Returns the column names of a stata file without reading the data"""
+    with pd.read_stata(path, iterator=True) as reader:
+        return list(reader.variable_labels().keys())
+
+
+def read_arrow_columns(path, filetype):
+    """Returns the column names of a parquet or feather file from its schema"""
+    if filetype == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.read_schema(path).names
+    else:
+        import pyarrow.ipc as ipc
+        return ipc.open_file(path).schema.names
 
 
 class Data(object):
@@ -16,12 +161,26 @@ class Data(object):
     Attributes:
     data  pandas.DataFrame     the actual data loaded from the file
     hosts pandas.DataFrame     the extracted column with source addresses
+    host_codes   numpy.ndarray codes of the source address of each row into
+                               host_uniques, -1 for missing addresses
+    host_uniques numpy.ndarray unique source addresses in order of appearance
+    weights      numpy.ndarray number of flows every row stands for once the
+                               flows of hosts are sampled, None if they are not
     path  string/pathlib.Path  the path the data was originally loaded from
     type  string               filetype of the file, must be a key of Data.READERS
 
     Static:
     COLUMNS list has the required column names and possible aliases
     READERS dict mapping of filetypes to respective loading functions
+    CHUNK_READERS dict mapping of filetypes that can be streamed to functions
+                  yielding chunks of the data
+    HOST_COLUMNS  list of possible names of the column with source addresses
+    DTYPES        dict of dtypes to read the columns from COLUMNS as
+    DTYPE_PLAN    dict of kinds of compact dtypes for the prepared columns
+    STRING_COLUMNS list of columns the bundled models expect as strings
+    HEADERS       dict mapping of filetypes to functions returning column names
+                  and to keyword arguments used to select columns and dtypes
+    TRANSFORM_VERSION int identifying the output of prepare in the data cache
     """
     COLUMNS = [
         ['proto', 'protocol'],
@@ -42,19 +201,117 @@ class Data(object):
         'parquet': pd.read_parquet,
         'excel': pd.read_excel
     }
+    CHUNK_READERS = {
+        'csv': read_csv_chunks,
+        'parquet': read_parquet_chunks
+    }
+    # Columns the bundled models expect as strings, see PreparedModel
+    STRING_COLUMNS = ['sport', 'dport']
+    # See Data.compact_dtype, durations are scaled by some models
+    DTYPE_PLAN = {
+        'proto': 'category',
+        'dport': 'port',
+        'sport': 'port',
+        'state': 'category',
+        'dur': 'float64',
+        'totbytes': 'count',
+        'srcbytes': 'count',
+        'bps': 'count'
+    }
+    HOST_COLUMNS = ['srcaddr', 'srcaddress', 'sourceaddr', 'sourceaddress', 'host']
+    # Identifies the output of prepare, change it whenever that changes
+    TRANSFORM_VERSION = 2
+    # Used while reading, the prepared columns follow Data.DTYPE_PLAN
+    DTYPES = {
+        'proto': 'category',
+        'state': 'category',
+        'dur': 'float64'
+    }
+    HEADERS = {
+        'csv': (lambda path: pd.read_csv(path, nrows=0).columns, 'usecols'),
+        'fwf': (lambda path: pd.read_fwf(path, nrows=0).columns, 'usecols'),
+        'excel': (lambda path: pd.read_excel(path, nrows=0).columns, 'usecols'),
+        'parquet': (lambda path: read_arrow_columns(path, 'parquet'), 'columns'),
+        'feather': (lambda path: read_arrow_columns(path, 'feather'), 'columns'),
+        'stata': (read_stata_columns, 'columns')
+    }
 
-    def __init__(self, path, filetype):
+    def __init__(self, path, filetype, data=None, required_only=False):
         self.path = path
         self.type = filetype
-        self.data = None
+        self.data = data
         self.hosts = None
-        self.load()
+        self.host_codes = None
+        self.host_uniques = None
+        self.weights = None
+        self.required_only = required_only
+        if data is None:
+            self.load()
+
+    @staticmethod
+    def from_prepared(path, filetype, data, host_codes, host_uniques):
+        """Returns Data of already prepared data and its factorized hosts"""
+        prepared = Data(path, filetype, data)
+        prepared.host_codes = host_codes
+        prepared.host_uniques = host_uniques
+        hosts = host_uniques.take(host_codes) if len(host_uniques) else \
+            np.empty(len(host_codes), dtype=object)
+        hosts[host_codes < 0] = np.nan
+        prepared.hosts = pd.DataFrame({'srcaddr': hosts}, index=data.index)
+        return prepared
 
     def load(self):
         """Loads the data from path"""
-        self.data = Data.READERS[self.type](self.path)
+        kwargs = {}
+        if self.required_only:
+            kwargs = Data.reader_kwargs(self.path, self.type)
+        self.data = Data.READERS[self.type](self.path, **kwargs)
         return self.data
 
+    @staticmethod
+    def reader_kwargs(path, filetype):
+        """Returns keyword arguments making the reader only load required columns
+
+        The column names are read from the file header and matched against the
+        aliases from Data.COLUMNS and Data.HOST_COLUMNS. Readers that accept
+        dtypes also get the ones from Data.DTYPES. If the names cannot be
+        determined all columns are read.
+        """
+        if filetype not in Data.HEADERS:
+            return {}
+
+        get_columns, keyword = Data.HEADERS[filetype]
+        columns = get_columns(path)
+        if isinstance(columns, pd.RangeIndex):
+            return {}
+
+        aliases = {name: names[0] for names in Data.COLUMNS for name in names}
+        aliases.update({name: 'srcaddr' for name in Data.HOST_COLUMNS})
+
+        usecols, dtype = [], {}
+        for column in columns:
+            name = aliases.get(str(column).lower().replace(' ', ''))
+            if name is None:
+                continue
+            usecols.append(column)
+            if name in Data.DTYPES:
+                dtype[column] = Data.DTYPES[name]
+
+        if keyword == 'usecols':
+            return {'usecols': usecols, 'dtype': dtype}
+        else:
+            return {'columns': usecols}
+
+    @staticmethod
+    def read_chunks(path, filetype, chunk_rows, **kwargs):
+        """Yields consecutive DataFrames of at most chunk_rows rows from path"""
+        if filetype not in Data.CHUNK_READERS:
+            raise ValueError(f'Filetype {filetype} cannot be read in chunks, '
+                             f'supported: {list(Data.CHUNK_READERS.keys())}')
+        if chunk_rows < 1:
+            raise ValueError(f'Invalid number of rows per chunk: {chunk_rows}')
+        return Data.CHUNK_READERS[filetype](path, chunk_rows, **kwargs)
+
     def prepare(self, no_transforms=False):
         """Separates hosts and applies transformations to prepare data for use."""
         # Convert the columns to a common format - all lowercase, no spaces
@@ -66,9 +323,9 @@ class Data(object):
         # We do not want to transform data when using user-supplied models
         if not no_transforms:
             self.make_transforms()
-
-        # Adjust dtypes or stuff will break later for some filetypes
-        self.data = self.data.convert_dtypes()
+        else:
+            # Adjust dtypes or stuff will break later for some filetypes
+            self.data = self.data.convert_dtypes()
         return self
 
     def make_transforms(self):
@@ -81,23 +338,90 @@ class Data(object):
 
         # Calculate the additional features that will not be included
         self.add_features()
+        return self.compact()
 
-        # Sport and Dport have to be explicitly converted to strings
-        self.data.loc[:, ['sport', 'dport']] = self.data \
-            .loc[:, ['sport', 'dport']].astype(str)
+    def compact(self):
+        """Converts the prepared columns to the dtypes from Data.DTYPE_PLAN"""
+        dtypes = {
+            column: Data.compact_dtype(self.data[column], kind)
+            for column, kind in Data.DTYPE_PLAN.items()
+        }
+        self.data = self.data.astype(dtypes, copy=False)
+        for column, kind in Data.DTYPE_PLAN.items():
+            if kind == 'port' and dtypes[column] == 'category':
+                self.data[column] = Data.port_strings(self.data[column])
         return self
 
+    @staticmethod
+    def compact_dtype(values, kind):
+        """Returns the smallest dtype of the passed kind that keeps all values
+
+        Ports are always converted to floats, whether they were read as
+        integers or as floats because some are missing, so that their string
+        representation (see PreparedModel) is the same (e.g. '80.0') however
+        the file or a chunk of it was read. Ports that are not numbers become
+        categories. Counts become the smallest unsigned integer that fits.
+        Columns with values that do not fit are left as they are.
+        """
+        dtype = values.dtype
+        if kind == 'category':
+            return 'category'
+        if not pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_bool_dtype(dtype):
+            # Ports that are not numbers, such as hex values of icmp flows
+            return 'category' if kind == 'port' and dtype == object else dtype
+        if kind == 'float64':
+            return 'float64'
+
+        low, high = values.min(), values.max()
+        if kind == 'port':
+            fits = not pd.isna(low) and low >= 0 and high < 2**16 and \
+                (values.dropna() % 1 == 0).all()
+            return 'float32' if fits else 'float64'
+        if pd.isna(low) or low < 0:
+            return dtype
+        if pd.api.types.is_integer_dtype(dtype):
+            return 'uint32' if high < 2**32 else 'uint64'
+        return dtype
+
+    @staticmethod
+    def port_strings(values):
+        """Writes the numbers among categorical ports like float ports, e.g. '80.0'
+
+        Only the categories are converted, ports that are not numbers are
+        kept as they are.
+        """
+        categories = values.cat.categories.astype(str)
+        numbers = pd.to_numeric(categories, errors='coerce')
+        names = np.where(np.isnan(numbers), categories, numbers.astype(str))
+        if (names == categories).all():
+            return values
+        return values.map(dict(zip(values.cat.categories, names))).astype('category')
+
     def find_hosts(self):
         """Locates the column with src addresses and extracts it into self.hosts"""
-        names = ['srcaddr', 'srcaddress', 'sourceaddr', 'sourceaddress', 'host']
-        for name in names:
+        for name in Data.HOST_COLUMNS:
             if name in self.data.columns:
                 self.hosts = self.data.loc[:, [name]]
                 self.data.drop(columns=[name])
                 self.hosts.columns = ['srcaddr']
+                # Filters and scoring all work on the codes of the hosts
+                self.host_codes, self.host_uniques = pd.factorize(
+                    self.hosts['srcaddr'].to_numpy()
+                )
                 return self
         raise ValueError('Unable to locate source addresses in data')
 
+    def select(self, mask):
+        """Keeps only the rows where the boolean mask is True"""
+        if mask.all():
+            return self
+        self.data = self.data[mask]
+        self.hosts = self.hosts[mask]
+        self.host_codes = self.host_codes[mask]
+        if self.weights is not None:
+            self.weights = self.weights[mask]
+        return self
+
     def extract_feature_names(self):
         """Attempts to identify the required columns using aliases from Data.COLUMNS"""
         columns = self._get_columns(self.data.columns)
@@ -148,31 +472,63 @@ class Data(object):
             return colnames
 
     def batchify(self, num, batch_type):
-        """Splits the data into a number of batches of equal sizes"""
-        # Start by determining the number of batches
+        """Returns a generator of consecutive batches of rows of the data
+
+        Batches are positional slices of the data, which pandas returns as
+        views where it can, and each of them is only made once it is needed.
+        The batch type can be one of:
+          %        every batch has num percent of the rows
+          batches  the data is split into num batches of equal sizes
+          rows     every batch has num rows
+          memory   every batch takes at most num bytes, but has at least one row
+        The last batch may be smaller than the others.
+        """
+        # Bounds are computed right away so invalid values raise immediately
+        bounds = self.batch_bounds(num, batch_type)
+        return (self.data.iloc[start:end] for start, end in bounds)
+
+    def batch_bounds(self, num, batch_type):
+        """Returns a list of (start, end) positions of the batches"""
+        # Start by determining the number of rows in each batch
         n_rows = self.data.shape[0]
         if batch_type == '%':
             if not (0 < num < 100):
                 raise ValueError(f'Invalid percentage of rows per batch: {num}')
             num /= 100
             n_batches = int(1 / num)
+            size = n_rows // n_batches
         elif batch_type == 'batches':
             n_batches = num
             if not (0 < n_batches < n_rows):
                 m = (f'Invalid number of batches ({n_batches}). Must be positive '
                      f'and lower than the number of rows ({n_rows})')
                 raise ValueError(m)
+            size = n_rows // n_batches
+        elif batch_type == 'rows':
+            if num < 1:
+                raise ValueError(f'Invalid number of rows per batch: {num}')
+            size = int(num)
+        elif batch_type == 'memory':
+            if num <= 0:
+                raise ValueError(f'Invalid size of a batch: {num} bytes')
+            size = max(1, int(num // self.row_size()))
         else:
             raise ValueError(f'Invalid batch type: {batch_type}')
 
-        # Actual batchifying starts here
-        batches = [(i + 1) * (n_rows // n_batches) for i in range(n_batches)]
-        batches = np.vsplit(self.data, batches)
+        if batch_type in ('%', 'batches'):
+            # Any rows left after the equal batches make up the last one
+            ends = [(i + 1) * size for i in range(n_batches)] + [n_rows]
+        else:
+            ends = list(range(size, n_rows, size)) + [n_rows]
 
         # Remove all empty batches if any show up
-        batches = [i for i in batches if i.shape[0] != 0]
+        starts = [0] + ends[:-1]
+        return [(start, end) for start, end in zip(starts, ends) if end > start]
 
-        return batches
+    def row_size(self):
+        """Returns the average number of bytes used by a row of the data"""
+        size = self.data.memory_usage(index=False, deep=True).sum()
+        return size / max(self.data.shape[0], 1)
 
     def __repr__(self):
         r = (
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+
+class PreparedModel(object):
+    """Adapts a bundled model to the data prepared by Data
+
+    Prepared data keeps the ports as numbers and protocols and states as
+    categories, while the models were trained on strings (e.g. '53.0' for
+    ports). If the first step of the pipeline is a per-column encoder from
+    category_encoders, it is only run on the unique values of each encoded
+    column, which are also the only ones converted to strings. The encoded
+    values are then gathered for all rows through the factorized codes, so
+    the remaining steps get exactly the same input as with the whole columns
+    encoded. Other models get the columns converted for all rows instead.
+
+    Attributes:
+    pipeline        the wrapped model
+    string_columns  list  columns the model expects as strings
+    fast            bool  whether the encoder is only run on unique values
+    """
+    # Encoders mapping every column on its own to a single column of the same name
+    ENCODERS = ['OrdinalEncoder', 'CountEncoder', 'TargetEncoder', 'MEstimateEncoder']
+    METHODS = ['predict_proba', 'decision_function', 'predict']
+
+    def __init__(self, pipeline, string_columns=(), fast=True):
+        self.pipeline = pipeline
+        self.string_columns = list(string_columns)
+        self.fast = fast and PreparedModel.supports(pipeline)
+        self.rest = pipeline[1:] if self.fast else pipeline
+
+    @staticmethod
+    def supports(pipeline):
+        """Checks if the first step of pipeline can be run on unique values"""
+        if not hasattr(pipeline, 'steps') or len(pipeline.steps) < 2:
+            return False
+        encoder = pipeline.steps[0][1]
+        return type(encoder).__module__.startswith('category_encoders') and \
+            type(encoder).__name__ in PreparedModel.ENCODERS and \
+            not getattr(encoder, 'drop_invariant', False) and \
+            getattr(encoder, 'return_df', True)
+
+    def convert(self, values):
+        """Converts a column of prepared data to the dtype the models expect"""
+        if values.name in self.string_columns:
+            return values.astype(str).astype('string')
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            return values.astype('string')
+        return values
+
+    def to_strings(self, data, skip=()):
+        """Converts the columns of data that the models expect as strings"""
+        data = data.copy()
+        for column in data.columns:
+            if column not in skip:
+                data[column] = self.convert(data[column])
+        return data
+
+    def encode(self, data):
+        """Returns data as passed to the steps following the encoder"""
+        if not self.fast or data.shape[0] == 0:
+            return self.to_strings(data)
+
+        encoder = self.pipeline.steps[0][1]
+        columns = [column for column in encoder.cols if column in data.columns]
+        data = self.to_strings(data, skip=columns)
+
+        # Missing values get the code -1, after sorting they come first
+        firsts, inverses = [], []
+        for column in columns:
+            codes, _ = pd.factorize(data[column])
+            uniques, first = np.unique(codes, return_index=True)
+            firsts.append(first)
+            inverses.append(codes - uniques[0])
+
+        # Every column of the small frame holds the unique values of a column,
+        # padded by repeating them from the start (np.resize cycles through them)
+        n_rows = max((first.shape[0] for first in firsts), default=1)
+        small = data.iloc[np.zeros(n_rows, dtype='int64')].reset_index(drop=True)
+        for column, first in zip(columns, firsts):
+            values = data[column].iloc[np.resize(first, n_rows)]
+            small[column] = self.convert(values).array
+        encoded = encoder.transform(small)
+
+        for column, inverse in zip(columns, inverses):
+            data[column] = encoded[column].to_numpy()[inverse]
+        return data
+
+    def __getattr__(self, name):
+        # Only called for attributes not found normally, also during unpickling
+        if name.startswith('__') or 'pipeline' not in self.__dict__:
+            raise AttributeError(name)
+        if name in PreparedModel.METHODS:
+            method = getattr(self.rest, name)
+            return lambda data: method(self.encode(data))
+        return getattr(self.pipeline, name)
+
+    def __len__(self):
+        return len(self.pipeline)
+
+    def __getitem__(self, item):
+        return self.pipeline[item]
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.pipeline!r})'
@@ -0,0 +1,101 @@
+import click
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from botrecon.aggregate import HostAggregate
+from botrecon.metrics import stage
+from botrecon.predictions import adjust_njobs, filter_hosts, get_model, get_n_workers
+from botrecon.predictions import get_threshold, make_predictions, open_score_cache
+from botrecon.predictions import report_cache, sample_flows
+
+# Rules for combining the verdicts of the models, see ensemble_table
+ENSEMBLES = ['any', 'majority', 'all']
+
+
+def get_predictions_ensemble(chunks, models):
+    """Scores the data with several models and returns a table of infected hosts
+
+    Every chunk of prepared data is filtered once and then scored by all
+    models concurrently, each in its own thread sharing the data. --jobs is
+    split between the models that support n_jobs. Only per-host sums and
+    counts are kept for every model, so chunks can be streamed.
+    """
+    ctx = click.get_current_context()
+    verbose = ctx.params['verbosity'] > 0 or ctx.params['debug']
+
+    specs = models
+    with stage('load_model'):
+        models = [get_model(spec) for spec in specs]
+    n_jobs = max(get_n_workers(ctx.params['jobs']) // len(models), 1)
+    for model in models:
+        adjust_njobs(model, n_jobs)
+    thresholds = [get_threshold(model) for model in models]
+    aggregates = [HostAggregate() for _ in models]
+
+    if verbose:
+        click.echo(f'Predicting with {len(models)} models, {n_jobs} jobs each')
+
+    def predict(model, cache, data):
+        # Threads do not share the click context unless it is pushed
+        with ctx.scope(cleanup=False):
+            return make_predictions(data.data, model, ctx.params['dedup'], cache)[0]
+
+    with ThreadPoolExecutor(len(models)) as pool, ExitStack() as stack:
+        caches = [stack.enter_context(open_score_cache(spec, model))
+                  for spec, model in zip(specs, models)]
+        for data in chunks:
+            # The count filter needs the totals, it is applied once all are known
+            with stage('filter', data.data.shape[0]) as filtering:
+                data = sample_flows(filter_hosts(data))
+                filtering.rows_out = data.data.shape[0]
+            if data.data.shape[0] == 0:
+                continue
+
+            with stage('predict', data.data.shape[0]) as predicting:
+                scores = pool.map(predict, models, caches, [data] * len(models))
+                for aggregate, predictions in zip(aggregates, scores):
+                    aggregate.update_codes(predictions, data.host_codes,
+                                           data.host_uniques, data.weights)
+                predicting.rows_out = data.data.shape[0]
+        for cache in caches:
+            report_cache(cache)
+
+    if verbose:
+        click.echo('Extracting infected hosts')
+
+    with stage('evaluate', len(aggregates[0])) as evaluating:
+        hosts = ensemble_table(aggregates, thresholds, specs, ctx.params['ensemble'],
+                               ctx.params['min_count'])
+        evaluating.rows_out = hosts.shape[0]
+    return hosts
+
+
+def ensemble_table(aggregates, thresholds, names, ensemble='any', min_count=0):
+    """Returns the hosts flagged by the models according to the ensemble rule
+
+    Every model flags the hosts whose mean score reaches its threshold. With
+    'any' the hosts flagged by at least one model are returned, with
+    'majority' those flagged by more than half of them and with 'all' those
+    flagged by every model. The table has the mean score of every model and
+    the number of models flagging each host as votes, and is sorted by the
+    votes and then the score of the first model.
+    """
+    # All models scored the same flows, so their hosts are in the same order
+    tables = [aggregate.table for aggregate in aggregates]
+    votes = np.zeros(tables[0].shape[0], dtype='int64')
+    for table, threshold in zip(tables, thresholds):
+        votes += (table['mean'] >= threshold).to_numpy()
+
+    hosts = pd.DataFrame({'host': tables[0]['host']})
+    for name, table in zip(names, tables):
+        hosts[name] = table['mean']
+    hosts['votes'] = votes
+    hosts['count'] = tables[0]['count']
+
+    if min_count > 0:
+        hosts = hosts[hosts['count'] > min_count]
+    required = {'any': 1, 'majority': len(names) // 2 + 1, 'all': len(names)}[ensemble]
+    hosts = hosts[hosts['votes'] >= required]
+    hosts = hosts.sort_values(['votes', names[0]], ascending=False, kind='mergesort')
+    return hosts.reset_index(drop=True)
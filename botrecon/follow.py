@@ -0,0 +1,160 @@
+import click
+import io
+import os
+import time
+import pandas as pd
+from datetime import datetime
+from botrecon.aggregate import HostAggregate
+from botrecon.data import Data
+from botrecon.predictions import get_model, get_threshold, filter_hosts, sample_flows
+from botrecon.predictions import predict_chunk, open_score_cache, report_cache
+
+
+class CaptureTail(object):
+    """Reads complete lines appended to a growing csv file.
+
+    The header is read once and prepended to every block of new lines, so
+    each of them can be parsed on its own. If the file is truncated or
+    replaced, reading starts over from its beginning.
+
+    Attributes:
+    path      string/pathlib.Path  the path of the followed file
+    header    bytes                the first line of the file
+    position  int                  offset up to which the file was parsed
+    """
+    def __init__(self, path, block_size=16 * 2**20):
+        self.path = path
+        self.block_size = block_size
+        self.file = None
+        self.inode = None
+        self.header = None
+        self.position = 0
+        self.buffer = b''
+
+    def _reopen_if_needed(self):
+        stat = os.stat(self.path)
+        if self.file is not None and stat.st_ino == self.inode and \
+                stat.st_size >= self.position + len(self.buffer):
+            return
+
+        if self.file is not None:
+            self.file.close()
+        self.file = open(self.path, 'rb')
+        self.inode = stat.st_ino
+        self.header = None
+        self.position = 0
+        self.buffer = b''
+
+    def read(self):
+        """Returns new complete lines (with the header) or None if there are none"""
+        self._reopen_if_needed()
+        self.buffer += self.file.read(self.block_size)
+        end = self.buffer.rfind(b'\n')
+        if end < 0:
+            return None
+
+        lines, self.buffer = self.buffer[:end + 1], self.buffer[end + 1:]
+        self.position += len(lines)
+
+        if self.header is None:
+            header_end = lines.find(b'\n') + 1
+            self.header, lines = lines[:header_end], lines[header_end:]
+            if not lines:
+                return None
+
+        return self.header + lines
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+def follow_predictions(path, model, no_transforms=False, interval=1.,
+                       timeout=None):
+    """Scores flows appended to path as they arrive, returns infected hosts
+
+    Only new complete lines are parsed and scored, and per-host running sums
+    and counts are updated with them, so the cost per flow stays constant.
+    Changes in the status of hosts are printed as they happen. Following stops
+    on a keyboard interrupt or after timeout seconds without new data.
+    """
+    ctx = click.get_current_context()
+    verbose = ctx.params['verbosity'] > 0 or ctx.params['debug']
+    min_count = ctx.params['min_count']
+
+    spec = model
+    model = get_model(model)
+    threshold = get_threshold(model)
+    aggregate = HostAggregate()
+    infected = set()
+
+    if verbose:
+        click.echo(f'Following {path}')
+
+    tail = CaptureTail(path)
+    kwargs = None
+    idle = 0.
+    rows = 0
+    try:
+        with open_score_cache(spec, model) as cache:
+            while timeout is None or idle < timeout:
+                block = tail.read()
+                if block is None:
+                    time.sleep(interval)
+                    idle += interval
+                    continue
+                idle = 0.
+
+                # Only possible once the header is known
+                if kwargs is None:
+                    kwargs = {}
+                    if not no_transforms:
+                        kwargs = Data.reader_kwargs(io.BytesIO(tail.header), 'csv')
+
+                # Dtypes are guessed for every block, prepare converts ports
+                # the same way whatever they were read as (see Data.compact_dtype)
+                data = pd.read_csv(io.BytesIO(block), **kwargs)
+                # Rows are numbered from the start of the file, like elsewhere
+                data.index = pd.RangeIndex(rows, rows + data.shape[0])
+                rows += data.shape[0]
+                data = Data(path, 'csv', data).prepare(no_transforms)
+                data = sample_flows(filter_hosts(data))
+                if ctx.params['debug']:
+                    click.echo(f'{data.data.shape[0]} new rows, offset {tail.position}')
+                if data.data.shape[0] == 0:
+                    continue
+
+                predictions, threshold = predict_chunk(data, model, cache)
+                codes = data.host_codes
+                aggregate.update_codes(predictions, codes, data.host_uniques, data.weights)
+
+                hosts = data.host_uniques[pd.unique(codes[codes >= 0])]
+                report_changes(aggregate.get(hosts), infected, threshold,
+                               min_count, ctx.params['verbosity'] >= 0)
+            report_cache(cache)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        tail.close()
+
+    return aggregate.evaluate(threshold, min_count)
+
+
+def report_changes(hosts, infected, threshold, min_count=0, echo=True):
+    """Updates the set of infected hosts and prints the ones that changed"""
+    now = datetime.now()
+    for host, mean, count in hosts.itertuples(index=False):
+        is_infected = mean >= threshold and count > min_count
+        if is_infected == (host in infected):
+            continue
+
+        if is_infected:
+            infected.add(host)
+            status = 'infected'
+        else:
+            infected.discard(host)
+            status = 'no longer infected'
+
+        if echo:
+            click.echo(f'[{str(now)}] {host} {status}, mean score {mean:.4f} '
+                       f'over {count} flows')
@@ -0,0 +1,120 @@
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+
+class CompiledForest(object):
+    """A fitted random forest with its leaf probabilities flattened into one array
+
+    sklearn predicts every tree on its own, copying and normalizing the class
+    counts of the leaves the rows reach in every tree before adding them up.
+    Here the probabilities of all nodes of all trees are normalized once and
+    stored one tree after another, so predicting only finds the leaves of a
+    block of rows in every tree (with the tree's own compiled traversal) and
+    adds up their probabilities. Like sklearn, the data is converted to
+    float32 and the trees are added up in order, so the probabilities are the
+    same as sklearn's.
+
+    The normalized values are a private copy in every process, even when the
+    forest was memory-mapped from a .joblib file. This costs no sharing, as
+    sklearn's trees already copy their nodes and values out of the mapped
+    file when they are loaded, but it does double the memory taken by the
+    values of the nodes in return for not normalizing them on every
+    prediction.
+
+    Attributes:
+    trees       list           the fitted trees, used to find the leaves of rows
+    offsets     numpy.ndarray  position of the first node of every tree in values
+    values      numpy.ndarray  class probabilities of every node of every tree
+    classes_    numpy.ndarray  classes of the forest
+    n_jobs      int            threads predicting blocks of rows, as in sklearn
+    block_rows  int            rows predicted at once by a thread
+    """
+    # Compiled forests are only exact replacements for these
+    FORESTS = ['RandomForestClassifier', 'ExtraTreesClassifier']
+    TREES = ['DecisionTreeClassifier', 'ExtraTreeClassifier']
+
+    def __init__(self, forest, block_rows=8192):
+        self.trees = [estimator.tree_ for estimator in forest.estimators_]
+        self.offsets = np.cumsum([0] + [tree.node_count for tree in self.trees])[:-1]
+
+        values = []
+        for tree in self.trees:
+            # Normalized like DecisionTreeClassifier.predict_proba
+            value = tree.value[:, 0, :]
+            normalizer = value.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0] = 1
+            values.append(value / normalizer)
+        self.values = np.ascontiguousarray(np.concatenate(values))
+
+        self.classes_ = forest.classes_
+        self.n_features_in_ = forest.n_features_in_
+        self.n_jobs = forest.n_jobs
+        self.block_rows = block_rows
+
+    @staticmethod
+    def supports(forest):
+        """Checks if forest can be compiled without changing its predictions"""
+        return type(forest).__name__ in CompiledForest.FORESTS and \
+            type(forest).__module__.startswith('sklearn.') and \
+            getattr(forest, 'n_outputs_', None) == 1 and \
+            all(type(tree).__name__ in CompiledForest.TREES
+                for tree in getattr(forest, 'estimators_', [None]))
+
+    def predict_proba(self, X):
+        X = np.ascontiguousarray(X, dtype='float32')
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f'X has {X.shape[-1]} features, but the forest is '
+                             f'expecting {self.n_features_in_} features as input')
+        if not np.isfinite(X).all():
+            raise ValueError('Input contains NaN, infinity or a value too large '
+                             "for dtype('float32').")
+
+        proba = np.empty((X.shape[0], self.values.shape[1]), dtype='float64')
+        starts = range(0, X.shape[0], self.block_rows)
+        threads = min(self.threads(), len(starts))
+        if threads > 1:
+            # The traversal of the trees releases the GIL
+            with ThreadPoolExecutor(threads) as pool:
+                list(pool.map(lambda start: self._predict_block(X, start, proba), starts))
+        else:
+            for start in starts:
+                self._predict_block(X, start, proba)
+        return proba
+
+    def _predict_block(self, X, start, proba):
+        block = X[start:start + self.block_rows]
+        total = np.zeros((block.shape[0], self.values.shape[1]), dtype='float64')
+        for tree, offset in zip(self.trees, self.offsets):
+            values = self.values[offset:offset + tree.node_count]
+            total += values.take(tree.apply(block), axis=0)
+        total /= len(self.trees)
+        proba[start:start + block.shape[0]] = total
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
+
+    def threads(self):
+        """Returns the number of threads n_jobs stands for"""
+        from os import cpu_count
+        n_jobs = self.n_jobs or 1
+        if n_jobs < 0:
+            n_jobs = max((cpu_count() or 1) + 1 + n_jobs, 1)
+        return n_jobs
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}(trees={len(self.trees)}, '
+                f'nodes={self.values.shape[0]})')
+
+
+def compile_model(model):
+    """Replaces a random forest, or one ending a pipeline, with a CompiledForest
+
+    Pipelines are changed in place. Models that cannot be compiled are
+    returned as they are.
+    """
+    if hasattr(model, 'steps'):
+        name, last = model.steps[-1]
+        if CompiledForest.supports(last):
+            model.steps[-1] = (name, CompiledForest(last))
+        return model
+    return CompiledForest(model) if CompiledForest.supports(model) else model
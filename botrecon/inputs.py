@@ -0,0 +1,36 @@
+import glob
+import os
+
+# File marking a directory as a binary capture, see botrecon.binary
+SCHEMA = 'schema.json'
+
+
+def is_capture(path):
+    """Checks if path is a directory with a binary capture"""
+    return os.path.isfile(os.path.join(path, SCHEMA))
+
+
+def find_inputs(paths):
+    """Expands directories and glob patterns in paths to a list of files
+
+    Directories are replaced by the files directly in them and patterns by
+    the files matching them, both sorted by name. Existing files and binary
+    captures (which are directories) are kept as they are. Raises a
+    FileNotFoundError if a path matches no files.
+    """
+    files = []
+    for path in map(str, paths):
+        if os.path.isdir(path) and not is_capture(path):
+            found = sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if not name.startswith('.') and os.path.isfile(os.path.join(path, name))
+            )
+        elif os.path.exists(path):
+            found = [path]
+        else:
+            found = sorted(glob.glob(path))
+
+        if not found:
+            raise FileNotFoundError(f'No input files found at {path}')
+        files.extend(found)
+    return files
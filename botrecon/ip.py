@@ -1,4 +1,5 @@
 from ipaddress import ip_address, ip_network
+import numpy as np
 
 
 class IPEntity(object):
@@ -35,5 +36,95 @@ class IPEntity(object):
         else:
             return other in self.ip
 
+    def bounds(self):
+        """Returns the first and last address covered by the entity as integers"""
+        if self.type == 'address':
+            return int(self.ip), int(self.ip)
+        else:
+            return int(self.ip.network_address), int(self.ip.broadcast_address)
+
     def __repr__(self):
         return f'{self.__class__.__name__} {self.type} {self.ip}'
+
+
+class IPRangeIndex(object):
+    """
+    Index of IPEntities allowing to check many addresses against all of them
+    at once.
+
+    The entities are converted to integer intervals which are then sorted and
+    merged, separately for each IP version. Membership is then tested with a
+    binary search over the interval starts.
+
+    Attributes:
+    intervals dict  mapping of IP versions to (starts, ends) numpy arrays
+    """
+    # IPv6 addresses do not fit into 64 bits, so python integers are used
+    DTYPES = {4: np.uint64, 6: object}
+
+    def __init__(self, entities):
+        self.intervals = {}
+        for version, dtype in IPRangeIndex.DTYPES.items():
+            bounds = sorted(
+                entity.bounds() for entity in entities
+                if entity.ip.version == version
+            )
+            starts, ends = self._merge(bounds)
+            self.intervals[version] = (
+                np.array(starts, dtype=dtype),
+                np.array(ends, dtype=dtype)
+            )
+
+    @staticmethod
+    def _merge(bounds):
+        # Merges sorted intervals that overlap or are directly adjacent
+        starts, ends = [], []
+        for start, end in bounds:
+            if ends and start <= ends[-1] + 1:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+        return starts, ends
+
+    def contains(self, addresses, ignore_invalid=False):
+        """Returns a boolean array with True for addresses within any range.
+
+        Each address is parsed only once, so it is best to pass unique values.
+        Invalid addresses raise a ValueError unless ignore_invalid is set, in
+        which case they are treated as not matching.
+        """
+        result = np.zeros(len(addresses), dtype=bool)
+
+        parsed = {version: ([], []) for version in self.intervals}
+        for i, address in enumerate(addresses):
+            try:
+                address = ip_address(address)
+            except ValueError:
+                if ignore_invalid:
+                    continue
+                else:
+                    raise
+            positions, values = parsed[address.version]
+            positions.append(i)
+            values.append(int(address))
+
+        for version, (positions, values) in parsed.items():
+            starts, ends = self.intervals[version]
+            if not positions or not starts.shape[0]:
+                continue
+
+            values = np.array(values, dtype=starts.dtype)
+            # Index of the last interval starting at or before each address
+            idx = np.searchsorted(starts, values, side='right') - 1
+            found = idx >= 0
+            idx[~found] = 0
+            result[positions] = found & (values <= ends[idx]).astype(bool)
+
+        return result
+
+    def __len__(self):
+        return sum(starts.shape[0] for starts, _ in self.intervals.values())
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} of {len(self)} intervals'
@@ -0,0 +1,241 @@
+import click
+import copy
+import json
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from botrecon import __version__
+
+# Functions called with every finished Stage, see add_hook
+HOOKS = []
+# Number of stages being measured, the peak memory is only reset without others
+ACTIVE_STAGES = 0
+ACTIVE_LOCK = threading.Lock()
+# Key of the MetricsRecorder of a run in the click context's meta
+META_KEY = 'botrecon.metrics'
+
+
+class Stage(object):
+    """Measurements of a single run of a stage, such as loading or predicting
+
+    Attributes:
+    name          string  name of the stage
+    rows_in       int     rows passed to the stage, None if not applicable
+    rows_out      int     rows (or hosts) produced by the stage
+    wall_seconds  float   elapsed time
+    cpu_seconds   float   cpu time of the process, of all its threads
+    peak_rss_mib  float   peak resident memory of the process during the stage,
+                          or since it started if that cannot be reset. The peak
+                          is reset for the whole process (on Linux through
+                          /proc/self/clear_refs, which also affects other tools
+                          reading VmHWM) and only when no other stage is being
+                          measured, so stages running at the same time, such as
+                          the models of an ensemble, report the peak since the
+                          first of them started
+    traced_peak_mib float peak memory allocated by python during the stage,
+                          only with --profile-memory
+    """
+    FIELDS = ['name', 'rows_in', 'rows_out', 'wall_seconds', 'cpu_seconds',
+              'peak_rss_mib', 'traced_peak_mib']
+
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.peak_rss_mib = None
+        self.traced_peak_mib = None
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in Stage.FIELDS}
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.as_dict()!r})'
+
+
+def add_hook(hook):
+    """Calls hook with every finished Stage, e.g. to export them as metrics
+
+    Hooks are called in the thread (and process) that ran the stage.
+    """
+    HOOKS.append(hook)
+
+
+def remove_hook(hook):
+    HOOKS.remove(hook)
+
+
+@contextmanager
+def stage(name, rows_in=None):
+    """Measures the enclosed code as a stage of the current run
+
+    Yields a Stage whose rows_out can be set by the enclosed code. Nothing is
+    measured unless the run records metrics or hooks are registered. Stages
+    that raise are measured and recorded up to the error.
+    """
+    global ACTIVE_STAGES
+    current = Stage(name, rows_in)
+    ctx = click.get_current_context(silent=True)
+    recorder = ctx.meta.get(META_KEY) if ctx is not None else None
+    if recorder is None and not HOOKS:
+        yield current
+        return
+
+    with ACTIVE_LOCK:
+        alone = ACTIVE_STAGES == 0
+        ACTIVE_STAGES += 1
+    if alone:
+        reset_peak_rss()
+    profiler = recorder.start_profile(alone) if recorder is not None else None
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield current
+    finally:
+        with ACTIVE_LOCK:
+            ACTIVE_STAGES -= 1
+        current.wall_seconds = time.perf_counter() - wall
+        current.cpu_seconds = time.process_time() - cpu
+        current.peak_rss_mib = read_peak_rss() / 2**20
+
+        if recorder is not None:
+            recorder.stop_profile(profiler, current)
+            recorder.record(current)
+        for hook in HOOKS:
+            hook(current)
+
+
+def reset_peak_rss():
+    """Resets the peak resident memory of the process where Linux supports it"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def read_peak_rss():
+    """Returns the peak resident memory in bytes since the last reset"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    import resource
+    import sys
+    # Bytes on macOS, kilobytes elsewhere
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class MetricsRecorder(object):
+    """Collects the stages of a run and optionally profiles every one of them
+
+    Stages that run several times, such as every chunk of a streamed file, are
+    summed up under their name, keeping the highest peaks. With profile_dir
+    every run of a stage is saved there as a cProfile dump, or as a
+    tracemalloc snapshot if memory is set.
+
+    Attributes:
+    stages       dict          totals of the stages by name, in order of appearance
+    calls        dict          number of runs of every stage
+    profile_dir  pathlib.Path  directory the profiles are saved to, or None
+    memory       bool          whether tracemalloc snapshots are saved
+    """
+    def __init__(self, profile_dir=None, memory=False):
+        self.stages = {}
+        self.calls = {}
+        self.started = time.perf_counter()
+        self.profile_dir = Path(profile_dir) if profile_dir is not None else None
+        self.memory = memory
+        self.profiles = 0
+
+        if self.profile_dir is not None:
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+        if self.memory:
+            import tracemalloc
+            tracemalloc.start()
+
+    def start_profile(self, reset_peak=True):
+        if self.profile_dir is None:
+            return None
+        if self.memory:
+            import tracemalloc
+            # reset_peak is only available from Python 3.9 on
+            if reset_peak and hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            # Kept with the profile, as stages may run at the same time
+            return tracemalloc, tracemalloc.get_traced_memory()[0]
+
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def stop_profile(self, profiler, current):
+        if profiler is None:
+            return
+
+        self.profiles += 1
+        path = self.profile_dir / f'{self.profiles:03d}-{current.name}'
+        if self.memory:
+            tracemalloc, start = profiler
+            current.traced_peak_mib = (tracemalloc.get_traced_memory()[1] - start) / 2**20
+            tracemalloc.take_snapshot().dump(str(path.with_suffix('.tracemalloc')))
+        else:
+            profiler.disable()
+            profiler.dump_stats(str(path.with_suffix('.prof')))
+
+    def record(self, current):
+        """Adds a finished run of a stage to the totals"""
+        total = self.stages.get(current.name)
+        self.calls[current.name] = self.calls.get(current.name, 0) + 1
+        if total is None:
+            self.stages[current.name] = copy.copy(current)
+            return
+
+        for field in ['rows_in', 'rows_out', 'wall_seconds', 'cpu_seconds']:
+            value = getattr(current, field)
+            if value is not None:
+                setattr(total, field, (getattr(total, field) or 0) + value)
+        for field in ['peak_rss_mib', 'traced_peak_mib']:
+            values = [v for v in (getattr(total, field), getattr(current, field))
+                      if v is not None]
+            setattr(total, field, max(values, default=None))
+
+    def as_dict(self):
+        stages = []
+        for name, total in self.stages.items():
+            stages.append({**total.as_dict(), 'calls': self.calls[name]})
+        return {
+            'version': __version__,
+            'wall_seconds': time.perf_counter() - self.started,
+            'peak_rss_mib': max((s['peak_rss_mib'] for s in stages), default=None),
+            'stages': stages
+        }
+
+    def write_json(self, path):
+        """Writes the collected metrics to path, - for the standard error
+
+        The standard output is left to the table of hosts.
+        """
+        document = json.dumps(self.as_dict(), indent=2)
+        if str(path) == '-':
+            click.echo(document, err=True)
+        else:
+            Path(path).write_text(document + '\n')
+
+    def close(self):
+        if self.memory:
+            import tracemalloc
+            tracemalloc.stop()
+
+
+def start_recording(ctx, profile_dir=None, memory=False):
+    """Records the stages of all code running in ctx, returns the recorder"""
+    recorder = ctx.meta[META_KEY] = MetricsRecorder(profile_dir, memory)
+    return recorder
@@ -0,0 +1,21 @@
+"""Converts the bundled .pkl models to memory-mappable .joblib files
+
+Usage: python -m botrecon.models [--remove-pickles]
+"""
+import sys
+from pathlib import Path
+from botrecon.predictions import load_model, dump_model
+
+
+def convert(directory, remove_pickles=False):
+    """Converts every .pkl model in directory to a .joblib file next to it"""
+    for path in sorted(Path(directory).glob('*.pkl')):
+        target = path.with_suffix('.joblib')
+        dump_model(load_model(path, compile=False), target)
+        print(f'{path.name} -> {target.name}')
+        if remove_pickles:
+            path.unlink()
+
+
+if __name__ == '__main__':
+    convert(Path(__file__).parent, '--remove-pickles' in sys.argv[1:])
@@ -1,5 +1,20 @@
 import click
+import shutil
+import numpy as np
 import pandas as pd
+from pathlib import Path
+
+# Key of the FlowScoreWriter of a run in the click context's meta
+FLOW_SCORES_KEY = 'botrecon.flow_scores'
+# Columns of the flow scores and their dtypes, fixed so every chunk matches
+FLOW_COLUMNS = {
+    'File': 'string',
+    'Flow': 'int64',
+    'Host': 'string',
+    'Score': 'float64'
+}
+# Flow scores are converted to a DataFrame and written this many rows at once
+FLOW_CHUNK_ROWS = 1_000_000
 
 
 def handle_output(preds, outfile):
@@ -7,10 +22,14 @@ def handle_output(preds, outfile):
     ctx = click.get_current_context()
     # Change the column names to more presentable ones
     colnames = ["Host", "Mean Score", "Flow Count"]
+    if 'votes' in preds.columns:
+        # Tables of several models have a score column per model
+        names = {'host': 'Host', 'votes': 'Votes', 'count': 'Flow Count'}
+        colnames = [names.get(column, f'{column} Score') for column in preds.columns]
     preds.columns = colnames
 
     if outfile is not None:
-        preds.to_csv(outfile)
+        save_table(preds, outfile, ctx.params.get('output_format', 'csv'))
         return
 
     if ctx.params['verbosity'] >= 0:
@@ -28,7 +47,7 @@ def output_to_console(ctx, preds):
             f = click.prompt("Input a path to the desired output location",
                              type=click.Path(writable=True),
                              default=click.Path("output.csv"))
-            preds.to_csv(f)
+            save_table(preds, f, ctx.params.get('output_format', 'csv'))
             return
 
     click.echo()
@@ -37,5 +56,143 @@ def output_to_console(ctx, preds):
         return
 
     # Ensure the entire dataframe will be printed
-    with pd.option_context("display.max_rows", len(preds)):
+    with pd.option_context("display.max_rows", len(preds),
+                           "display.max_columns", preds.shape[1]):
         click.echo(preds)
+
+
+def save_table(table, path, fmt='csv'):
+    """Saves the table of hosts to path as csv, parquet or JSON lines"""
+    if fmt == 'csv':
+        # The index is kept for compatibility with earlier versions
+        table.to_csv(path)
+    else:
+        with TableWriter(path, fmt) as writer:
+            writer.write(table)
+
+
+class TableWriter(object):
+    """Appends DataFrames to a csv, parquet or JSON lines file
+
+    The file is created right away, and the columns of csv and parquet files
+    are set by the first DataFrame written. Frames are written without their
+    index.
+
+    Attributes:
+    path    pathlib.Path  the written file
+    format  string        csv, parquet or jsonl
+    rows    int           number of rows written so far
+    """
+    def __init__(self, path, fmt='csv'):
+        self.path = Path(path)
+        self.format = fmt
+        self.rows = 0
+        self.file = None
+        self.schema = None
+        if fmt != 'parquet':
+            self.file = open(self.path, 'w', newline='')
+
+    def write(self, frame):
+        if self.format == 'csv':
+            frame.to_csv(self.file, index=False, header=self.file.tell() == 0)
+        elif self.format == 'jsonl':
+            if frame.shape[0] > 0:
+                lines = frame.to_json(orient='records', lines=True, double_precision=15)
+                self.file.write(lines if lines.endswith('\n') else lines + '\n')
+        else:
+            self._write_table(self._to_arrow(frame))
+        self.rows += frame.shape[0]
+
+    def _to_arrow(self, frame):
+        import pyarrow as pa
+        return pa.Table.from_pandas(frame, schema=self.schema, preserve_index=False)
+
+    def _write_table(self, table):
+        import pyarrow.parquet as pq
+        if self.file is None:
+            self.schema = table.schema.remove_metadata()
+            self.file = pq.ParquetWriter(self.path, self.schema)
+        self.file.write_table(table.cast(self.schema))
+
+    def append_file(self, path):
+        """Appends the rows of another file written by a TableWriter"""
+        if self.format == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            for batch in pq.ParquetFile(path).iter_batches():
+                self._write_table(pa.Table.from_batches([batch]))
+                self.rows += batch.num_rows
+            return
+
+        with open(path, newline='') as f:
+            if self.format == 'csv':
+                header = f.readline()
+                if self.file.tell() == 0:
+                    self.file.write(header)
+            shutil.copyfileobj(f, self.file)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class FlowScoreWriter(TableWriter):
+    """Writes the score of every predicted flow, see --flow-scores
+
+    Every row holds the input file of the flow, its row number in that file
+    (counted from 0, without the header), its source address and its score.
+    """
+    def write(self, frame):
+        super().write(frame.astype(FLOW_COLUMNS))
+
+    def close(self):
+        # Files without any flows still get their columns
+        if self.file is None or self.format == 'csv' and self.file.tell() == 0:
+            self.write(pd.DataFrame(columns=list(FLOW_COLUMNS)))
+        super().close()
+
+    def part(self, index):
+        """Returns the path for flow scores written by a worker process"""
+        return self.path.with_name(f'.{self.path.name}.part-{index:04d}')
+
+
+def start_flow_scores(ctx, path, fmt='csv'):
+    """Exports the scores of all flows predicted in ctx to path, returns the writer"""
+    writer = ctx.meta[FLOW_SCORES_KEY] = FlowScoreWriter(path, fmt)
+    return writer
+
+
+def get_flow_scores():
+    """Returns the FlowScoreWriter of the current run, None if not exporting"""
+    ctx = click.get_current_context(silent=True)
+    return ctx.meta.get(FLOW_SCORES_KEY) if ctx is not None else None
+
+
+def write_flow_scores(data, predictions, start=0):
+    """Exports the scores of the rows of data from position start, if requested
+
+    predictions are the scores of the rows of data starting at position start.
+    They are converted and written in chunks of FLOW_CHUNK_ROWS rows, so the
+    export does not need memory for more than a chunk.
+    """
+    writer = get_flow_scores()
+    if writer is None:
+        return
+
+    hosts = data.hosts['srcaddr'].to_numpy()
+    for offset in range(0, len(predictions), FLOW_CHUNK_ROWS):
+        stop = min(offset + FLOW_CHUNK_ROWS, len(predictions))
+        rows = slice(start + offset, start + stop)
+        writer.write(pd.DataFrame({
+            'File': str(data.path),
+            'Flow': data.data.index[rows],
+            'Host': hosts[rows],
+            'Score': np.asarray(predictions[offset:stop])
+        }))
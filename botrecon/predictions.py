@@ -1,6 +1,14 @@
 import click
 import pandas as pd
 import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from botrecon.aggregate import HostAggregate
+from botrecon.data import get_data, get_data_chunked, get_chunk_rows, report_memory
+from botrecon.ip import IPRangeIndex
+from botrecon.metrics import stage
+from botrecon.output import get_flow_scores, start_flow_scores, write_flow_scores
 
 
 def get_predictions(data, model):
@@ -8,51 +16,276 @@ def get_predictions(data, model):
     ctx = click.get_current_context()
     verbose = ctx.params['verbosity'] > 0 or ctx.params['debug']
 
-    if verbose:
-        click.echo('Loading the model')
-
-    model = load_model(model)
-    model = adjust_njobs(model, ctx.params['jobs'])
+    spec = model
+    with stage('load_model'):
+        model = get_model(model)
 
     if verbose:
         click.echo('Filtering data')
 
-    data = filter_hosts(data, ctx.params['min_count'])
+    with stage('filter', data.data.shape[0]) as filtering:
+        data = sample_flows(filter_hosts(data, ctx.params['min_count']))
+        filtering.rows_out = data.data.shape[0]
+    report_memory('filtering', data.data, data.hosts)
 
     if verbose:
         click.echo('Predicting')
 
     batchify = ctx.params['batchify']
-    if batchify[0]:
-        predictions, threshold = make_predictions_batchified(data, model, batchify)
+    dedup = ctx.params['dedup']
+    parallel = ctx.params['parallel_batches'] and not has_njobs(model)
+    n_workers = get_n_workers(ctx.params['jobs'])
+    if not batchify[0] and ctx.params['memory_limit']:
+        in_flight = 2 * n_workers if parallel else 1
+        batchify = plan_batches(data, model, ctx.params['memory_limit'], in_flight)
+
+    with open_score_cache(spec, model) as cache, \
+            stage('predict', data.data.shape[0]) as predicting:
+        if batchify[0] and parallel:
+            if verbose:
+                click.echo(f'Predicting batches in {n_workers} worker processes')
+            with ProcessPoolExecutor(n_workers, initializer=init_worker,
+                                     initargs=(spec,)) as pool:
+                predictions, threshold = make_predictions_batchified(
+                    data, model, batchify, pool, 2 * n_workers, dedup, cache
+                )
+        elif batchify[0]:
+            predictions, threshold = make_predictions_batchified(
+                data, model, batchify, dedup=dedup, cache=cache
+            )
+        else:
+            predictions, threshold = make_predictions(data.data, model, dedup, cache)
+            write_flow_scores(data, predictions)
+        predicting.rows_out = len(predictions)
+        report_cache(cache)
+
+    if verbose and ctx.params['memory_limit']:
+        report_peak_memory(batchify[0] and parallel)
+
+    if verbose:
+        click.echo('Extracting infected hosts')
+
+    with stage('evaluate', len(predictions)) as evaluating:
+        hosts = evaluate_per_host(predictions, data, threshold)
+        evaluating.rows_out = hosts.shape[0]
+    return hosts
+
+
+def get_predictions_streamed(chunks, model):
+    """Makes predictions chunk by chunk and returns a list of infected hosts
+
+    Only the running per-host sums and counts are kept between chunks, so the
+    memory usage does not depend on the total amount of data.
+    """
+    ctx = click.get_current_context()
+    verbose = ctx.params['verbosity'] > 0 or ctx.params['debug']
+
+    spec = model
+    with stage('load_model'):
+        model = get_model(model)
+    threshold = get_threshold(model)
+    aggregate = HostAggregate()
+
+    if verbose:
+        click.echo('Predicting in chunks')
+
+    with open_score_cache(spec, model) as cache:
+        for i, data in enumerate(chunks):
+            # The count filter needs the totals, it is applied once all are known
+            with stage('filter', data.data.shape[0]) as filtering:
+                data = sample_flows(filter_hosts(data))
+                filtering.rows_out = data.data.shape[0]
+            if ctx.params['debug']:
+                click.echo(f'chunk {i}: {data.data.shape[0]} rows, '
+                           f'{len(aggregate)} hosts so far')
+            if data.data.shape[0] == 0:
+                continue
+
+            with stage('predict', data.data.shape[0]) as predicting:
+                predictions, threshold = predict_chunk(data, model, cache)
+                aggregate.update_codes(predictions, data.host_codes, data.host_uniques,
+                                       data.weights)
+                predicting.rows_out = len(predictions)
+        report_cache(cache)
+
+    if verbose:
+        click.echo('Extracting infected hosts')
+
+    with stage('evaluate', len(aggregate)) as evaluating:
+        hosts = aggregate.evaluate(threshold, ctx.params['min_count'])
+        evaluating.rows_out = hosts.shape[0]
+    return hosts
+
+
+def get_predictions_files(paths, ftype, model, no_transforms=False):
+    """Scores several files and returns a list of infected hosts
+
+    Every file is scored on its own into per-host sums and counts, in worker
+    processes if more than one job is allowed, and these are merged in the
+    order of the files. The result is the same as if the files were
+    concatenated and scored at once. Workers export --flow-scores to a
+    separate file each, which are appended to it in the same order.
+    """
+    ctx = click.get_current_context()
+    verbose = ctx.params['verbosity'] > 0 or ctx.params['debug']
+    n_workers = min(get_n_workers(ctx.params['jobs']), len(paths))
+    aggregate = HostAggregate()
+    threshold = .5
+    flow_scores = get_flow_scores()
+    parts = [None] * len(paths)
+    if flow_scores is not None and n_workers > 1:
+        parts = [flow_scores.part(i) for i in range(len(paths))]
+
+    def merge(partials):
+        nonlocal threshold
+        for path, part, (partial, threshold) in zip(paths, parts, partials):
+            if verbose:
+                click.echo(f'Scored {path}: {len(partial)} hosts')
+            aggregate.merge(partial)
+            if part is not None:
+                flow_scores.append_file(part)
+                part.unlink()
+
+    if n_workers > 1:
+        if verbose:
+            click.echo(f'Scoring {len(paths)} files in {n_workers} worker processes')
+        params = get_worker_params(ctx.params, n_workers)
+        # The stages of the workers are not recorded, only the whole scoring
+        with ProcessPoolExecutor(n_workers, initializer=init_file_worker,
+                                 initargs=(model, params)) as pool, \
+                stage('score_files', len(paths)) as scoring:
+            try:
+                merge(pool.map(aggregate_file_in_worker, paths, repeat(ftype),
+                               repeat(no_transforms), parts))
+            finally:
+                for part in parts:
+                    if part is not None:
+                        try:
+                            part.unlink()
+                        except FileNotFoundError:
+                            pass
+            scoring.rows_out = len(aggregate)
     else:
-        predictions, threshold = make_predictions(data.data, model)
+        spec = model
+        with stage('load_model'):
+            model = get_model(model)
+        with open_score_cache(spec, model) as cache:
+            merge(aggregate_file(path, ftype, model, no_transforms, cache)
+                  for path in paths)
+            report_cache(cache)
 
     if verbose:
         click.echo('Extracting infected hosts')
 
-    return evaluate_per_host(predictions, data.hosts, threshold)
+    with stage('evaluate', len(aggregate)) as evaluating:
+        hosts = aggregate.evaluate(threshold, ctx.params['min_count'])
+        evaluating.rows_out = hosts.shape[0]
+    return hosts
+
+
+def aggregate_file(path, ftype, model, no_transforms=False, cache=None):
+    """Scores all flows in path, returns their HostAggregate and the threshold
+
+    The count filter needs the totals of all files, so it is not applied.
+    """
+    chunk_rows = get_chunk_rows(ftype)
+    if chunk_rows:
+        chunks = get_data_chunked(path, ftype, chunk_rows, no_transforms)
+    else:
+        chunks = [get_data(path, ftype, no_transforms)]
+
+    aggregate = HostAggregate()
+    threshold = get_threshold(model)
+    for data in chunks:
+        with stage('filter', data.data.shape[0]) as filtering:
+            data = sample_flows(filter_hosts(data))
+            filtering.rows_out = data.data.shape[0]
+        if data.data.shape[0] == 0:
+            continue
+
+        with stage('predict', data.data.shape[0]) as predicting:
+            predictions, threshold = predict_chunk(data, model, cache)
+            aggregate.update_codes(predictions, data.host_codes, data.host_uniques,
+                                   data.weights)
+            predicting.rows_out = len(predictions)
+
+    return aggregate, threshold
+
+
+def predict_chunk(data, model, cache=None):
+    """Predicts a chunk of a streamed or followed capture, or one of several files
+
+    Returns the predictions and the threshold like make_predictions. The
+    chunk is split into batches by --batchify, or, without it, if it would
+    not fit in the --memory-limit.
+    """
+    ctx = click.get_current_context()
+    batchify = ctx.params['batchify']
+    dedup = ctx.params['dedup']
+    if not batchify[0] and ctx.params['memory_limit']:
+        batchify = plan_batches(data, model, ctx.params['memory_limit'])
+    if batchify[0]:
+        return make_predictions_batchified(data, model, batchify, dedup=dedup, cache=cache)
+
+    predictions, threshold = make_predictions(data.data, model, dedup, cache)
+    write_flow_scores(data, predictions)
+    return predictions, threshold
+
+
+def get_model(model):
+    """Loads the model and sets it up to use the requested number of jobs
+
+    Models that are already loaded (not a name or a path) are returned as is.
+    """
+    if not is_model_spec(model):
+        return model
+
+    ctx = click.get_current_context()
+    if ctx.params['verbosity'] > 0 or ctx.params['debug']:
+        click.echo('Loading the model')
+
+    model = load_model(model)
+    return adjust_njobs(model, ctx.params['jobs'])
 
 
-def make_predictions_batchified(data, model, batchify):
-    """Splits data into batches, gets predictions for each and merges them back"""
+def make_predictions_batchified(data, model, batchify, pool=None, window=1,
+                                dedup=False, cache=None):
+    """Splits data into batches, gets predictions for each and merges them back
+
+    If a pool created with init_worker is passed, the batches are predicted by
+    its worker processes instead, with at most window batches submitted at
+    once. The results are still merged in order, and exported with
+    --flow-scores as they arrive.
+    """
     shape = data.data.shape[0]
     results = []
+    position = 0
+
+    def collect(result):
+        nonlocal position
+        write_flow_scores(data, result[0], position)
+        position += len(result[0])
+        results.append(result)
+
+    batches = data.batchify(*batchify)
+    if pool is None:
+        predicted = ((batch, make_predictions(batch, model, dedup, cache))
+                     for batch in batches)
+    else:
+        predicted = predict_in_pool(pool, batches, window, dedup, cache,
+                                    get_threshold(model))
 
     ctx = click.get_current_context()
     if ctx.params['verbosity'] >= 0 and not ctx.params['debug']:
         with click.progressbar(label='Predicting', length=shape) as bar:
-            for batch in data.batchify(*batchify):
-                results.append(make_predictions(batch, model))
+            for batch, result in predicted:
+                collect(result)
                 bar.update(batch.shape[0])
-    elif ctx.params['debug']:
-        for batch in data.batchify(*batchify):
+    else:
+        for batch, result in predicted:
             if ctx.params['debug']:
                 click.echo(f'batch shape: {batch.shape}, result length: {len(results)}')
-            results.append(make_predictions(batch, model))
-    else:
-        for batch in data.batchify(*batchify):
-            results.append(make_predictions(batch, model))
+            collect(result)
 
     threshold = results[0][1]
     preds = np.concatenate([result[0] for result in results])
@@ -63,6 +296,232 @@ def make_predictions_batchified(data, model, batchify):
     return preds, threshold
 
 
+# Model loaded by each of the worker processes, see init_worker
+_worker_model = None
+
+
+def init_worker(model):
+    """Loads the model once in a worker process of a prediction pool"""
+    global _worker_model
+    _worker_model = load_model(model) if is_model_spec(model) else model
+
+
+# Options and model spec used by the worker processes scoring whole files
+_worker_params = None
+_worker_spec = None
+
+
+def get_worker_params(params, n_workers):
+    """Returns the options used to score files in n_workers worker processes
+
+    Workers are silent and single threaded, and share the memory limit.
+    """
+    params = dict(params)
+    params.update(verbosity=-1, debug=False, parallel_batches=False, jobs=1)
+    if params.get('memory_limit'):
+        params['memory_limit'] //= n_workers
+    return params
+
+
+def worker_context():
+    """Returns a click context with the options passed to init_file_worker"""
+    ctx = click.Context(click.Command('botrecon'))
+    ctx.params.update(_worker_params)
+    return ctx
+
+
+def init_file_worker(model, params):
+    """Loads the model once in a worker process scoring whole files"""
+    global _worker_params, _worker_spec
+    _worker_params = params
+    _worker_spec = model
+    init_worker(model)
+    with worker_context():
+        adjust_njobs(_worker_model, 1)
+
+
+def aggregate_file_in_worker(path, ftype, no_transforms=False, flow_scores=None):
+    """Scores a file with the model loaded by init_file_worker
+
+    If flow_scores is passed, the scores of the flows are exported there.
+    """
+    with worker_context() as ctx:
+        if flow_scores is not None:
+            start_flow_scores(ctx, flow_scores, ctx.params['output_format'])
+        try:
+            with open_score_cache(_worker_spec, _worker_model) as cache:
+                return aggregate_file(path, ftype, _worker_model, no_transforms, cache)
+        finally:
+            if flow_scores is not None:
+                get_flow_scores().close()
+
+
+def predict_batch(batch, dedup=False):
+    """Predicts a single batch using the model loaded by init_worker"""
+    return make_predictions(batch, _worker_model, dedup)
+
+
+def predict_in_pool(pool, batches, window, dedup=False, cache=None, threshold=.5):
+    """Yields (batch, predictions) pairs in order, predicted by pool workers
+
+    At most window batches are submitted to the pool at once, so that batches
+    are not all copied to the workers at the same time. If a cache is passed,
+    it is used by this process and only the missing rows are submitted.
+    """
+    pending = deque()
+    for batch in batches:
+        pending.append((batch, submit_batch(pool, batch, dedup, cache)))
+        if len(pending) >= window:
+            batch, submitted = pending.popleft()
+            yield batch, collect_batch(*submitted, cache, threshold)
+
+    while pending:
+        batch, submitted = pending.popleft()
+        yield batch, collect_batch(*submitted, cache, threshold)
+
+
+def submit_batch(pool, batch, dedup=False, cache=None):
+    """Submits the rows of batch that are not in the cache to the pool
+
+    Returns the result of the cache lookup (None without a cache) and the
+    future, which is None if all rows were found.
+    """
+    if cache is None:
+        return None, pool.submit(predict_batch, batch, dedup)
+
+    lookup = cache.lookup(batch)
+    missing = lookup[2]
+    if not missing.any():
+        return lookup, None
+    return lookup, pool.submit(predict_batch, batch[missing], dedup)
+
+
+def collect_batch(lookup, future, cache=None, threshold=.5):
+    """Returns the predictions of a batch submitted with submit_batch"""
+    if lookup is None:
+        return future.result()
+
+    keys, scores, missing = lookup
+    if future is not None:
+        preds, threshold = future.result()
+        scores[missing] = preds
+        cache.store(keys[missing], preds)
+    return scores, threshold
+
+
+# Smallest batch chosen by plan_batches, smaller ones are too slow to predict
+MIN_BATCH_ROWS = 1024
+
+
+def plan_batches(data, model, limit, in_flight=1):
+    """Returns batchify values keeping the memory usage under limit bytes
+
+    The memory left after what this process already uses is split between
+    in_flight batches, each taking the estimated memory per row of the model
+    in addition to the data itself.
+    """
+    ctx = click.get_current_context()
+    n_rows = data.data.shape[0]
+    per_row = estimate_row_memory(model, data.data.shape[1]) + data.row_size()
+    # Predictions of all rows are kept until they are merged, twice then
+    available = limit - current_rss() - 16 * n_rows
+    rows = max(int(max(available, 0) // (per_row * in_flight)), MIN_BATCH_ROWS)
+
+    if ctx.params['verbosity'] > 0 or ctx.params['debug']:
+        if available <= 0:
+            click.echo('The memory limit is lower than the memory already used')
+        plan = 'all rows at once' if rows >= n_rows else f'batches of {rows} rows'
+        click.echo(f'Memory limit {limit / 2**20:.0f} MiB, '
+                   f'{max(available, 0) / 2**20:.0f} MiB available, '
+                   f'estimated {per_row:.0f} bytes per row: predicting {plan}')
+
+    if rows >= n_rows:
+        return (0, '')
+    return (rows, 'rows')
+
+
+def estimate_row_memory(model, n_columns):
+    """Estimates the peak number of bytes used to predict a single row
+
+    The width of the data is followed through the steps of the pipeline, at
+    every step both its input and its output (and some temporary arrays) are
+    kept in memory, all of them as float64.
+    """
+    from os import cpu_count
+
+    steps = [step for _, step in model.steps] if hasattr(model, 'steps') else [model]
+    # Encoded copy of the data and its conversion to a numpy array
+    width = n_columns
+    peak = 2 * width
+    for step in steps:
+        extra = 0
+        if hasattr(step, 'components_'):
+            # Kernel approximations and decompositions, e.g. Nystroem, which
+            # computes distances to the components before the kernel itself
+            out = step.components_.shape[0]
+            extra = 2 * out
+        elif hasattr(step, 'estimators_'):
+            # Forests predict with every thread adding up its own probabilities,
+            # the data is converted to float32 through float64 first
+            out = len(getattr(step, 'classes_', [0, 1]))
+            n_jobs = getattr(step, 'n_jobs', None) or 1
+            threads = (cpu_count() or 1) if n_jobs < 0 else n_jobs
+            extra = out * threads + width + width // 2
+        elif hasattr(step, 'offsets'):
+            # Compiled forests add up the probabilities of a block of rows at
+            # a time, the data is converted to float32 through float64 first
+            out = step.values.shape[1]
+            extra = width + width // 2
+        elif hasattr(step, 'coef_'):
+            out = 1 if step.coef_.ndim == 1 else step.coef_.shape[0]
+        else:
+            out = width
+        peak = max(peak, width + out + extra)
+        width = out
+    return 8 * peak
+
+
+def report_peak_memory(workers=False):
+    """Prints the peak memory used by this process and the worker processes"""
+    peak, workers_peak = peak_rss()
+    message = f'Peak memory usage: {peak / 2**20:.0f} MiB'
+    if workers:
+        message += f', worker processes: {workers_peak / 2**20:.0f} MiB each at most'
+    click.echo(message)
+
+
+def current_rss():
+    """Returns the memory currently used by this process in bytes"""
+    import os
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return peak_rss()[0]
+
+
+def peak_rss():
+    """Returns the peak memory used by this process and its children in bytes"""
+    import sys
+    try:
+        import resource
+    except ImportError:
+        return 0, 0
+
+    # Linux reports kilobytes, macOS bytes
+    unit = 1 if sys.platform == 'darwin' else 1024
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit)
+
+
+def get_n_workers(n_jobs):
+    """Returns the number of worker processes matching the passed jobs"""
+    from os import cpu_count
+    if n_jobs < 0:
+        return cpu_count() or 1
+    return n_jobs
+
+
 def adjust_njobs(model, n_jobs):
     """Attempts to set the number of jobs for the classifier/pipeline"""
     ctx = click.get_current_context()
@@ -84,83 +543,339 @@ def adjust_njobs(model, n_jobs):
             return model
 
 
-def make_predictions(data, model):
-    """Performs final checks and predicts using the appropriate method."""
+def has_njobs(model):
+    """Checks if the classifier supports multiprocessing on its own
+
+    For pipelines only the last step is checked, transformers with n_jobs
+    (such as Nystroem) do not make predicting itself parallel.
+    """
+    if hasattr(model, 'steps'):
+        model = model.steps[-1][1]
+    return hasattr(model, 'n_jobs')
+
+
+def make_predictions(data, model, dedup=False, cache=None):
+    """Performs final checks and predicts using the appropriate method.
+
+    If dedup is set, only unique rows are passed to the model and their
+    scores are copied to all of their duplicates. If a ScoreCache is passed,
+    scores of rows found in it are reused and only the rest are predicted.
+    """
+    if dedup:
+        first, inverse = find_duplicates(data)
+        report_dedup(data.shape[0], first.shape[0])
+        preds, threshold = make_predictions(data.iloc[first], model, cache=cache)
+        return np.asarray(preds)[inverse], threshold
+
+    if cache is not None:
+        keys, scores, missing = cache.lookup(data)
+        if missing.any():
+            preds, _ = make_predictions(data[missing], model)
+            scores[missing] = preds
+            cache.store(keys[missing], preds)
+        return scores, get_threshold(model)
+
+    threshold = get_threshold(model)
     if hasattr(model, 'predict_proba'):
-        return model.predict_proba(data)[:, 1], .5
+        return model.predict_proba(data)[:, 1], threshold
     elif hasattr(model, 'decision_function'):
-        return model.decision_function(data), 0
+        return model.decision_function(data), threshold
     else:
-        return model.predict(data), .5
+        return model.predict(data), threshold
 
 
-def filter_hosts(data, min_count=0):
-    """Removes hosts that do not satisfy filter conditions"""
+def find_duplicates(data):
+    """Finds identical rows of data
+
+    Returns positions of the first occurrence of every unique row and, for
+    every row, the index of its unique row among them.
+    """
+    # Each column is factorized and the codes are combined into a single code
+    # per row, which is factorized again so that it can not overflow
+    inverse = np.zeros(data.shape[0], dtype='int64')
+    for column in data.columns:
+        codes, uniques = pd.factorize(data[column])
+        inverse = inverse * (len(uniques) + 1) + (codes + 1)
+        inverse, _ = pd.factorize(inverse)
+
+    # Codes are assigned in order of appearance
+    _, first = np.unique(inverse, return_index=True)
+    return first, inverse
+
+
+def report_dedup(rows, unique):
+    """Prints the deduplication ratio in verbose mode"""
+    ctx = click.get_current_context(silent=True)
+    if ctx is None or rows == 0:
+        return
+    if ctx.params.get('verbosity', 0) > 0 or ctx.params.get('debug'):
+        click.echo(f'Deduplicated {rows} rows to {unique} unique '
+                   f'({rows / max(unique, 1):.2f}x)')
+
+
+def open_score_cache(spec, model):
+    """Opens the score cache passed with --score-cache for the model
+
+    Returns a context that does nothing if the option was not used.
+    """
+    from contextlib import nullcontext
+
     ctx = click.get_current_context()
+    if not ctx.params.get('score_cache'):
+        return nullcontext()
 
-    data.hosts['count'] = 0
-    data.hosts['count'] = data.hosts.groupby('srcaddr').transform('count')['count']
+    from botrecon.cache import ScoreCache
+    fingerprint = get_model_path(spec) if is_model_spec(spec) else model
+    return ScoreCache(ctx.params['score_cache'], fingerprint,
+                      ctx.params['score_cache_size'])
 
-    if min_count > 0:
-        m = data.hosts['count'].map(lambda count: count > min_count)
-        data.hosts = data.hosts[m]
-        data.data = data.data[m]
 
-    if ctx.params['range']:
-        m = filter_ips(data.hosts, ctx.params["range"])
-        if m is not None:
-            data.hosts = data.hosts[m]
-            data.data = data.data[m]
+def report_cache(cache):
+    """Prints the hit rate and lookup time of the cache in verbose mode"""
+    ctx = click.get_current_context()
+    if cache is None or not (ctx.params['verbosity'] > 0 or ctx.params['debug']):
+        return
+    rate = cache.hits / max(cache.lookups, 1)
+    click.echo(f'Score cache: {cache.hits} of {cache.lookups} rows found '
+               f'({rate:.1%}), lookups took {cache.lookup_time:.2f}s')
+
 
-    return data
+def get_threshold(model):
+    """Returns the score threshold matching the method make_predictions uses"""
+    if hasattr(model, 'predict_proba'):
+        return .5
+    elif hasattr(model, 'decision_function'):
+        return 0
+    else:
+        return .5
 
 
-def filter_ips(hosts, ranges):
-    """Removes hosts not in the specified ranges"""
-    if not ranges:
-        return None
+def filter_hosts(data, min_count=0):
+    """Removes hosts that do not satisfy filter conditions
 
-    ignore_invalid = click.get_current_context().params['ignore_invalid']
+    The conditions are evaluated once per host, using the factorized host
+    codes, and then applied to all rows at once.
+    """
+    ranges = click.get_current_context().params['range']
+    if min_count <= 0 and not ranges:
+        return data
 
-    def condition(addr, ignore_invalid=ignore_invalid):
-        # Checks if the passed address matches any of the specified ranges
-        return np.any([r.matches(addr, ignore_invalid) for r in ranges])
-    # Map returns a boolean array with True where the condition was satisfied
-    return hosts['srcaddr'].map(condition)
+    # Missing addresses get a code of -1, they are kept at position 0
+    codes, uniques = data.host_codes, data.host_uniques
+    keep = np.ones(len(uniques) + 1, dtype=bool)
 
+    if min_count > 0:
+        keep &= np.bincount(codes + 1, minlength=keep.shape[0]) > min_count
+        keep[0] = False
 
-def evaluate_per_host(preds, hosts, threshold=.5):
-    """Returns a dataframe with infected hosts based on the passed predictions"""
-    preds = pd.DataFrame({
-        'host': hosts['srcaddr'],
-        'count': hosts['count'],
-        'pred': preds
-    })
+    if ranges:
+        hosts = np.flatnonzero(keep[1:])
+        keep[hosts + 1] = filter_ips(uniques[hosts], ranges)
+        if keep[0] and (codes < 0).any():
+            keep[0] = filter_ips(np.array([np.nan], dtype=object), ranges)[0]
+
+    return data.select(keep[codes + 1])
 
-    preds.loc[:, 'count'] = preds.groupby('host').transform('count')['count']
 
-    preds.loc[:, 'mean'] = preds.groupby('host')['pred'].transform('mean')
-    preds.drop_duplicates('host', inplace=True)
-    preds.loc[:, 'pred'] = np.int8(preds.loc[:, 'mean'] >= threshold)
+def sample_flows(data):
+    """Keeps a random sample of at most --max-flows-per-host flows of every host
 
-    preds = preds.query('pred == 1')  # Only return infected hosts
-    preds = preds.loc[:, ['host', 'mean', 'count']]
-    preds = preds.sort_values('mean', ascending=False)
-    return preds.reset_index(drop=True)
+    Every flow gets a random key and the flows of a host with the smallest
+    keys are kept, which is a uniform sample without replacement. Kept flows
+    of a host with n flows, k of them kept, stand for n / k flows each in
+    data.weights, so hosts keep their true flow count and the weighted sum of
+    their scores estimates the sum over all of their flows without bias, also
+    when the samples of several chunks are added up. Flows without an address
+    are sampled as if they were a host of their own.
+    """
+    ctx = click.get_current_context()
+    limit = ctx.params.get('max_flows_per_host')
+    if not limit or data.data.shape[0] == 0:
+        return data
+
+    # Missing addresses get a code of -1, they are kept at position 0
+    codes = data.host_codes + 1
+    counts = np.bincount(codes)
+    # Only the flows of hosts with more flows than the limit are sampled
+    over = np.flatnonzero(counts[codes] > limit)
+    if over.shape[0] == 0:
+        return data
+
+    rows = data.data.index
+    rows = rows[over] if pd.api.types.is_integer_dtype(rows) else over
+    keys = flow_keys(rows, ctx.params['sample_seed'])
+    # Sorted by host and then key at once, with both packed in 64 bits
+    bits = np.uint64(max(int(codes.max()).bit_length(), 1))
+    packed = (codes[over].astype('uint64') << (np.uint64(64) - bits)) | (keys >> bits)
+    order = over[np.argsort(packed)]
+
+    sampled = np.where(counts > limit, counts, 0)
+    starts = np.cumsum(sampled) - sampled
+    ranks = np.arange(order.shape[0]) - starts[codes[order]]
+    keep = np.ones(codes.shape[0], dtype=bool)
+    keep[order[ranks >= limit]] = False
+
+    # Codes without flows, e.g. of hosts filtered out before, keep a weight of 1
+    weights = np.divide(counts, np.minimum(counts, limit), out=np.ones(counts.shape),
+                        where=counts > 0)
+    data.weights = weights[codes]
+    return data.select(keep)
+
+
+def flow_keys(index, seed=0):
+    """Returns a pseudo-random uniform key for every flow, based on its row number
+
+    Keys are the splitmix64 hashes of the row numbers in the input file, so
+    the same flows are sampled however the file is split into chunks,
+    batches or worker processes.
+    """
+    golden = np.uint64(0x9E3779B97F4A7C15)
+    with np.errstate(over='ignore'):
+        x = np.asarray(index).astype('uint64') + np.uint64(seed) * golden + golden
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def filter_ips(addresses, ranges):
+    """Returns a boolean array with True for addresses in the specified ranges
+
+    ranges is an IPRangeIndex, such as the parsed --range, or IPEntities to
+    index. Every address is checked, so it is best to pass unique addresses.
+    """
+    ignore_invalid = click.get_current_context().params['ignore_invalid']
+    if not isinstance(ranges, IPRangeIndex):
+        ranges = IPRangeIndex(ranges)
+    return ranges.contains(addresses, ignore_invalid)
 
 
-def load_model(model):
-    """Loads the model from the passed path or name"""
+def evaluate_per_host(preds, data, threshold=.5):
+    """Returns a dataframe with infected hosts based on the passed predictions"""
+    aggregate = HostAggregate().update_codes(preds, data.host_codes, data.host_uniques,
+                                             data.weights)
+    return aggregate.evaluate(threshold)
+
+
+def load_model(model, compile=True):
+    """Loads the model from the passed path or name
+
+    Models stored with joblib (.joblib files) are memory-mapped, so the numpy
+    arrays inside are read lazily and shared between processes through the
+    page cache. Bundled models are looked up as .joblib first, then as .pkl,
+    and are returned wrapped in a PreparedModel for data prepared by Data.
+    Bundled .pkl models are converted to a .joblib file in the model cache
+    (see model_cache_path) the first time they are loaded, and memory-mapped
+    from there afterwards. Random forests are replaced with a CompiledForest
+    unless compile is False.
+    """
     import sklearn
     import category_encoders
     import pickle
-    import pkg_resources
     from pathlib import Path
 
+    path = get_model_path(model)
+    cached = None
+    if path.suffix == '.pkl' and not isinstance(model, Path):
+        cached = model_cache_path(path)
+        if cached is not None and cached.exists():
+            path, cached = cached, None
+
+    if path.suffix == '.joblib':
+        import joblib
+        loaded = joblib.load(path, mmap_mode='r')
+    else:
+        loaded = pickle.loads(path.read_bytes())
+        if cached is not None:
+            cache_model(loaded, cached)
+
+    if compile:
+        from botrecon.forest import compile_model
+        loaded = compile_model(loaded)
+
+    # Custom models get the data without transforms, they are used as is
     if isinstance(model, Path):
-        return pickle.loads(model.read_bytes())
+        return loaded
+
+    from botrecon.data import Data
+    from botrecon.encoding import PreparedModel
+    return PreparedModel(loaded, Data.STRING_COLUMNS)
 
-    model = 'models/' + model + '.pkl'
-    model = pkg_resources.resource_string('botrecon', model)
 
-    return pickle.loads(model)
+def is_model_spec(model):
+    """Checks if model is a name or a path of a model rather than a loaded one"""
+    from pathlib import Path
+    return isinstance(model, (str, Path))
+
+
+def get_model_path(model):
+    """Returns the path to the file of the passed model path or name"""
+    from pathlib import Path
+
+    if isinstance(model, Path):
+        return model
+
+    # pkg_resources is not used here as importing it is slow
+    for ext in ['.joblib', '.pkl']:
+        path = Path(__file__).parent / 'models' / (model + ext)
+        if path.exists():
+            return path
+
+    raise FileNotFoundError(f'Model {model} is not available')
+
+
+def model_cache_path(path):
+    """Returns the path of the memory-mappable copy of a bundled .pkl model
+
+    The copies are kept in the directory set by BOTRECON_MODEL_CACHE, by
+    default botrecon/models in the user's cache directory. Setting it to an
+    empty string disables the cache and None is returned. The name of a copy
+    holds the size and modification time of the .pkl file and the version of
+    sklearn, so changed models and sklearn upgrades are converted again.
+    """
+    import os
+    import sklearn
+    from pathlib import Path
+
+    directory = os.environ.get('BOTRECON_MODEL_CACHE')
+    if directory is None:
+        base = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+        directory = Path(base) / 'botrecon' / 'models'
+    elif not directory:
+        return None
+
+    stat = path.stat()
+    return Path(directory) / (f'{path.stem}.{stat.st_size}.{stat.st_mtime_ns}.'
+                              f'sklearn-{sklearn.__version__}.joblib')
+
+
+def cache_model(model, path):
+    """Saves a bundled model to the model cache, see model_cache_path
+
+    Older copies of the same model are removed. The cache is only an
+    optimization, so models are still loaded when it cannot be written.
+    """
+    import os
+    name = path.name.split('.')[0]
+    temporary = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        dump_model(model, temporary)
+        # Concurrent runs converting the same model replace it atomically
+        os.replace(temporary, path)
+        for old in path.parent.glob(f'{name}.*.joblib'):
+            if old != path:
+                old.unlink()
+    except OSError:
+        try:
+            temporary.unlink()
+        except OSError:
+            pass
+
+
+def dump_model(model, path):
+    """Saves the model in a format that load_model can memory-map
+
+    The file must not be compressed for the arrays to be memory-mapped.
+    """
+    import joblib
+    return joblib.dump(model, path, compress=0)
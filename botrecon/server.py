@@ -0,0 +1,284 @@
+import click
+import json
+import os
+import signal
+import socketserver
+import stat
+import sys
+import tempfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+from botrecon.cli import parse_jobs, parse_model, check_binary, check_streaming
+
+
+def request_args(path, options):
+    """Converts the options of a scoring request to botrecon arguments"""
+    args = ['--silent', '--confirm', '--type', str(options.get('type', 'csv'))]
+
+    if options.get('min_count'):
+        args += ['--min-count', str(int(options['min_count']))]
+
+    ranges = options.get('range', [])
+    if isinstance(ranges, str):
+        ranges = [ranges]
+    for item in ranges:
+        args += ['--range', str(item)]
+
+    if options.get('ignore_invalid') not in (None, False, 'false', '0', ''):
+        args.append('--ignore-invalid')
+
+    if options.get('dedup') not in (None, False, 'false', '0', ''):
+        args.append('--dedup')
+
+    if options.get('stream_chunk_rows'):
+        args += ['--stream-chunk-rows', str(int(options['stream_chunk_rows']))]
+
+    # Paths starting with a dash must not be taken for options
+    return args + ['--', str(path)]
+
+
+class ScoringHandler(BaseHTTPRequestHandler):
+    """Handles requests to a scoring server, see serve for the API"""
+    def do_GET(self):
+        if urlparse(self.path).path != '/health':
+            return self.send_json(404, {'error': f'Not found: {self.path}'})
+        self.send_json(200, {'status': 'ok', 'model': self.server.model_name})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/score':
+            return self.send_json(404, {'error': f'Not found: {self.path}'})
+
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            if self.headers.get_content_type() == 'application/json':
+                options = json.loads(body)
+                if 'path' not in options:
+                    raise ValueError('Missing "path" of the file to score')
+                table = self.server.score(options['path'], options)
+            else:
+                table = self.score_body(body, parse_qs(url.query))
+        except click.ClickException as e:
+            return self.send_json(400, {'error': e.format_message()})
+        except Exception as e:
+            if self.server.debug:
+                raise
+            return self.send_json(400, {'error': str(e)})
+
+        hosts = table.to_json(orient='records', double_precision=15)
+        self.send_body(200, f'{{"hosts": {hosts}}}'.encode())
+
+    def score_body(self, body, query):
+        """Scores data sent in the request body by saving it to a temporary file"""
+        options = {k: v if k == 'range' else v[-1] for k, v in query.items()}
+        suffix = '.' + options.get('type', 'csv')
+
+        fd, path = tempfile.mkstemp(suffix=suffix, prefix='botrecon-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(body)
+            return self.server.score(path, options)
+        finally:
+            os.unlink(path)
+
+    def send_json(self, code, obj):
+        self.send_body(code, json.dumps(obj).encode())
+
+    def send_body(self, code, body):
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Clients connected over a Unix socket do not have an address
+        if isinstance(self.client_address, tuple):
+            return super().address_string()
+        return self.server.server_address
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            click.echo(f'{self.address_string()} - {format % args}')
+
+
+class ScoringServerMixin(object):
+    """Keeps a loaded model and scores files with it for every request
+
+    Requests are handled in separate threads which all share the same model.
+    """
+    daemon_threads = True
+
+    def setup_model(self, model, model_name, no_transforms, verbose, debug):
+        self.model = model
+        self.model_name = model_name
+        self.no_transforms = no_transforms
+        self.verbose = verbose
+        self.debug = debug
+
+    def score(self, path, options):
+        """Returns the table of infected hosts in path, like botrecon would"""
+        from botrecon.cli import botrecon, score_file
+
+        ctx = botrecon.make_context('botrecon', request_args(path, options))
+        with ctx:
+            ftype = ctx.params['ftype']
+            if ctx.params['stream_chunk_rows']:
+                check_streaming(ctx, ftype)
+            if ftype == 'npy':
+                check_binary(ctx, self.no_transforms)
+            return score_file(self.model, path, ftype, self.no_transforms)
+
+
+class ScoringServer(ScoringServerMixin, ThreadingHTTPServer):
+    """Scoring server listening on a TCP port"""
+
+
+class UnixScoringServer(ScoringServerMixin, socketserver.ThreadingMixIn,
+                        socketserver.UnixStreamServer):
+    """Scoring server listening on a Unix socket"""
+
+
+def make_server(model, model_name=None, no_transforms=False, socket=None,
+                port=0, verbose=False, debug=False):
+    """Creates a scoring server for an already loaded model
+
+    If socket is passed, the server listens on a Unix socket at that path,
+    otherwise on the passed port of localhost (0 picks a free one).
+    """
+    if socket is not None:
+        socket = Path(socket)
+        # Remove sockets left behind by a previous server, but nothing else
+        if socket.exists() and stat.S_ISSOCK(socket.stat().st_mode):
+            socket.unlink()
+        server = UnixScoringServer(str(socket), ScoringHandler)
+    else:
+        server = ScoringServer(('127.0.0.1', port), ScoringHandler)
+
+    server.setup_model(model, model_name, no_transforms, verbose, debug)
+    return server
+
+
+@click.command(
+    epilog="For a more detailed documentation see README.md\n"
+           "https://github.com/mhubl/botrecon"
+)
+@click.option(
+    "-M",
+    "--custom-model",
+    default=None,
+    type=click.Path(exists=True, readable=True),
+    help="Path to your own custom model, see `botrecon --help`."
+)
+@click.option(
+    "-m",
+    "--model",
+    default="rforest",
+    show_default=True,
+    callback=parse_model,
+    type=click.Choice(["rforest", "svm", "rforest-experimental"], case_sensitive=False),
+    help="One of the available, predefined models. This parameter is ignored "
+         "if --custom-model/-M is passed."
+)
+@click.option(
+    '-j',
+    '--jobs',
+    type=int,
+    default=-1,
+    show_default=True,
+    callback=parse_jobs,
+    help='Number of parallel jobs to use for predicting. Negative values will '
+         'match the cpu count.'
+)
+@click.option(
+    '--socket',
+    'socket_path',
+    default=None,
+    type=click.Path(dir_okay=False, writable=True),
+    help='Listen on a Unix socket at this path instead of a TCP port.'
+)
+@click.option(
+    '--port',
+    type=click.IntRange(0, 65535),
+    default=8585,
+    show_default=True,
+    help='Port on localhost (127.0.0.1) to listen on.'
+)
+@click.option(
+    "-v",
+    "--verbose",
+    "verbosity",
+    flag_value=1,
+    help="Log every request to the console."
+)
+@click.option(
+    "-s",
+    "--silent",
+    "verbosity",
+    flag_value=-1,
+    help="Completely disables console output from the application."
+)
+@click.option(
+    "--normal-verbostity",
+    "verbosity",
+    flag_value=0,
+    default=True,
+    hidden=True
+)
+@click.option(
+    "-d",
+    "--debug",
+    is_flag=True,
+    default=False,
+    help="Enable debug mode."
+)
+@click.help_option('-h', '--help')
+def serve(model, socket_path, port, **kwargs):
+    """Keep a model loaded and score captures sent over a local socket
+
+    The model is loaded once, after which every request is scored with it
+    without paying for the startup and model loading again. Requests are
+    handled concurrently and share the loaded model.
+
+    \b
+    GET  /health  returns {"status": "ok", "model": NAME}
+    POST /score   scores a capture, returns {"hosts": [{"host": ADDRESS,
+                  "mean": SCORE, "count": FLOWS}, ...]}
+
+    \b
+    The capture to score is sent either as a JSON body (application/json):
+      {"path": "/path/to/capture.csv", "type": "csv", "min_count": 0,
+       "range": ["10.0.0.0/8"], "ignore_invalid": false, "dedup": false,
+       "stream_chunk_rows": null}
+    where only path is required, or as the raw file contents with any other
+    content type, in which case the options are passed in the query string,
+    e.g. /score?type=csv&min_count=2&range=10.0.0.0/8
+    """
+    from botrecon.predictions import get_model
+
+    ctx = click.get_current_context()
+    verbose = ctx.params['verbosity'] > 0 or ctx.params['debug']
+    name = str(model)
+
+    loaded = get_model(model)
+    server = make_server(loaded, name, isinstance(model, Path), socket_path,
+                         port, verbose, ctx.params['debug'])
+
+    if ctx.params['verbosity'] >= 0:
+        if socket_path is not None:
+            address = f'unix:{socket_path}'
+        else:
+            address = 'http://{}:{}'.format(*server.server_address)
+        click.echo(f'Serving model {name} on {address}')
+
+    # Make termination by a service manager also clean up the socket
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path is not None and os.path.exists(socket_path):
+            os.unlink(socket_path)
@@ -0,0 +1,156 @@
+import click
+import tempfile
+import numpy as np
+import pandas as pd
+from contextlib import nullcontext
+from pathlib import Path
+from botrecon.data import Data
+from botrecon.metrics import stage
+from botrecon.predictions import get_predictions_files
+
+# Rows read at once while partitioning, unless --stream-chunk-rows is passed
+SHARD_CHUNK_ROWS = 1_000_000
+
+
+def get_predictions_sharded(paths, ftype, model, no_transforms=False):
+    """Partitions the flows in paths by host and scores the shards
+
+    Every host ends up in a single shard, so only one shard at a time (per
+    worker) has to fit in memory, while the results stay the same as when
+    scoring all flows at once. Shards are written to --shard-dir, or to a
+    temporary directory which is removed afterwards.
+    """
+    ctx = click.get_current_context()
+    directory = ctx.params['shard_dir']
+    if directory is None:
+        directory = tempfile.TemporaryDirectory(prefix='botrecon-shards-')
+    else:
+        directory = nullcontext(directory)
+
+    with directory as directory:
+        shards = partition(paths, ftype, ctx.params['shards'], directory)
+        return get_predictions_files(shards, ftype, model, no_transforms)
+
+
+def partition(paths, ftype, n_shards, directory):
+    """Writes the flows in paths to n_shards files in directory by source address
+
+    Files are read in chunks and rows keep their order within a shard. Csv
+    files are copied as text, so the shards are parsed just like the input.
+    Returns the paths of the shards that got any rows.
+    """
+    ctx = click.get_current_context()
+    verbose = ctx.params['verbosity'] > 0 or ctx.params['debug']
+    chunk_rows = ctx.params['stream_chunk_rows'] or SHARD_CHUNK_ROWS
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    if verbose:
+        click.echo(f'Partitioning flows into {n_shards} shards in {directory}')
+
+    writer = ShardWriter(directory, ftype, n_shards)
+    with stage('partition') as partitioning:
+        try:
+            for path in paths:
+                kwargs = {'dtype': str, 'keep_default_na': False} if ftype == 'csv' else {}
+                host = host_column(path, ftype)
+                for chunk in Data.read_chunks(path, ftype, chunk_rows, **kwargs):
+                    writer.write(chunk, shard_of(chunk[host], n_shards))
+        finally:
+            writer.close()
+        partitioning.rows_out = int(writer.rows.sum())
+
+    if verbose:
+        click.echo(f'Wrote {writer.rows.sum()} rows to {len(writer.paths)} shards')
+    return writer.paths
+
+
+def host_column(path, ftype):
+    """Returns the name of the column with source addresses in path"""
+    get_columns, _ = Data.HEADERS[ftype]
+    for column in get_columns(path):
+        if str(column).lower().replace(' ', '') in Data.HOST_COLUMNS:
+            return column
+    raise ValueError(f'No column with source addresses found in {path}, expected '
+                     f'one of {Data.HOST_COLUMNS}')
+
+
+def shard_of(hosts, n_shards):
+    """Returns the shard of every address, the same in every process and machine"""
+    hashes = pd.util.hash_pandas_object(hosts.astype(str), index=False)
+    return (hashes.to_numpy() % np.uint64(n_shards)).astype('int64')
+
+
+def shard_path(directory, index, n_shards, ftype):
+    return Path(directory) / f'shard-{index + 1:04d}-of-{n_shards:04d}.{ftype}'
+
+
+class ShardWriter(object):
+    """Appends rows to one csv or parquet file per shard
+
+    Files are created when the first rows of their shard are written, and
+    all shards get the columns of the first chunk.
+
+    Attributes:
+    directory  pathlib.Path   directory the shards are written to
+    ftype      string         filetype of the shards, csv or parquet
+    rows       numpy.ndarray  number of rows written to every shard
+    """
+    def __init__(self, directory, ftype, n_shards):
+        self.directory = Path(directory)
+        self.ftype = ftype
+        self.n_shards = n_shards
+        self.columns = None
+        self.files = {}
+        self.rows = np.zeros(n_shards, dtype='int64')
+
+        # Empty shards left by an earlier partitioning would be scored too
+        for i in range(n_shards):
+            try:
+                shard_path(directory, i, n_shards, ftype).unlink()
+            except FileNotFoundError:
+                pass
+
+    @property
+    def paths(self):
+        """Paths of the shards written so far, in order"""
+        return [shard_path(self.directory, i, self.n_shards, self.ftype)
+                for i in np.flatnonzero(self.rows)]
+
+    def write(self, chunk, shards):
+        """Appends the rows of chunk to the shards they belong to"""
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+        chunk = chunk[self.columns]
+
+        # Stable, so rows keep their order within every shard
+        order = np.argsort(shards, kind='stable')
+        bounds = np.searchsorted(shards[order], np.arange(self.n_shards + 1))
+        for i in range(self.n_shards):
+            if bounds[i] == bounds[i + 1]:
+                continue
+            self._append(i, chunk.iloc[order[bounds[i]:bounds[i + 1]]])
+            self.rows[i] += bounds[i + 1] - bounds[i]
+
+    def _append(self, index, rows):
+        if self.ftype == 'csv':
+            if index not in self.files:
+                path = shard_path(self.directory, index, self.n_shards, self.ftype)
+                self.files[index] = open(path, 'w', newline='')
+                rows.to_csv(self.files[index], index=False)
+            else:
+                rows.to_csv(self.files[index], index=False, header=False)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(rows, preserve_index=False)
+            if index not in self.files:
+                path = shard_path(self.directory, index, self.n_shards, self.ftype)
+                self.files[index] = pq.ParquetWriter(path, table.schema)
+            self.files[index].write_table(table.cast(self.files[index].schema))
+
+    def close(self):
+        for file in self.files.values():
+            file.close()
+        self.files = {}
@@ -15,7 +15,7 @@ setup(
     packages=find_packages(),
     package_data={'botrecon': ['models/*']},
     include_package_data=True,
-    python_requires='>=3.6',
+    python_requires='>=3.7',
     install_requires=[
         'Click',
         'pandas',
@@ -1,7 +1,12 @@
 from click.testing import CliRunner
 from pathlib import Path
-from botrecon import botrecon
+from botrecon import botrecon, get_data
+from botrecon.cli import parse_size
+from botrecon.predictions import MIN_BATCH_ROWS, estimate_row_memory, load_model
+import numpy as np
+import pandas as pd
 import warnings
+import types
 import re
 
 
@@ -83,3 +88,114 @@ def test_batchify_batches_float():
     ips2 = re.findall(regex, str(result2.stdout_bytes))
 
     assert ips1 == ips2
+
+
+def test_batchify_parallel():
+    args = ['-m', 'svm', '-b', 10, 'batches', path]
+    result_parallel = runner.invoke(botrecon, ['-p', '-j', 2] + args)
+    assert result_parallel.exit_code == 0
+
+    ips_parallel = re.findall(regex, str(result_parallel.stdout_bytes))
+
+    result_normal = runner.invoke(botrecon, ['-m', 'svm', path])
+    ips_normal = re.findall(regex, str(result_normal.stdout_bytes))
+    assert ips_normal == ips_parallel
+
+
+def test_batchify_parallel_njobs():
+    # The random forest supports n_jobs so the batches are not sent to a pool
+    result_parallel = runner.invoke(botrecon, ['-p', '-b', 10, '%', path])
+    assert result_parallel.exit_code == 0
+
+    ips_parallel = re.findall(regex, str(result_parallel.stdout_bytes))
+
+    result_normal = runner.invoke(botrecon, [path])
+    ips_normal = re.findall(regex, str(result_normal.stdout_bytes))
+    assert ips_normal == ips_parallel
+
+
+def test_batchify_rows():
+    result_batchified = runner.invoke(botrecon, ['-b', 700, 'rows', path])
+    assert result_batchified.exit_code == 0
+
+    ips_batchified = re.findall(regex, str(result_batchified.stdout_bytes))
+
+    result_normal = runner.invoke(botrecon, [path])
+    ips_normal = re.findall(regex, str(result_normal.stdout_bytes))
+    assert ips_normal == ips_batchified
+
+
+def test_batchify_memory():
+    result_batchified = runner.invoke(botrecon, ['-b', '64KB', 'memory', path])
+    assert result_batchified.exit_code == 0
+
+    ips_batchified = re.findall(regex, str(result_batchified.stdout_bytes))
+
+    result_normal = runner.invoke(botrecon, [path])
+    ips_normal = re.findall(regex, str(result_normal.stdout_bytes))
+    assert ips_normal == ips_batchified
+
+
+def test_batchify_invalid():
+    assert runner.invoke(botrecon, ['-b', 0, 'rows', path]).exit_code == 2
+    assert runner.invoke(botrecon, ['-b', '1XB', 'memory', path]).exit_code == 2
+    assert runner.invoke(botrecon, ['-b', 10, 'lines', path]).exit_code == 2
+
+
+def test_batches_are_views():
+    data = get_data(path, 'csv')
+    batches = data.batchify(700, 'rows')
+    assert isinstance(batches, types.GeneratorType)
+
+    batches = list(batches)
+    assert [batch.shape[0] for batch in batches] == [700] * 7 + [100]
+    assert pd.concat(batches).equals(data.data)
+    assert np.shares_memory(batches[1]['dur'].to_numpy(), data.data['dur'].to_numpy())
+
+
+def test_batch_bounds_memory():
+    data = get_data(path, 'csv')
+    size = 1000.5 * data.row_size()
+    bounds = data.batch_bounds(size, 'memory')
+    assert bounds[:2] == [(0, 1000), (1000, 2000)]
+    assert data.batch_bounds(1, 'memory')[:2] == [(0, 1), (1, 2)]
+
+
+def test_parse_size():
+    assert parse_size('512') == 512
+    assert parse_size('512MB') == 512 * 2**20
+    assert parse_size('1.5 GiB') == int(1.5 * 2**30)
+    assert parse_size('64k') == 64 * 2**10
+
+
+def test_memory_limit():
+    # A tiny limit makes every batch as small as allowed
+    result_limited = runner.invoke(botrecon, ['-v', '-m', 'svm', '--memory-limit', '1MB', path])
+    assert result_limited.exit_code == 0
+    assert f'batches of {MIN_BATCH_ROWS} rows' in result_limited.output
+    assert 'Peak memory usage' in result_limited.output
+
+    ips_limited = re.findall(regex, str(result_limited.stdout_bytes))
+
+    result_normal = runner.invoke(botrecon, ['-m', 'svm', path])
+    ips_normal = re.findall(regex, str(result_normal.stdout_bytes))
+    assert ips_normal == ips_limited
+
+
+def test_memory_limit_fits():
+    result = runner.invoke(botrecon, ['-v', '--memory-limit', '64GB', path])
+    assert result.exit_code == 0
+    assert 'predicting all rows at once' in result.output
+
+
+def test_memory_limit_invalid():
+    assert runner.invoke(botrecon, ['--memory-limit', 'lots', path]).exit_code == 2
+    assert runner.invoke(botrecon, ['--memory-limit', '0', path]).exit_code == 2
+
+
+def test_estimate_row_memory():
+    # The Nystroem approximation of the svm needs far more memory per row
+    svm = estimate_row_memory(load_model('svm'), 8)
+    rforest = estimate_row_memory(load_model('rforest'), 8)
+    assert svm > 10 * 8 * 8
+    assert svm > rforest
@@ -0,0 +1,118 @@
+from click.testing import CliRunner
+from pathlib import Path
+from botrecon import botrecon
+from botrecon.binary import BinaryCapture, convert
+from botrecon.data import get_data
+import numpy as np
+import pandas as pd
+import re
+
+
+runner = CliRunner()
+path = str(Path('tests', 'data', 'test'))
+regex = r'(?:[0-9]{1,3}\.){3}[0-9]{1,3}'
+
+
+def get_ips(args):
+    result = runner.invoke(botrecon, ['-y'] + args)
+    assert result.exit_code == 0
+    return re.findall(regex, str(result.stdout_bytes))
+
+
+def make_capture(tmp_path, args=(), input_file=path + '.csv'):
+    capture = str(tmp_path / 'capture')
+    result = runner.invoke(convert, [*args, input_file, capture])
+    assert result.exit_code == 0
+    return capture
+
+
+def test_binary(tmp_path):
+    capture = make_capture(tmp_path)
+    assert get_ips([path + '.csv']) == get_ips(['-t', 'npy', capture])
+
+
+def test_binary_same_scores(tmp_path):
+    capture = make_capture(tmp_path)
+    runner.invoke(botrecon, ['-y', path + '.csv', str(tmp_path / 'normal.csv')])
+    runner.invoke(botrecon, ['-y', '-t', 'npy', capture, str(tmp_path / 'binary.csv')])
+
+    normal = pd.read_csv(tmp_path / 'normal.csv')
+    binary = pd.read_csv(tmp_path / 'binary.csv')
+    assert binary.equals(normal)
+
+
+def test_binary_options(tmp_path):
+    capture = make_capture(tmp_path)
+    for args in [['-m', 'svm'], ['-c', 5], ['--dedup'], ['-b', 3, 'batches'],
+                 ['--stream-chunk-rows', 333]]:
+        assert get_ips(args + [path + '.csv']) == get_ips(args + ['-t', 'npy', capture])
+
+
+def test_binary_chunked(tmp_path):
+    capture = make_capture(tmp_path, ['--chunk-rows', 333])
+    ips_streamed = get_ips(['--stream-chunk-rows', 333, path + '.csv'])
+    assert sorted(ips_streamed) == sorted(get_ips(['-t', 'npy', capture]))
+
+
+def test_binary_parquet(tmp_path):
+    capture = make_capture(tmp_path, ['-t', 'parquet'], path + '.parquet')
+    assert get_ips([path + '.csv']) == get_ips(['-t', 'npy', capture])
+
+
+def test_binary_inputs(tmp_path):
+    capture = make_capture(tmp_path)
+    ips_single = get_ips(['-t', 'npy', capture])
+    ips_both = get_ips(['-t', 'npy', '-a', capture, capture])
+    assert sorted(ips_single) == sorted(ips_both)
+
+
+def test_binary_custom_model(tmp_path):
+    capture = make_capture(tmp_path)
+    model = str(Path('botrecon', 'models', 'rforest.pkl'))
+    result = runner.invoke(botrecon, ['-M', model, '-t', 'npy', capture])
+    assert result.exit_code == 2
+
+
+def test_binary_capture(tmp_path):
+    capture = BinaryCapture(make_capture(tmp_path))
+    data = get_data(path + '.csv', 'csv')
+    assert capture.rows == data.data.shape[0]
+    assert isinstance(capture.host_codes, np.memmap)
+
+    chunks = list(capture.chunks(2000))
+    assert [chunk.data.shape[0] for chunk in chunks] == [2000, 2000, 1000]
+    assert chunks[1].data.index[0] == 2000
+    hosts = pd.concat([chunk.hosts for chunk in chunks])
+    assert hosts['srcaddr'].equals(data.hosts['srcaddr'])
+
+    frame = capture.frame()
+    for column in ['dur', 'totbytes', 'srcbytes', 'bps']:
+        assert np.array_equal(frame[column], data.data[column])
+    for column in ['dport', 'sport']:
+        assert frame[column].astype(str).equals(data.data[column].astype(str))
+
+
+def test_binary_unsupported_chunks(tmp_path):
+    result = runner.invoke(convert, ['-t', 'json', '--chunk-rows', 10,
+                                     path + '.json', str(tmp_path / 'capture')])
+    assert result.exit_code == 2
+
+
+def test_binary_failed_conversion(tmp_path):
+    data = pd.read_csv(path + '.csv', index_col=0)
+    data['Dur'] = data['Dur'].astype(object)
+    data.loc[2500, 'Dur'] = 'bad'
+    data.to_csv(tmp_path / 'bad.csv')
+
+    capture = tmp_path / 'capture'
+    result = runner.invoke(convert, ['--chunk-rows', 1000, str(tmp_path / 'bad.csv'),
+                                     str(capture)])
+    assert result.exit_code == 2
+    assert not capture.exists()
+
+    capture.mkdir()
+    (capture / 'notes.txt').write_text('kept')
+    result = runner.invoke(convert, ['--chunk-rows', 1000, str(tmp_path / 'bad.csv'),
+                                     str(capture)])
+    assert result.exit_code == 2
+    assert [file.name for file in capture.iterdir()] == ['notes.txt']
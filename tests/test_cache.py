@@ -0,0 +1,168 @@
+from click.testing import CliRunner
+from pathlib import Path
+from botrecon import botrecon
+from botrecon.cache import ScoreCache, DataCache
+from botrecon.data import Data
+import pandas as pd
+import re
+
+
+runner = CliRunner()
+path = str(Path('tests', 'data', 'test.csv'))
+regex = r'(?:[0-9]{1,3}\.){3}[0-9]{1,3}'
+
+
+def test_score_cache(tmp_path):
+    args = ['-v', '--score-cache', str(tmp_path), path]
+    result_cold = runner.invoke(botrecon, args)
+    assert result_cold.exit_code == 0
+    assert 'Score cache: 0 of 5000 rows found' in result_cold.output
+
+    result_warm = runner.invoke(botrecon, args)
+    assert result_warm.exit_code == 0
+    assert 'Score cache: 5000 of 5000 rows found' in result_warm.output
+
+    result_normal = runner.invoke(botrecon, [path])
+    ips_normal = re.findall(regex, str(result_normal.stdout_bytes))
+    assert ips_normal == re.findall(regex, str(result_cold.stdout_bytes))
+    assert ips_normal == re.findall(regex, str(result_warm.stdout_bytes))
+
+
+def test_score_cache_same_scores(tmp_path):
+    cache = str(tmp_path / 'cache')
+    runner.invoke(botrecon, ['--score-cache', cache, path])
+    runner.invoke(botrecon, ['-y', '--score-cache', cache, path,
+                             str(tmp_path / 'cached.csv')])
+    runner.invoke(botrecon, ['-y', path, str(tmp_path / 'normal.csv')])
+
+    cached = pd.read_csv(tmp_path / 'cached.csv')
+    normal = pd.read_csv(tmp_path / 'normal.csv')
+    assert cached.equals(normal)
+
+
+def test_score_cache_per_model(tmp_path):
+    args = ['-v', '--score-cache', str(tmp_path), path]
+    runner.invoke(botrecon, args)
+
+    result = runner.invoke(botrecon, ['-m', 'svm', *args])
+    assert result.exit_code == 0
+    assert 'Score cache: 0 of 5000 rows found' in result.output
+
+
+def test_score_cache_parallel_batches(tmp_path):
+    args = ['-m', 'svm', '-b', 10, 'batches', '-p', '-j', 2,
+            '--score-cache', str(tmp_path), path]
+    result_cold = runner.invoke(botrecon, args)
+    result_warm = runner.invoke(botrecon, args)
+    assert result_cold.exit_code == 0
+    assert result_warm.exit_code == 0
+
+    result_normal = runner.invoke(botrecon, ['-m', 'svm', path])
+    ips_normal = re.findall(regex, str(result_normal.stdout_bytes))
+    assert ips_normal == re.findall(regex, str(result_cold.stdout_bytes))
+    assert ips_normal == re.findall(regex, str(result_warm.stdout_bytes))
+
+
+def test_score_cache_eviction(tmp_path):
+    model = tmp_path / 'model.bin'
+    model.write_bytes(b'model')
+    data = pd.DataFrame({'proto': ['tcp', 'udp', 'tcp'], 'dur': [1., 2., 3.]})
+
+    with ScoreCache(tmp_path, model, max_rows=2) as cache:
+        keys, scores, missing = cache.lookup(data)
+        assert missing.all()
+        cache.store(keys[:1], [.1])
+        cache.store(keys[1:], [.2, .3])
+        assert len(cache) == 3
+
+    with ScoreCache(tmp_path, model, max_rows=2) as cache:
+        # The first row was stored first, so it was evicted
+        keys, scores, missing = cache.lookup(data)
+        assert missing.tolist() == [True, False, False]
+        assert scores[1:].tolist() == [.2, .3]
+
+
+def test_model_fingerprint(tmp_path):
+    model = tmp_path / 'model.bin'
+    model.write_bytes(b'model')
+    with ScoreCache(tmp_path, model) as cache:
+        fingerprint = cache.fingerprint
+
+    model.write_bytes(b'changed model')
+    with ScoreCache(tmp_path, model) as cache:
+        assert cache.fingerprint != fingerprint
+
+
+def test_data_cache(tmp_path):
+    args = ['-v', '--data-cache', str(tmp_path), path]
+    result_cold = runner.invoke(botrecon, args)
+    assert result_cold.exit_code == 0
+    assert 'from the data cache' not in result_cold.output
+
+    result_warm = runner.invoke(botrecon, args)
+    assert result_warm.exit_code == 0
+    assert 'from the data cache' in result_warm.output
+
+    result_normal = runner.invoke(botrecon, [path])
+    ips_normal = re.findall(regex, str(result_normal.stdout_bytes))
+    assert ips_normal == re.findall(regex, str(result_cold.stdout_bytes))
+    assert ips_normal == re.findall(regex, str(result_warm.stdout_bytes))
+
+
+def test_data_cache_options(tmp_path):
+    cache = str(tmp_path / 'cache')
+    runner.invoke(botrecon, ['--data-cache', cache, path])
+    for args in [['-m', 'svm', '-c', '2'], ['-r', '147.32.84.0/24', '-u']]:
+        runner.invoke(botrecon, ['-y', '--data-cache', cache, *args, path,
+                                 str(tmp_path / 'cached.csv')])
+        runner.invoke(botrecon, ['-y', *args, path, str(tmp_path / 'normal.csv')])
+
+        cached = pd.read_csv(tmp_path / 'cached.csv')
+        normal = pd.read_csv(tmp_path / 'normal.csv')
+        assert cached.equals(normal)
+
+
+def test_data_cache_prepared(tmp_path):
+    data = Data(path, 'csv', required_only=True).prepare()
+    with DataCache(tmp_path) as cache:
+        key = cache.key(path, 'csv')
+        assert cache.load(key, path, 'csv') is None
+        cache.store(key, data)
+        cached = cache.load(key, path, 'csv')
+
+    assert cached.data.equals(data.data)
+    assert (cached.data.dtypes == data.data.dtypes).all()
+    assert (cached.host_codes == data.host_codes).all()
+    assert (cached.host_uniques == data.host_uniques).all()
+    assert cached.hosts.equals(data.hosts)
+
+
+def test_data_cache_key(tmp_path):
+    copy = tmp_path / 'copy.csv'
+    copy.write_bytes(Path(path).read_bytes())
+    with DataCache(tmp_path / 'cache') as cache:
+        key = cache.key(path, 'csv')
+        assert cache.key(copy, 'csv') == key
+        assert cache.key(path, 'csv', no_transforms=True) != key
+
+        with open(copy, 'a') as f:
+            f.write('5000,1313431402.1,0.1,132,72,udp,1.0,53.0,CON,1.1.1.1,2.2.2.2\n')
+        assert cache.key(copy, 'csv') != key
+
+
+def test_data_cache_eviction(tmp_path):
+    data = Data(path, 'csv', required_only=True).prepare()
+    with DataCache(tmp_path, max_bytes=1) as cache:
+        cache.store('first', data)
+        assert len(cache) == 0
+        assert list(tmp_path.glob('*.feather')) == []
+
+    with DataCache(tmp_path) as cache:
+        cache.store('first', data)
+        cache.store('second', data)
+        size = sum(p.stat().st_size for p in tmp_path.glob('first*.feather'))
+        cache.load('first', path, 'csv')
+        cache.max_bytes = size
+        assert cache.evict() == 1
+        assert cache.load('first', path, 'csv') is not None
+        assert cache.load('second', path, 'csv') is None
@@ -0,0 +1,65 @@
+from click.testing import CliRunner
+from pathlib import Path
+from botrecon import botrecon
+from botrecon.predictions import find_duplicates
+import numpy as np
+import pandas as pd
+import re
+
+
+runner = CliRunner()
+path = str(Path('tests', 'data', 'test.csv'))
+regex = r'(?:[0-9]{1,3}\.){3}[0-9]{1,3}'
+
+
+def compare_dedup(*args):
+    result_dedup = runner.invoke(botrecon, ['--dedup', *args, path])
+    assert result_dedup.exit_code == 0
+    ips_dedup = re.findall(regex, str(result_dedup.stdout_bytes))
+
+    result_normal = runner.invoke(botrecon, [*args, path])
+    ips_normal = re.findall(regex, str(result_normal.stdout_bytes))
+    assert ips_normal == ips_dedup
+
+
+def test_dedup():
+    compare_dedup()
+
+
+def test_dedup_svm():
+    compare_dedup('-m', 'svm')
+
+
+def test_dedup_batchified():
+    compare_dedup('-b', 10, 'batches')
+
+
+def test_dedup_streamed():
+    compare_dedup('--stream-chunk-rows', 1000)
+
+
+def test_dedup_same_scores(tmp_path):
+    runner.invoke(botrecon, ['-y', '-u', path, str(tmp_path / 'dedup.csv')])
+    runner.invoke(botrecon, ['-y', path, str(tmp_path / 'normal.csv')])
+
+    dedup = pd.read_csv(tmp_path / 'dedup.csv')
+    normal = pd.read_csv(tmp_path / 'normal.csv')
+    assert dedup.equals(normal)
+
+
+def test_dedup_ratio():
+    result = runner.invoke(botrecon, ['-v', '--dedup', path])
+    assert result.exit_code == 0
+    assert re.search(r'Deduplicated \d+ rows to \d+ unique', result.output)
+
+
+def test_find_duplicates():
+    data = pd.DataFrame({
+        'proto': ['tcp', 'udp', 'tcp', 'tcp', None, None],
+        'dur': [1., 2., 1., 1., np.nan, np.nan],
+        'dport': ['80', '53', '80', '443', '80', '80']
+    })
+    first, inverse = find_duplicates(data)
+    assert first.tolist() == [0, 1, 3, 4]
+    assert inverse.tolist() == [0, 1, 0, 2, 3, 3]
+    assert data.iloc[first].iloc[inverse].reset_index(drop=True).equals(data)
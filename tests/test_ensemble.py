@@ -0,0 +1,81 @@
+from click.testing import CliRunner
+from pathlib import Path
+from botrecon import botrecon, HostAggregate
+from botrecon.ensemble import ensemble_table
+import numpy as np
+import pandas as pd
+
+
+runner = CliRunner()
+path = str(Path('tests', 'data', 'test.csv'))
+
+
+def get_table(tmp_path, args, name='hosts.csv'):
+    result = runner.invoke(botrecon, ['-y', *args, path, str(tmp_path / name)])
+    assert result.exit_code == 0
+    return pd.read_csv(tmp_path / name, index_col=0)
+
+
+def test_ensemble(tmp_path):
+    table = get_table(tmp_path, ['-m', 'rforest', '-m', 'svm'])
+    assert list(table.columns) == ['Host', 'rforest Score', 'svm Score', 'Votes',
+                                   'Flow Count']
+
+    for model in ['rforest', 'svm']:
+        single = get_table(tmp_path, ['-m', model], f'{model}.csv')
+        scores = table.set_index('Host').loc[single['Host'], f'{model} Score']
+        assert (scores.to_numpy() == single['Mean Score'].to_numpy()).all()
+
+
+def test_ensemble_rules(tmp_path):
+    models = ['-m', 'rforest', '-m', 'svm', '-m', 'rforest-experimental']
+    tables = {rule: get_table(tmp_path, [*models, '--ensemble', rule], f'{rule}.csv')
+              for rule in ['any', 'majority', 'all']}
+    assert tables['any']['Votes'].min() >= 1
+    assert tables['majority']['Votes'].min() >= 2
+    assert (tables['all']['Votes'] == 3).all()
+    assert set(tables['all']['Host']) <= set(tables['majority']['Host']) <= \
+        set(tables['any']['Host'])
+
+    singles = set()
+    for model in ['rforest', 'svm', 'rforest-experimental']:
+        singles |= set(get_table(tmp_path, ['-m', model], f'{model}.csv')['Host'])
+    assert singles == set(tables['any']['Host'])
+
+
+def test_ensemble_streamed(tmp_path):
+    args = ['-m', 'rforest', '-m', 'svm', '-c', 2]
+    table = get_table(tmp_path, args)
+    streamed = get_table(tmp_path, [*args, '--stream-chunk-rows', 777], 'streamed.csv')
+    assert sorted(table['Host']) == sorted(streamed['Host'])
+    assert (table['Flow Count'] > 2).all()
+
+
+def test_ensemble_single_model(tmp_path):
+    table = get_table(tmp_path, ['-m', 'svm', '-m', 'svm'])
+    assert list(table.columns) == ['Host', 'Mean Score', 'Flow Count']
+
+
+def test_ensemble_options(tmp_path):
+    for args in [['-b', 3, 'batches'], ['--memory-limit', '4GB'],
+                 ['--flow-scores', str(tmp_path / 'scores.csv')]]:
+        result = runner.invoke(botrecon, ['-m', 'rforest', '-m', 'svm', *args, path])
+        assert result.exit_code == 2
+
+
+def test_ensemble_table():
+    aggregates = []
+    for sums in [[.9, .2, 1.2], [-1., 1., 2.]]:
+        aggregate = HostAggregate()
+        aggregate.add(['a', 'b', 'c'], np.array(sums), np.array([1, 1, 2]))
+        aggregates.append(aggregate)
+
+    table = ensemble_table(aggregates, [.5, 0], ['first', 'second'])
+    assert table['host'].tolist() == ['c', 'a', 'b']
+    assert table['votes'].tolist() == [2, 1, 1]
+    assert table['second'].tolist() == [1., -1., 1.]
+
+    table = ensemble_table(aggregates, [.5, 0], ['first', 'second'], 'all')
+    assert table['host'].tolist() == ['c']
+    table = ensemble_table(aggregates, [.5, 0], ['first', 'second'], 'any', 1)
+    assert table['host'].tolist() == ['c']
@@ -1,8 +1,12 @@
 from click.testing import CliRunner
 from pathlib import Path
 import re
-from botrecon import botrecon
+from botrecon import botrecon, Data, IPEntity, IPRangeIndex
+from botrecon.predictions import filter_hosts
+import click
+import pandas as pd
 import warnings
+import pytest
 
 
 runner = CliRunner()
@@ -132,3 +136,87 @@ def test_filter_from_files(tmp_path):
 
     matches = re.findall(regex, out)
     assert len(matches) == 4 + 2 + 2
+
+
+def test_filter_invalid(tmp_path):
+    data = Path(path).read_text() + \
+        '887,1313600180.4,0.0,62,62,tcp,4266.0,25.0,S_,not-an-address\n'
+    tmp_path = tmp_path / 'invalid.csv'
+    tmp_path.write_text(data)
+
+    result = runner.invoke(botrecon, ['--ip', '147.32.84.0/24', str(tmp_path)])
+    assert result.exit_code == 2
+
+    args = ['-i', '--ip', '147.32.84.0/24', str(tmp_path)]
+    result = runner.invoke(botrecon, args)
+    assert result.exit_code == 0
+    assert len(re.findall(regex, str(result.stdout_bytes))) == 4
+
+
+def test_range_index():
+    ranges = ['10.0.0.0/24', '10.0.1.0/24', '10.0.0.7', '192.168.0.1',
+              '2001:db8::/32', '::1']
+    index = IPRangeIndex([IPEntity(r) for r in ranges])
+    # The two adjacent /24 networks get merged, the single address inside too
+    assert len(index) == 4
+
+    addresses = ['10.0.0.0', '10.0.1.255', '10.0.2.0', '192.168.0.1',
+                 '192.168.0.2', '2001:db8::1', '2001:db9::', '::1', '::2']
+    matches = index.contains(addresses)
+    assert list(matches) == [True, True, False, True,
+                             False, True, False, True, False]
+
+
+def test_range_index_versions():
+    index = IPRangeIndex([IPEntity('0.0.0.0/0')])
+    assert list(index.contains(['1.2.3.4', '::1'])) == [True, False]
+
+
+def test_range_index_invalid():
+    index = IPRangeIndex([IPEntity('10.0.0.0/8')])
+    with pytest.raises(ValueError):
+        index.contains(['10.0.0.1', 'invalid'])
+    matches = index.contains(['10.0.0.1', 'invalid'], ignore_invalid=True)
+    assert list(matches) == [True, False]
+
+
+def test_filter_invalid_below_min_count(tmp_path):
+    text = Path(path).read_text()
+    data = text + text.split('\n', 1)[1] + \
+        '887,1313600180.4,0.0,62,62,tcp,4266.0,25.0,S_,not-an-address\n'
+    tmp_path = tmp_path / 'invalid.csv'
+    tmp_path.write_text(data)
+
+    # The invalid address only has one flow, so it is removed before parsing
+    result = runner.invoke(botrecon, ['-c', 1, '--ip', '147.32.84.0/24', str(tmp_path)])
+    assert result.exit_code == 0
+    assert len(re.findall(regex, str(result.stdout_bytes))) == 4
+
+
+def test_filter_hosts_codes():
+    hosts = ['10.0.0.1', '10.0.0.2', None, '192.168.0.1', '10.0.0.1', None,
+             '192.168.0.1', '10.0.0.1']
+    frame = pd.DataFrame({'srcaddr': hosts, 'x': range(len(hosts))})
+    command = click.Command('test')
+    with click.Context(command) as ctx:
+        ctx.params.update(range=(IPEntity('10.0.0.0/8'),), ignore_invalid=True)
+        data = filter_hosts(Data('test.csv', 'csv', frame).find_hosts(), 1)
+
+    assert data.data['x'].tolist() == [0, 4, 7]
+    assert data.host_uniques[data.host_codes].tolist() == ['10.0.0.1'] * 3
+    assert data.hosts['srcaddr'].tolist() == ['10.0.0.1'] * 3
+
+
+def test_range_index_built_once(monkeypatch):
+    built = []
+    init = IPRangeIndex.__init__
+
+    def count_init(self, entities):
+        built.append(len(entities))
+        init(self, entities)
+
+    monkeypatch.setattr(IPRangeIndex, '__init__', count_init)
+    args = make_args(['147.32.84.0/24', '10.0.0.0/16'], path)
+    result = runner.invoke(botrecon, ['--stream-chunk-rows', 3] + args)
+    assert result.exit_code == 0
+    assert built == [2]
@@ -0,0 +1,108 @@
+from click.testing import CliRunner
+from pathlib import Path
+from threading import Thread
+from botrecon import botrecon
+from botrecon import predictions
+from botrecon.follow import CaptureTail
+import pandas as pd
+import time
+import re
+
+
+runner = CliRunner()
+path = str(Path('tests', 'data', 'test.csv'))
+regex = r'(?:[0-9]{1,3}\.){3}[0-9]{1,3}'
+
+
+def get_ips(args):
+    result = runner.invoke(botrecon, ['-y'] + args)
+    assert result.exit_code == 0
+    return re.findall(regex, str(result.stdout_bytes))
+
+
+def follow_args(path):
+    return ['-s', '-f', '--follow-interval', 0.05, '--follow-timeout', 0.5, path]
+
+
+def test_follow_existing(tmp_path):
+    output = tmp_path / 'out.csv'
+    get_ips(follow_args(path) + [str(output)])
+
+    ips_followed = re.findall(regex, output.read_text())
+    assert ips_followed == get_ips([path])
+
+
+def test_follow_appended(tmp_path):
+    lines = Path(path).read_text().splitlines(keepends=True)
+    capture = tmp_path / 'capture.csv'
+    capture.write_text(lines[0])
+
+    def append():
+        with capture.open('a') as f:
+            for i in range(1, len(lines), 1000):
+                time.sleep(0.1)
+                block = ''.join(lines[i:i + 1000])
+                # Write the last line in two parts to test partial lines
+                f.write(block[:-10])
+                f.flush()
+                time.sleep(0.1)
+                f.write(block[-10:])
+                f.flush()
+
+    writer = Thread(target=append)
+    writer.start()
+    output = tmp_path / 'out.csv'
+    get_ips(follow_args(str(capture)) + [str(output)])
+    writer.join()
+
+    ips_followed = re.findall(regex, output.read_text())
+    assert ips_followed == get_ips([path])
+
+
+def test_follow_integer_ports(tmp_path, monkeypatch):
+    # Small blocks without missing ports read them as integers
+    data = pd.read_csv(path, index_col=0).astype({'Sport': 'Int64', 'Dport': 'Int64'})
+    capture = tmp_path / 'capture.csv'
+    data.to_csv(capture)
+    monkeypatch.setattr(CaptureTail.__init__, '__defaults__', (2048,))
+
+    tables = []
+    for name, args in [('followed.csv', follow_args(str(capture))),
+                       ('batch.csv', [str(capture)])]:
+        get_ips(args + [str(tmp_path / name)])
+        tables.append(pd.read_csv(tmp_path / name, index_col=0))
+
+    assert tables[1].shape[0] > 0
+    assert tables[0]['Host'].equals(tables[1]['Host'])
+    assert (tables[0]['Mean Score'] - tables[1]['Mean Score']).abs().max() < 1e-12
+
+
+def test_follow_status_changes(tmp_path):
+    args = ['-f', '--follow-interval', 0.05, '--follow-timeout', 0.2, path]
+    result = runner.invoke(botrecon, ['-y'] + args)
+    assert result.exit_code == 0
+    assert ' infected, mean score ' in result.output
+
+
+def test_follow_unsupported():
+    result = runner.invoke(botrecon, ['-f', '-t', 'json', path])
+    assert result.exit_code == 2
+
+    result = runner.invoke(botrecon, ['-f', '-b', 10, '%', path])
+    assert result.exit_code == 2
+
+
+def test_follow_memory_limit(tmp_path, monkeypatch):
+    plans = []
+    plan_batches = predictions.plan_batches
+
+    def record_plan(data, *args, **kwargs):
+        plans.append(data.data.shape[0])
+        return plan_batches(data, *args, **kwargs)
+
+    monkeypatch.setattr(predictions, 'plan_batches', record_plan)
+    output = tmp_path / 'out.csv'
+    get_ips(['--memory-limit', '1MB'] + follow_args(path) + [str(output)])
+
+    assert sum(plans) == 5000
+    assert re.findall(regex, output.read_text()) == get_ips([path])
@@ -0,0 +1,104 @@
+from click.testing import CliRunner
+from pathlib import Path
+from botrecon import botrecon
+from botrecon.inputs import find_inputs
+import numpy as np
+import pandas as pd
+import pytest
+import re
+
+
+runner = CliRunner()
+path = str(Path('tests', 'data', 'test.csv'))
+regex = r'(?:[0-9]{1,3}\.){3}[0-9]{1,3}'
+
+
+@pytest.fixture
+def parts(tmp_path):
+    data = pd.read_csv(path)
+    for i, part in enumerate(np.array_split(data, 3)):
+        part.to_csv(tmp_path / f'part{i}.csv', index=False)
+    return tmp_path
+
+
+def compare_inputs(inputs, *args):
+    result_parts = runner.invoke(botrecon, [*args, *inputs])
+    assert result_parts.exit_code == 0
+    ips_parts = re.findall(regex, str(result_parts.stdout_bytes))
+
+    result_single = runner.invoke(botrecon, [*args, path])
+    ips_single = re.findall(regex, str(result_single.stdout_bytes))
+    assert ips_single == ips_parts
+
+
+def test_directory(parts):
+    compare_inputs([str(parts)])
+
+
+def test_glob(parts):
+    compare_inputs([str(parts / 'part*.csv')])
+
+
+def test_add_input(parts):
+    compare_inputs(['-a', str(parts / 'part1.csv'), '-a', str(parts / 'part2.csv'),
+                    str(parts / 'part0.csv')])
+
+
+def test_sequential(parts):
+    compare_inputs([str(parts)], '-j', 1)
+
+
+def test_options(parts):
+    compare_inputs([str(parts)], '-m', 'svm', '-c', 5, '-r', '147.32.84.0/24')
+    compare_inputs([str(parts)], '--stream-chunk-rows', 1000)
+    compare_inputs([str(parts)], '-u', '-b', 3, 'batches')
+
+
+def test_same_scores(parts, tmp_path):
+    runner.invoke(botrecon, ['-y', str(parts), str(tmp_path / 'parts.out')])
+    runner.invoke(botrecon, ['-y', path, str(tmp_path / 'single.out')])
+
+    result_parts = pd.read_csv(tmp_path / 'parts.out')
+    result_single = pd.read_csv(tmp_path / 'single.out')
+    assert result_parts['Host'].equals(result_single['Host'])
+    assert np.allclose(result_parts['Mean Score'], result_single['Mean Score'])
+    assert result_parts['Flow Count'].equals(result_single['Flow Count'])
+
+
+def test_missing_input(tmp_path):
+    result = runner.invoke(botrecon, [str(tmp_path / 'missing*.csv')])
+    assert result.exit_code != 0
+    assert 'No input files found' in result.output
+
+
+def test_find_inputs(parts):
+    (parts / '.hidden.csv').touch()
+    files = [str(parts / f'part{i}.csv') for i in range(3)]
+    assert find_inputs([parts]) == files
+    assert find_inputs([parts / '*.csv']) == files
+    assert find_inputs([files[2], files[0]]) == [files[2], files[0]]
+    with pytest.raises(FileNotFoundError):
+        find_inputs([parts / 'missing'])
+
+
+def test_directory_integer_ports(tmp_path):
+    # Small files without missing ports read them as integers, unlike the
+    # concatenated file
+    data = pd.read_csv(path, index_col=0).astype({'Sport': 'Int64', 'Dport': 'Int64'})
+    data.to_csv(tmp_path / 'concatenated.csv')
+    inputs = tmp_path / 'inputs'
+    inputs.mkdir()
+    for i, start in enumerate(range(0, data.shape[0], 25)):
+        data.iloc[start:start + 25].to_csv(inputs / f'part{i:03d}.csv')
+
+    tables = []
+    for name, source in [('single.csv', tmp_path / 'concatenated.csv'),
+                         ('parts.csv', inputs)]:
+        result = runner.invoke(botrecon, ['-y', '-j', 1, str(source), str(tmp_path / name)])
+        assert result.exit_code == 0
+        tables.append(pd.read_csv(tmp_path / name, index_col=0))
+
+    assert tables[0].shape[0] > 0
+    assert tables[1]['Host'].equals(tables[0]['Host'])
+    assert (tables[1]['Mean Score'] - tables[0]['Mean Score']).abs().max() < 1e-12
+    assert tables[1]['Flow Count'].equals(tables[0]['Flow Count'])
@@ -0,0 +1,137 @@
+from click.testing import CliRunner
+from pathlib import Path
+from botrecon import botrecon, add_hook, remove_hook
+from botrecon import metrics
+import json
+import pandas as pd
+import pstats
+import re
+import threading
+
+
+runner = CliRunner()
+path = str(Path('tests', 'data', 'test.csv'))
+STAGES = ['load', 'prepare', 'load_model', 'filter', 'predict', 'evaluate', 'output']
+
+
+def test_metrics_json(tmp_path):
+    metrics = tmp_path / 'metrics.json'
+    result = runner.invoke(botrecon, ['-s', '--metrics-json', str(metrics), path])
+    assert result.exit_code == 0
+
+    document = json.loads(metrics.read_text())
+    stages = {stage['name']: stage for stage in document['stages']}
+    assert list(stages) == STAGES
+    assert stages['load']['rows_out'] == 5000
+    assert stages['predict']['rows_in'] == stages['predict']['rows_out'] == 5000
+    assert stages['evaluate']['rows_out'] == stages['output']['rows_in']
+    for stage in stages.values():
+        assert stage['calls'] == 1
+        assert stage['wall_seconds'] >= 0 and stage['cpu_seconds'] >= 0
+        assert stage['peak_rss_mib'] > 0
+
+
+def test_metrics_streamed():
+    # The metrics go to the standard error, next to any warnings
+    result = CliRunner(mix_stderr=False).invoke(
+        botrecon, ['-y', '--metrics-json', '-', '--stream-chunk-rows', 1000, path]
+    )
+    assert result.exit_code == 0
+    assert 'Host' in result.stdout and '"stages"' not in result.stdout
+
+    start = re.search(r'^\{$', result.stderr, re.MULTILINE).start()
+    document = json.JSONDecoder().raw_decode(result.stderr[start:])[0]
+    stages = {stage['name']: stage for stage in document['stages']}
+    assert stages['predict']['calls'] == 5
+    assert stages['predict']['rows_in'] == 5000
+    assert stages['evaluate']['calls'] == 1
+
+
+def test_profile(tmp_path):
+    result = runner.invoke(botrecon, ['-s', '--profile', str(tmp_path), path])
+    assert result.exit_code == 0
+
+    profiles = sorted(tmp_path.iterdir())
+    assert [p.name for p in profiles] == [
+        f'{i:03d}-{stage}.prof' for i, stage in enumerate(STAGES, 1)
+    ]
+    pstats.Stats(str(profiles[0]))
+
+
+def test_profile_memory(tmp_path):
+    metrics = tmp_path / 'metrics.json'
+    result = runner.invoke(botrecon, ['-s', '--profile', str(tmp_path / 'profiles'),
+                                      '--profile-memory', '--metrics-json',
+                                      str(metrics), path])
+    assert result.exit_code == 0
+
+    assert len(list((tmp_path / 'profiles').glob('*.tracemalloc'))) == len(STAGES)
+    for stage in json.loads(metrics.read_text())['stages']:
+        assert stage['traced_peak_mib'] >= 0
+
+
+def test_profile_memory_needs_dir():
+    result = runner.invoke(botrecon, ['--profile-memory', path])
+    assert result.exit_code != 0
+    assert '--profile' in result.output
+
+
+def test_hooks():
+    stages = []
+    add_hook(stages.append)
+    try:
+        result = runner.invoke(botrecon, ['-s', path])
+    finally:
+        remove_hook(stages.append)
+    assert result.exit_code == 0
+    assert [stage.name for stage in stages] == STAGES
+    assert stages[1].rows_in == 5000
+
+
+def test_failed_stage(tmp_path):
+    data = pd.read_csv(path, index_col=0)
+    data['Dur'] = data['Dur'].astype(object)
+    data.loc[2500, 'Dur'] = 'bad'
+    data.to_csv(tmp_path / 'bad.csv')
+
+    stages = []
+    add_hook(stages.append)
+    try:
+        result = runner.invoke(botrecon, ['-s', '--profile', str(tmp_path / 'profiles'),
+                                          str(tmp_path / 'bad.csv')])
+    finally:
+        remove_hook(stages.append)
+    assert result.exit_code != 0
+    assert [stage.name for stage in stages] == ['load']
+    assert stages[0].wall_seconds >= 0 and stages[0].rows_out is None
+    assert [p.name for p in (tmp_path / 'profiles').iterdir()] == ['001-load.prof']
+
+
+def test_concurrent_stages(monkeypatch):
+    resets = []
+    monkeypatch.setattr(metrics, 'reset_peak_rss', lambda: resets.append(1))
+    stages = []
+    add_hook(stages.append)
+    inner_started, outer_done = threading.Event(), threading.Event()
+
+    def inner():
+        with metrics.stage('inner'):
+            inner_started.set()
+            outer_done.wait(5)
+
+    try:
+        with metrics.stage('outer'):
+            thread = threading.Thread(target=inner)
+            thread.start()
+            inner_started.wait(5)
+        outer_done.set()
+        thread.join()
+        with metrics.stage('after'):
+            pass
+    finally:
+        remove_hook(stages.append)
+
+    # Only stages starting while no other one runs reset the peak
+    assert [stage.name for stage in stages] == ['outer', 'inner', 'after']
+    assert len(resets) == 2
+    assert metrics.ACTIVE_STAGES == 0
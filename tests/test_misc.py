@@ -1,6 +1,9 @@
 from click.testing import CliRunner
 from pathlib import Path
-from botrecon import botrecon
+from botrecon import botrecon, Data, __version__
+from botrecon.cli import FILETYPES
+import subprocess
+import sys
 import re
 
 
@@ -54,3 +57,24 @@ def test_jobs_zero():
 #     assert model_path.exists(), 'if failed the model is not available'
 #     result_custom = runner.invoke(botrecon, ['-M', str(model_path), path])
 #     assert result.exit_code == 0
+
+
+def test_filetypes():
+    assert FILETYPES == list(Data.READERS.keys()) + ['npy']
+
+
+def test_lazy_imports():
+    # --help and --version should not have to import the scientific stack
+    code = ('import sys, botrecon.cli; '
+            'sys.exit(any(m in sys.modules for m in ["pandas", "numpy"]))')
+    assert subprocess.run([sys.executable, '-c', code]).returncode == 0
+
+    # Neither should validating the arguments, including the input paths
+    code = ('import sys; from botrecon.cli import botrecon; '
+            'botrecon.make_context("botrecon", ["tests/data", "-a", "tests/data/test.csv"]); '
+            'sys.exit(any(m in sys.modules for m in ["pandas", "numpy"]))')
+    assert subprocess.run([sys.executable, '-c', code]).returncode == 0
+
+    result = subprocess.run([sys.executable, '-m', 'botrecon', '--version'],
+                            stdout=subprocess.PIPE, text=True)
+    assert __version__ in result.stdout
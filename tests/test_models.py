@@ -1,6 +1,11 @@
 from click.testing import CliRunner
 from pathlib import Path
-from botrecon import botrecon
+from botrecon import botrecon, get_data
+from botrecon.predictions import load_model, dump_model, get_model_path, model_cache_path
+from botrecon.predictions import make_predictions
+from botrecon.forest import CompiledForest, compile_model
+import numpy as np
+import pytest
 
 
 runner = CliRunner()
@@ -20,3 +25,105 @@ def test_jobs_rforest():
 def test_jobs_rfexperimental():
     result = runner.invoke(botrecon, ['-m', 'rforest-experimental', path])
     assert result.exit_code == 0
+
+
+def test_joblib_model(tmp_path):
+    model = load_model('rforest')
+    dump_model(model, tmp_path / 'rforest.joblib')
+    mapped = load_model(tmp_path / 'rforest.joblib')
+
+    data = get_data(path, 'csv')
+    assert (model.predict_proba(data.data) == mapped.predict_proba(data.data)).all()
+
+
+def test_model_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv('BOTRECON_MODEL_CACHE', str(tmp_path))
+    data = get_data(path, 'csv')
+    loaded = load_model('rforest')
+    cached = model_cache_path(get_model_path('rforest'))
+    assert list(tmp_path.iterdir()) == [cached]
+
+    stale = tmp_path / 'rforest.0.0.sklearn-0.joblib'
+    stale.write_bytes(cached.read_bytes())
+    mapped = load_model('rforest')
+    assert (loaded.predict_proba(data.data) == mapped.predict_proba(data.data)).all()
+    assert stale.exists()
+
+    cached.unlink()
+    load_model('rforest')
+    assert list(tmp_path.iterdir()) == [cached]
+
+    monkeypatch.setenv('BOTRECON_MODEL_CACHE', '')
+    assert model_cache_path(get_model_path('rforest')) is None
+
+
+def test_model_path():
+    assert get_model_path('rforest').stem == 'rforest'
+    assert get_model_path(Path('model.joblib')) == Path('model.joblib')
+    with pytest.raises(FileNotFoundError):
+        get_model_path('missing')
+
+
+def string_path(data):
+    # All rows converted to strings, like the models were trained on
+    data = data.astype({'sport': str, 'dport': str})
+    return data.astype({column: 'string' for column in ['proto', 'dport', 'sport', 'state']})
+
+
+@pytest.mark.parametrize('name', ['rforest', 'svm', 'rforest-experimental'])
+def test_fast_encoding(name):
+    model = load_model(name)
+    data = get_data(path, 'csv').data
+
+    fast, _ = make_predictions(data, model)
+    strings, _ = make_predictions(string_path(data), model.pipeline)
+    assert (fast == strings).all()
+
+
+def test_fast_encoding_unknown_values():
+    model = load_model('rforest')
+    data = get_data(path, 'csv').data
+    data['proto'] = data['proto'].cat.add_categories('unknown')
+    data.loc[data.index[:50], 'proto'] = 'unknown'
+    data.loc[data.index[50:100], 'state'] = np.nan
+    data.loc[data.index[100:150], 'sport'] = 123456.
+    data.loc[data.index[150:200], 'dport'] = np.nan
+
+    encoder = model.pipeline.steps[0][1]
+    assert model.encode(data).equals(encoder.transform(string_path(data)))
+
+
+@pytest.mark.parametrize('name', ['rforest', 'rforest-experimental'])
+def test_compiled_forest(name):
+    model = load_model(name)
+    forest = load_model(name, compile=False).pipeline.steps[-1][1]
+    assert isinstance(model.pipeline.steps[-1][1], CompiledForest)
+
+    X = model.encode(get_data(path, 'csv').data)
+    expected = forest.predict_proba(X)
+    compiled = model.pipeline.steps[-1][1]
+    for n_jobs, block_rows in [(1, 8192), (1, 333), (3, 333)]:
+        compiled.n_jobs, compiled.block_rows = n_jobs, block_rows
+        assert np.allclose(compiled.predict_proba(X), expected, rtol=0, atol=1e-12)
+    assert (compiled.predict(X) == forest.predict(X)).all()
+
+
+def test_compiled_forest_unsupported():
+    svm = load_model('svm')
+    assert not any(isinstance(step, CompiledForest) for _, step in svm.steps)
+
+    forest = load_model('rforest', compile=False).pipeline.steps[-1][1]
+    assert CompiledForest.supports(forest)
+    assert isinstance(compile_model(forest), CompiledForest)
+    assert not CompiledForest.supports(svm.pipeline)
+
+    with pytest.raises(ValueError):
+        CompiledForest(forest).predict_proba(np.full((2, 8), np.nan))
+
+
+def test_compiled_forest_custom_model(tmp_path):
+    forest = load_model('rforest', compile=False).pipeline.steps[-1][1]
+    dump_model(forest, tmp_path / 'forest.joblib')
+    assert isinstance(load_model(tmp_path / 'forest.joblib'), CompiledForest)
+    loaded = load_model(tmp_path / 'forest.joblib', compile=False)
+    assert type(loaded).__name__ == 'RandomForestClassifier'
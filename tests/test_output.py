@@ -0,0 +1,118 @@
+from click.testing import CliRunner
+from pathlib import Path
+from botrecon import botrecon
+from botrecon.cli import OUTPUT_FORMATS
+from botrecon.output import FLOW_COLUMNS, TableWriter
+import pandas as pd
+import shutil
+
+
+runner = CliRunner()
+path = str(Path('tests', 'data', 'test'))
+readers = {
+    'csv': lambda path: pd.read_csv(path, index_col=0),
+    'parquet': pd.read_parquet,
+    'jsonl': lambda path: pd.read_json(path, lines=True)
+}
+
+
+def score(tmp_path, args, name='scores'):
+    flow_scores = tmp_path / name
+    args = ['-s', '-y', '--flow-scores', str(flow_scores), *args]
+    result = runner.invoke(botrecon, args)
+    assert result.exit_code == 0
+    return flow_scores
+
+
+def test_output_formats(tmp_path):
+    runner.invoke(botrecon, ['-y', path + '.csv', str(tmp_path / 'hosts.csv')])
+    expected = pd.read_csv(tmp_path / 'hosts.csv', index_col=0)
+    for fmt in OUTPUT_FORMATS:
+        output = tmp_path / f'hosts.{fmt}'
+        result = runner.invoke(botrecon, ['-y', '-o', fmt, path + '.csv', str(output)])
+        assert result.exit_code == 0
+
+        hosts = readers[fmt](output)
+        assert list(hosts.columns) == ['Host', 'Mean Score', 'Flow Count']
+        assert hosts['Host'].equals(expected['Host'])
+        assert (hosts['Mean Score'] - expected['Mean Score']).abs().max() < 1e-12
+
+
+def test_flow_scores(tmp_path):
+    flows = pd.read_csv(score(tmp_path, [path + '.csv']))
+    assert list(flows.columns) == list(FLOW_COLUMNS)
+    assert flows.shape[0] == 5000
+    assert flows['Flow'].tolist() == list(range(5000))
+    assert (flows['File'] == path + '.csv').all()
+
+    data = pd.read_csv(path + '.csv')
+    assert flows['Host'].equals(data['SrcAddr'])
+
+
+def test_flow_scores_formats(tmp_path):
+    expected = pd.read_csv(score(tmp_path, [path + '.csv']))
+    for fmt in OUTPUT_FORMATS:
+        flows = score(tmp_path, ['-o', fmt, path + '.csv'], fmt)
+        flows = pd.read_csv(flows) if fmt == 'csv' else readers[fmt](flows)
+        assert list(flows.columns) == list(FLOW_COLUMNS)
+        assert flows['Host'].equals(expected['Host'])
+        assert (flows['Score'] - expected['Score']).abs().max() < 1e-12
+
+
+def test_flow_scores_chunked(tmp_path):
+    expected = score(tmp_path, [path + '.csv']).read_text()
+    for args in [['-b', 7, 'batches'], ['--stream-chunk-rows', 333]]:
+        flow_scores = score(tmp_path, args + [path + '.csv'], 'chunked')
+        assert flow_scores.read_text() == expected
+
+
+def test_flow_scores_parquet_chunks(tmp_path):
+    expected = pd.read_csv(score(tmp_path, [path + '.csv']))
+    flows = pd.read_csv(score(tmp_path, ['-t', 'parquet', '--stream-chunk-rows', 333,
+                                         path + '.parquet']))
+    assert flows['Flow'].equals(expected['Flow'])
+    assert flows['Score'].equals(expected['Score'])
+
+
+def test_flow_scores_files(tmp_path):
+    inputs = tmp_path / 'inputs'
+    inputs.mkdir()
+    for name in ['a.csv', 'b.csv']:
+        shutil.copy(path + '.csv', inputs / name)
+
+    for fmt in OUTPUT_FORMATS:
+        parallel = score(tmp_path, ['-o', fmt, '-j', 4, str(inputs)], 'parallel')
+        sequential = score(tmp_path, ['-o', fmt, '-j', 1, str(inputs)], 'sequential')
+        assert parallel.read_bytes() == sequential.read_bytes()
+        assert list(tmp_path.glob('.parallel.part-*')) == []
+
+    flows = pd.read_csv(score(tmp_path, ['-j', 4, str(inputs)]))
+    assert flows.shape[0] == 10000
+    assert flows['File'].tolist() == [str(inputs / 'a.csv')] * 5000 + \
+        [str(inputs / 'b.csv')] * 5000
+
+
+def test_flow_scores_filtered(tmp_path):
+    flows = pd.read_csv(score(tmp_path, ['-r', '147.32.0.0/16', path + '.csv']))
+    assert flows.shape[0] > 0
+    assert flows['Host'].str.startswith('147.32.').all()
+
+
+def test_flow_scores_partition_only(tmp_path):
+    result = runner.invoke(botrecon, ['--partition-only', '--shards', 2,
+                                      '--shard-dir', str(tmp_path / 'shards'),
+                                      '--flow-scores', str(tmp_path / 'scores'),
+                                      path + '.csv'])
+    assert result.exit_code == 2
+
+
+def test_table_writer(tmp_path):
+    frame = pd.DataFrame({'a': [1, 2, 3], 'b': ['x', 'y', None]})
+    for fmt in OUTPUT_FORMATS:
+        with TableWriter(tmp_path / f'table.{fmt}', fmt) as writer:
+            writer.write(frame.iloc[:2])
+            writer.write(frame.iloc[2:])
+        assert writer.rows == 3
+        written = tmp_path / f'table.{fmt}'
+        written = pd.read_csv(written) if fmt == 'csv' else readers[fmt](written)
+        assert written['a'].tolist() == [1, 2, 3]
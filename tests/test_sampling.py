@@ -0,0 +1,86 @@
+from click.testing import CliRunner
+from pathlib import Path
+from botrecon import botrecon, get_data, HostAggregate
+from botrecon.predictions import sample_flows
+import copy
+import numpy as np
+import pandas as pd
+import warnings
+
+
+runner = CliRunner()
+path = str(Path('tests', 'data', 'test.csv'))
+
+
+def get_table(tmp_path, args, name='hosts.csv'):
+    result = runner.invoke(botrecon, ['-y', *args, path, str(tmp_path / name)])
+    assert result.exit_code == 0
+    return pd.read_csv(tmp_path / name, index_col=0)
+
+
+def sample(data, *args):
+    with botrecon.make_context('botrecon', [*args, path]):
+        return sample_flows(copy.copy(data))
+
+
+def test_sampling_above_counts(tmp_path):
+    normal = get_table(tmp_path, [])
+    sampled = get_table(tmp_path, ['--max-flows-per-host', 5000], 'sampled.csv')
+    assert sampled.equals(normal)
+
+
+def test_sampling_true_counts(tmp_path):
+    counts = pd.read_csv(path)['SrcAddr'].value_counts()
+    for args in [[], ['--stream-chunk-rows', 700], ['-b', 3, 'batches']]:
+        table = get_table(tmp_path, ['-s', '--max-flows-per-host', 2, *args])
+        assert table.shape[0] > 0
+        assert (table['Flow Count'].to_numpy() == counts[table['Host']].to_numpy()).all()
+
+
+def test_sample_flows():
+    data = get_data(path, 'csv')
+    sampled = sample(data, '--max-flows-per-host', 3)
+    counts = np.bincount(data.host_codes + 1)
+    assert (np.bincount(sampled.host_codes + 1) == np.minimum(counts, 3)).all()
+    weights = np.bincount(sampled.host_codes + 1, weights=sampled.weights)
+    assert np.allclose(weights, counts)
+
+    again = sample(data, '--max-flows-per-host', 3)
+    assert again.data.index.equals(sampled.data.index)
+    other = sample(data, '--max-flows-per-host', 3, '--sample-seed', 1)
+    assert not other.data.index.equals(sampled.data.index)
+    assert sample(data).weights is None
+
+
+def test_sampling_unbiased():
+    data = get_data(path, 'csv')
+    scores = np.random.default_rng(0).random(data.data.shape[0])
+    scores = pd.Series(scores, index=data.data.index)
+    expected = HostAggregate().update_codes(scores, data.host_codes, data.host_uniques)
+
+    means = []
+    for seed in range(200):
+        sampled = sample(data, '--max-flows-per-host', 2, '--sample-seed', seed)
+        aggregate = HostAggregate().update_codes(scores[sampled.data.index],
+                                                 sampled.host_codes,
+                                                 sampled.host_uniques, sampled.weights)
+        means.append(aggregate.table['mean'].to_numpy())
+        assert (aggregate.table['count'] == expected.table['count']).all()
+
+    error = np.abs(np.mean(means, axis=0) - expected.table['mean'].to_numpy())
+    assert error.max() < .1
+
+
+def test_sample_flows_filtered_hosts():
+    # Hosts filtered out before, like with -c, leave codes without flows
+    data = get_data(path, 'csv')
+    counts = np.bincount(data.host_codes + 1)
+    data = data.select(counts[data.host_codes + 1] >= 5)
+    assert (np.bincount(data.host_codes + 1) == 0).any()
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        sampled = sample(data, '--max-flows-per-host', 3)
+    assert np.isfinite(sampled.weights).all()
+    weights = np.bincount(sampled.host_codes + 1, weights=sampled.weights)
+    assert np.allclose(weights, np.bincount(data.host_codes + 1))
@@ -0,0 +1,161 @@
+from click.testing import CliRunner
+from pathlib import Path
+from threading import Thread
+from urllib.request import urlopen, Request
+from urllib.error import HTTPError
+from botrecon import botrecon
+from botrecon.binary import convert
+from botrecon.predictions import load_model
+from botrecon.server import make_server
+import http.client
+import json
+import socket
+import pytest
+import re
+import shutil
+
+
+runner = CliRunner()
+path = str(Path('tests', 'data', 'test.csv'))
+regex = r'(?:[0-9]{1,3}\.){3}[0-9]{1,3}'
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path):
+        super().__init__('localhost')
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.unix_path)
+
+
+@pytest.fixture(scope='module')
+def model():
+    return load_model('rforest')
+
+
+def start(server):
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def post(server, url, body, content_type='application/json'):
+    address = 'http://{}:{}{}'.format(*server.server_address, url)
+    request = Request(address, body, {'Content-Type': content_type})
+    with urlopen(request) as response:
+        return json.loads(response.read())['hosts']
+
+
+def expected_ips(args):
+    result = runner.invoke(botrecon, ['-y'] + args + [path])
+    return re.findall(regex, str(result.stdout_bytes))
+
+
+def test_server_path(model):
+    server = start(make_server(model, 'rforest'))
+    try:
+        hosts = post(server, '/score', json.dumps({'path': path}).encode())
+        assert [h['host'] for h in hosts] == expected_ips([])
+
+        body = json.dumps({'path': path, 'min_count': 2}).encode()
+        hosts = post(server, '/score', body)
+        assert [h['host'] for h in hosts] == expected_ips(['-c', 2])
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_server_body(model):
+    server = start(make_server(model, 'rforest'))
+    try:
+        body = Path(path).read_bytes()
+        hosts = post(server, '/score?range=147.32.84.0/24', body, 'text/csv')
+        assert [h['host'] for h in hosts] == expected_ips(['-r', '147.32.84.0/24'])
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_server_concurrent(model):
+    from concurrent.futures import ThreadPoolExecutor
+
+    server = start(make_server(model, 'rforest'))
+    try:
+        body = json.dumps({'path': path}).encode()
+        with ThreadPoolExecutor(4) as pool:
+            results = list(pool.map(lambda _: post(server, '/score', body), range(8)))
+        assert all(result == results[0] for result in results)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_server_errors(model):
+    server = start(make_server(model, 'rforest'))
+    try:
+        with pytest.raises(HTTPError) as err:
+            post(server, '/score', json.dumps({'type': 'csv'}).encode())
+        assert err.value.code == 400
+
+        with pytest.raises(HTTPError) as err:
+            post(server, '/score', json.dumps({'path': 'missing.csv'}).encode())
+        assert err.value.code == 400
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def read_error(server, body):
+    with pytest.raises(HTTPError) as err:
+        post(server, '/score', json.dumps(body).encode())
+    assert err.value.code == 400
+    return json.loads(err.value.read())['error']
+
+
+def test_server_dash_path(model, tmp_path, monkeypatch):
+    shutil.copy(path, tmp_path / '-flows.csv')
+    monkeypatch.chdir(tmp_path)
+    server = start(make_server(model, 'rforest'))
+    try:
+        hosts = post(server, '/score', json.dumps({'path': '-flows.csv'}).encode())
+        monkeypatch.undo()
+        assert [h['host'] for h in hosts] == expected_ips([])
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_server_binary_custom_model(model, tmp_path):
+    capture = str(tmp_path / 'capture')
+    assert runner.invoke(convert, [path, capture]).exit_code == 0
+    server = start(make_server(model, 'model.pkl', no_transforms=True))
+    try:
+        error = read_error(server, {'path': capture, 'type': 'npy'})
+        assert 'custom models need the original file' in error
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_server_unix_socket(model, tmp_path):
+    socket_path = str(tmp_path / 'botrecon.sock')
+    server = start(make_server(model, 'rforest', socket=socket_path))
+    try:
+        connection = UnixHTTPConnection(socket_path)
+        connection.request('GET', '/health')
+        assert json.loads(connection.getresponse().read())['status'] == 'ok'
+
+        connection.request('POST', '/score', json.dumps({'path': path}),
+                           {'Content-Type': 'application/json'})
+        hosts = json.loads(connection.getresponse().read())['hosts']
+        assert [h['host'] for h in hosts] == expected_ips([])
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_serve_help():
+    result = runner.invoke(botrecon, ['serve', '--help'])
+    assert result.exit_code == 0
+    assert 'POST /score' in result.output
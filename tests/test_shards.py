@@ -0,0 +1,77 @@
+from click.testing import CliRunner
+from pathlib import Path
+from botrecon import botrecon
+from botrecon.shards import shard_of
+import pandas as pd
+import re
+
+
+runner = CliRunner()
+path = str(Path('tests', 'data', 'test.csv'))
+regex = r'(?:[0-9]{1,3}\.){3}[0-9]{1,3}'
+
+
+def compare_sharded(*args, input_path=path):
+    result_sharded = runner.invoke(botrecon, ['--shards', 3, *args, input_path])
+    assert result_sharded.exit_code == 0
+    ips_sharded = re.findall(regex, str(result_sharded.stdout_bytes))
+
+    result_normal = runner.invoke(botrecon, [*args, input_path])
+    ips_normal = re.findall(regex, str(result_normal.stdout_bytes))
+    # Hosts with the same mean score may be listed in a different order
+    assert sorted(ips_normal) == sorted(ips_sharded)
+
+
+def test_sharded():
+    compare_sharded()
+
+
+def test_sharded_sequential():
+    compare_sharded('-j', 1)
+
+
+def test_sharded_options():
+    compare_sharded('-m', 'svm', '-c', 5)
+    compare_sharded('-r', '147.32.84.0/24')
+    compare_sharded('--stream-chunk-rows', 1000)
+
+
+def test_sharded_parquet():
+    compare_sharded('-t', 'parquet', input_path=str(Path('tests', 'data', 'test.parquet')))
+
+
+def test_partition_only(tmp_path):
+    result = runner.invoke(botrecon, ['--shards', 4, '--shard-dir', str(tmp_path),
+                                      '--partition-only', path])
+    assert result.exit_code == 0
+
+    shards = sorted(tmp_path.iterdir())
+    assert result.output.splitlines()[-4:] == [str(shard) for shard in shards]
+    assert shards[0].name == 'shard-0001-of-0004.csv'
+
+    data = pd.read_csv(path)
+    parts = [pd.read_csv(shard) for shard in shards]
+    assert sum(len(part) for part in parts) == len(data)
+    hosts = [set(part['SrcAddr']) for part in parts]
+    assert sum(len(part) for part in hosts) == len(set.union(*hosts))
+
+
+def test_partition_only_needs_dir():
+    result = runner.invoke(botrecon, ['--shards', 4, '--partition-only', path])
+    assert result.exit_code != 0
+    assert '--shard-dir' in result.output
+
+
+def test_sharding_unsupported_type():
+    result = runner.invoke(botrecon, ['--shards', 4, '-t', 'json',
+                                      str(Path('tests', 'data', 'test.json'))])
+    assert result.exit_code != 0
+    assert 'Sharding is not supported' in result.output
+
+
+def test_shard_of():
+    hosts = pd.Series(['10.0.0.1', '10.0.0.2', '10.0.0.1', None])
+    shards = shard_of(hosts, 4)
+    assert shards[0] == shards[2]
+    assert ((shards >= 0) & (shards < 4)).all()
+    assert (shard_of(hosts, 1) == 0).all()
@@ -0,0 +1,118 @@
+from click.testing import CliRunner
+from pathlib import Path
+from botrecon import botrecon, HostAggregate
+import pandas as pd
+import re
+
+
+runner = CliRunner()
+path = str(Path('tests', 'data', 'test'))
+regex = r'(?:[0-9]{1,3}\.){3}[0-9]{1,3}'
+
+
+def get_ips(args):
+    result = runner.invoke(botrecon, ['-y'] + args)
+    assert result.exit_code == 0
+    return re.findall(regex, str(result.stdout_bytes))
+
+
+def test_stream_csv():
+    ips_normal = get_ips([path + '.csv'])
+    ips_streamed = get_ips(['--stream-chunk-rows', 500, path + '.csv'])
+    assert ips_normal == ips_streamed
+
+
+def test_stream_uneven():
+    ips_normal = get_ips([path + '.csv'])
+    ips_streamed = get_ips(['--stream-chunk-rows', 333, path + '.csv'])
+    assert ips_normal == ips_streamed
+
+
+def test_stream_single_chunk():
+    ips_normal = get_ips([path + '.csv'])
+    ips_streamed = get_ips(['--stream-chunk-rows', 100000, path + '.csv'])
+    assert ips_normal == ips_streamed
+
+
+def test_stream_min_count():
+    ips_normal = get_ips(['-c', 2, path + '.csv'])
+    ips_streamed = get_ips(['-c', 2, '--stream-chunk-rows', 7, path + '.csv'])
+    assert ips_normal == ips_streamed
+
+
+def test_stream_parquet():
+    ips_normal = get_ips(['-t', 'parquet', path + '.parquet'])
+    ips_streamed = get_ips(
+        ['-t', 'parquet', '--stream-chunk-rows', 500, path + '.parquet']
+    )
+    assert ips_normal == ips_streamed
+
+
+def test_stream_unsupported_type():
+    result = runner.invoke(
+        botrecon, ['-t', 'json', '--stream-chunk-rows', 500, path + '.json']
+    )
+    assert result.exit_code == 2
+
+
+def test_stream_batchify():
+    result = runner.invoke(
+        botrecon, ['-b', 10, '%', '--stream-chunk-rows', 500, path + '.csv']
+    )
+    assert result.exit_code == 2
+
+
+def test_stream_memory_limit():
+    # Every chunk is split to stay under the limit
+    result = runner.invoke(botrecon, ['-y', '-v', '-m', 'svm', '--memory-limit', '1MB',
+                                      '--stream-chunk-rows', 2000, path + '.csv'])
+    assert result.exit_code == 0
+    assert result.output.count('Memory limit 1 MiB') == 3
+    assert 'predicting batches of' in result.output
+    ips_limited = re.findall(regex, str(result.stdout_bytes))
+    assert sorted(ips_limited) == sorted(get_ips(['-m', 'svm', path + '.csv']))
+
+
+def test_stream_zero():
+    result = runner.invoke(botrecon, ['--stream-chunk-rows', 0, path + '.csv'])
+    assert result.exit_code == 2
+
+
+def test_aggregate_merge():
+    hosts = pd.DataFrame({'srcaddr': ['a', 'b', 'a', 'c', None]})
+    preds = [1., .2, 0., .9, 1.]
+
+    whole = HostAggregate().update(preds, hosts)
+    first = HostAggregate().update(preds[:2], hosts[:2])
+    second = HostAggregate().update(preds[2:], hosts[2:])
+    merged = first.merge(second)
+
+    assert whole.table.equals(merged.table)
+    assert list(whole.table['host']) == ['a', 'b', 'c']
+    assert list(whole.table['count']) == [2, 1, 1]
+    assert list(whole.evaluate(.5)['host']) == ['c', 'a']
+    assert list(whole.evaluate(.5, min_count=1)['host']) == ['a']
+
+
+def write_integer_ports(path):
+    # Ports written as integers, so chunks without missing ones read as int
+    data = pd.read_csv(Path('tests', 'data', 'test.csv'), index_col=0)
+    data = data.astype({'Sport': 'Int64', 'Dport': 'Int64'})
+    data.to_csv(path)
+    return data
+
+
+def test_stream_integer_ports(tmp_path):
+    write_integer_ports(tmp_path / 'ports.csv')
+    outputs = []
+    for args in [[], ['--stream-chunk-rows', 20], ['--stream-chunk-rows', 100]]:
+        output = tmp_path / f'hosts-{len(outputs)}.csv'
+        result = runner.invoke(botrecon, ['-y', *args, str(tmp_path / 'ports.csv'),
+                                          str(output)])
+        assert result.exit_code == 0
+        outputs.append(pd.read_csv(output, index_col=0))
+
+    assert outputs[0].shape[0] > 0
+    for streamed in outputs[1:]:
+        assert streamed['Host'].equals(outputs[0]['Host'])
+        assert (streamed['Mean Score'] - outputs[0]['Mean Score']).abs().max() < 1e-12
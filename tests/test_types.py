@@ -1,6 +1,8 @@
 from click.testing import CliRunner
 from pathlib import Path
-from botrecon import botrecon
+from botrecon import botrecon, Data
+import numpy as np
+import pandas as pd
 
 
 runner = CliRunner()
@@ -45,3 +47,41 @@ def test_parquet(path=path, ext='.parquet', ftype='parquet'):
 def test_stata(path=path, ext='.dta', ftype='stata'):
     result = runner.invoke(botrecon, ['-t', ftype, path + ext])
     assert result.exit_code == 0
+
+
+def test_projection(path=path, ext='.csv', ftype='csv'):
+    kwargs = Data.reader_kwargs(path + ext, ftype)
+    assert sorted(kwargs['usecols']) == sorted([
+        'Dur', 'TotBytes', 'SrcBytes', 'Proto', 'Sport', 'Dport', 'State',
+        'SrcAddr'
+    ])
+    assert kwargs['dtype']['Proto'] == 'category'
+
+
+def test_projection_same_data(path=path):
+    for ftype, ext in [('csv', '.csv'), ('parquet', '.parquet'),
+                       ('feather', '.feather'), ('stata', '.dta')]:
+        projected = Data(path + ext, ftype, required_only=True).prepare()
+        full = Data(path + ext, ftype).prepare()
+        assert projected.data.equals(full.data)
+        assert projected.hosts.equals(full.hosts)
+
+
+def test_compact_dtypes(path=path):
+    data = Data(path + '.csv', 'csv').prepare().data
+    assert data['proto'].dtype == 'category'
+    assert data['state'].dtype == 'category'
+    assert data['dport'].dtype == 'float32'  # Has missing values
+    assert data['dur'].dtype == 'float64'
+    assert data['totbytes'].dtype == 'uint32'
+
+
+def test_compact_dtype():
+    assert Data.compact_dtype(pd.Series([53, 80]), 'port') == 'float32'
+    assert Data.compact_dtype(pd.Series([53, 70000]), 'port') == 'float64'
+    assert Data.compact_dtype(pd.Series([53., np.nan]), 'port') == 'float32'
+    assert Data.compact_dtype(pd.Series([53.5, np.nan]), 'port') == 'float64'
+    assert Data.compact_dtype(pd.Series(['0x0303', '80']), 'port') == 'category'
+    assert Data.compact_dtype(pd.Series([1, 2**32]), 'count') == 'uint64'
+    assert Data.compact_dtype(pd.Series([-1, 2]), 'count') == 'int64'
+    assert Data.compact_dtype(pd.Series([1, 2]), 'float64') == 'float64'